@@ -0,0 +1,91 @@
+"""Vectorized Annoy index builds that run outside the request-serving process.
+
+Rows are densified in large blocks instead of one `toarray()` per item, trees
+are built with Annoy's multi-threaded `n_jobs` build (or written straight to
+disk with `on_disk_build`), and the finished file is moved into place with an
+atomic rename so readers only ever see complete index files.
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+import numpy as np
+from annoy import AnnoyIndex
+from scipy.sparse import csr_matrix, issparse
+
+logger = logging.getLogger(__name__)
+
+ANNOY_BUILD_BLOCK_SIZE = 4096
+
+_build_executor: Optional[ProcessPoolExecutor] = None
+
+
+def add_items_in_blocks(annoy_index: AnnoyIndex, features, block_size: int = ANNOY_BUILD_BLOCK_SIZE):
+    """Add every row of a sparse (or dense) matrix to an Annoy index, densifying block by block."""
+    n_items = features.shape[0]
+    for start in range(0, n_items, block_size):
+        block = features[start:start + block_size]
+        block = (block.toarray() if issparse(block) else np.asarray(block)).astype(np.float32, copy=False)
+        for offset, vector in enumerate(block):
+            annoy_index.add_item(start + offset, vector)
+        logger.info(f"Added {min(start + block_size, n_items)}/{n_items} items to Annoy index.")
+
+
+def build_annoy_index_file(
+    features,
+    index_path: str,
+    n_trees: int,
+    metric: str = "angular",
+    n_jobs: int = -1,
+    on_disk: bool = False,
+    block_size: int = ANNOY_BUILD_BLOCK_SIZE
+) -> int:
+    """Build an Annoy index for `features` and atomically publish it at `index_path`."""
+    start_time = time.time()
+    tmp_path = f"{index_path}.building-{os.getpid()}"
+    annoy_index = AnnoyIndex(features.shape[1], metric)
+    if on_disk:
+        annoy_index.on_disk_build(tmp_path)
+
+    add_items_in_blocks(annoy_index, features, block_size)
+    logger.info(f"Building {n_trees} trees (n_jobs={n_jobs})...")
+    annoy_index.build(n_trees, n_jobs=n_jobs)
+    if not on_disk:
+        annoy_index.save(tmp_path)
+    n_items = annoy_index.get_n_items()
+    annoy_index.unload()
+
+    os.replace(tmp_path, index_path)
+    logger.info(f"Annoy index with {n_items} items written to {index_path} in {time.time() - start_time:.2f} seconds.")
+    return n_items
+
+
+def _run_in_child(build_fn: Callable[..., Any], *args, **kwargs) -> Any:
+    logging.basicConfig(level=logging.INFO)
+    return build_fn(*args, **kwargs)
+
+
+def submit_build_job(build_fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """Run a module-level build function in the background build process."""
+    global _build_executor
+    if _build_executor is None:
+        # Spawn rather than fork: the serving process has live threads (and possibly torch).
+        _build_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _build_executor.submit(_run_in_child, build_fn, *args, **kwargs)
+
+
+def submit_annoy_build(features, index_path: str, n_trees: int, **kwargs) -> Future:
+    """Build an index in the background build process; returns a future of the item count."""
+    return submit_build_job(build_annoy_index_file, features, index_path, n_trees, **kwargs)
+
+
+def shutdown_build_executor():
+    """Stop the background build process, abandoning queued builds."""
+    global _build_executor
+    if _build_executor is not None:
+        _build_executor.shutdown(wait=False, cancel_futures=True)
+        _build_executor = None
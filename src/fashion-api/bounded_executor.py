@@ -0,0 +1,143 @@
+"""Bounded worker pool with per-endpoint lanes for CPU-bound request work.
+
+Recommendation, image and search work (pandas, scipy, Annoy, torch) runs on
+a dedicated thread pool instead of the event loop, so one slow request no
+longer stalls every other request on the worker. The heavy libraries release
+the GIL in their inner loops, so threads overlap on multiple cores.
+
+Each endpoint gets a lane with its own concurrency limit and a bounded wait
+queue. A request that finds its lane's queue full is rejected immediately
+(`LaneFull`, 429), and one that waits longer than the lane allows is rejected
+too (`LaneTimeout`, 503), so overload turns into fast, retryable errors
+instead of an ever-growing backlog. Cheap endpoints never enter a lane and
+keep their latency while heavy ones saturate.
+"""
+
+import asyncio
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+
+class Overloaded(Exception):
+    """A lane cannot take more work right now."""
+
+    status_code = 503
+
+    def __init__(self, lane: str, message: str):
+        super().__init__(message)
+        self.lane = lane
+
+
+class LaneFull(Overloaded):
+    """The lane's wait queue is full."""
+
+    status_code = 429
+
+
+class LaneTimeout(Overloaded):
+    """The request waited longer than the lane's queue timeout."""
+
+    status_code = 503
+
+
+class Lane:
+    """Concurrency slots and a bounded FIFO of waiters for one endpoint.
+
+    Only touched from the event loop thread, so it needs no lock.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def acquire(self):
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LaneFull(self.name, f"'{self.name}' queue is full ({self.max_queue} waiting)")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return # The slot was handed over just as the wait timed out
+            waiter.cancel()
+            self.timed_out += 1
+            raise LaneTimeout(self.name, f"'{self.name}' queue wait exceeded {self.queue_timeout}s")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release() # Pass on a slot this request can no longer use
+            waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self):
+        """Hand the slot to the oldest live waiter, or free it."""
+        self.completed += 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": self.active, "waiting": len(self._waiters), "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue, "completed": self.completed, "rejected": self.rejected,
+                "timed_out": self.timed_out}
+
+
+class BoundedExecutor:
+    """Thread pool sized to the sum of its lanes' concurrency limits."""
+
+    def __init__(self, lanes: Dict[str, Dict[str, Any]], thread_name_prefix: str = "request-worker"):
+        self.lanes = {name: Lane(name, **limits) for name, limits in lanes.items()}
+        self._thread_name_prefix = thread_name_prefix
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            workers = max(1, sum(lane.max_concurrency for lane in self.lanes.values()))
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self._thread_name_prefix)
+        return self._pool
+
+    async def run(self, lane_name: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` on the pool once the lane has a free slot.
+
+        Raises `LaneFull` or `LaneTimeout` instead of queueing past the lane's bounds.
+        """
+        lane = self.lanes[lane_name]
+        await lane.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._get_pool().submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            lane.release()
+            raise
+        # The slot is held until the work itself ends, even if the request is
+        # cancelled first: a running thread cannot be stopped.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(lane.release))
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def shutdown(self):
+        """Stop the pool, dropping work that has not started."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,170 @@
+"""Columnar catalog snapshots for fast worker startup.
+
+A snapshot is a single file holding every clothing_items column as a typed
+numpy array. String columns are dictionary-encoded (int32 codes plus a small
+vocabulary blob), so loading a snapshot is a memory map plus one fancy-index per
+column instead of one ORM object per row.
+"""
+
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"FCATSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ALIGNMENT = 64
+
+NUMERIC_COLUMNS = {"id": np.int64, "price": np.float64}
+STRING_COLUMNS = ["gender", "masterCategory", "subCategory", "articleType",
+                  "baseColour", "season", "usage", "productDisplayName"]
+CATALOG_COLUMNS = ["id"] + STRING_COLUMNS + ["price"]
+
+
+# --- Packed array container ---
+def write_packed_arrays(path: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+    """Write arrays into one aligned, memory-mappable file (atomic replace)."""
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        offset = -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+
+    header = json.dumps({"meta": meta, "arrays": layout}).encode("utf-8")
+    data_start = -(-(len(SNAPSHOT_MAGIC) + 8 + len(header)) // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_packed_arrays(path: str, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Open a packed array file; arrays are read-only views over a memory map."""
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a packed array file.")
+        header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = -(-(len(SNAPSHOT_MAGIC) + 8 + header_len) // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+    buffer = np.memmap(path, dtype=np.uint8, mode="r") if mmap else np.fromfile(path, dtype=np.uint8)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        start = data_start + spec["offset"]
+        arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+    return arrays, header["meta"]
+
+
+# --- Catalog snapshot ---
+def read_catalog_frame(engine) -> pd.DataFrame:
+    """Read clothing_items column-wise, without materializing ORM objects."""
+    query = text(f"SELECT {', '.join(CATALOG_COLUMNS)} FROM clothing_items ORDER BY id")
+    with engine.connect() as conn:
+        return pd.read_sql_query(query, conn)
+
+
+def _row_checksum(*values) -> int:
+    return zlib.crc32(repr(values).encode("utf-8"))
+
+
+def catalog_source_signature(engine) -> str:
+    """Read-only content fingerprint of clothing_items, used to detect stale snapshots.
+
+    Each row's columns are checksummed during a single scan and the checksums
+    summed, so any edit, including same-length ones and swaps between rows,
+    changes it. Nothing is written to the database.
+    """
+    checksum = f"TOTAL(catalog_row_checksum({', '.join(CATALOG_COLUMNS)}))"
+    query = text(f"SELECT COUNT(*), MIN(id), MAX(id), TOTAL(price), {checksum} FROM clothing_items")
+    with engine.connect() as conn:
+        conn.connection.driver_connection.create_function("catalog_row_checksum", len(CATALOG_COLUMNS),
+                                                          _row_checksum, deterministic=True)
+        row = conn.execute(query).one()
+    return ":".join(str(value) for value in row)
+
+
+def write_catalog_snapshot(df: pd.DataFrame, path: str, source_signature: Optional[str] = None):
+    """Write the catalog DataFrame as a columnar snapshot."""
+    start_time = time.time()
+    arrays = {}
+    vocab_sizes = {}
+    for col, dtype in NUMERIC_COLUMNS.items():
+        arrays[col] = df[col].to_numpy(dtype=dtype, na_value=np.nan if dtype is np.float64 else 0)
+    for col in STRING_COLUMNS:
+        codes, uniques = pd.factorize(df[col])
+        vocab = [str(value) for value in uniques]
+        arrays[f"{col}.codes"] = codes.astype(np.int32)
+        arrays[f"{col}.vocab"] = np.frombuffer("\0".join(vocab).encode("utf-8"), dtype=np.uint8)
+        vocab_sizes[col] = len(vocab)
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "n_rows": len(df),
+        "source_signature": source_signature,
+        "vocab_sizes": vocab_sizes,
+    }
+    write_packed_arrays(path, arrays, meta)
+    logger.info(f"Catalog snapshot with {len(df)} rows written to {path} in {time.time() - start_time:.2f} seconds.")
+
+
+def load_catalog_snapshot(path: str, source_signature: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """Load a catalog snapshot, or return None if it is missing or stale."""
+    if not os.path.exists(path):
+        logger.info(f"Catalog snapshot not found at {path}.")
+        return None
+    start_time = time.time()
+    try:
+        arrays, meta = read_packed_arrays(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read catalog snapshot {path}: {e}")
+        return None
+    if meta.get("version") != SNAPSHOT_VERSION:
+        logger.info(f"Catalog snapshot version {meta.get('version')} is outdated.")
+        return None
+    if source_signature is not None and meta.get("source_signature") != source_signature:
+        logger.info("Catalog snapshot is stale (database contents changed).")
+        return None
+
+    columns = {col: arrays[col] for col in NUMERIC_COLUMNS}
+    for col in STRING_COLUMNS:
+        n_vocab = meta["vocab_sizes"][col]
+        vocab = arrays[f"{col}.vocab"].tobytes().decode("utf-8").split("\0") if n_vocab else []
+        # Code -1 (NULL) indexes the trailing None.
+        lookup = np.array(vocab + [None], dtype=object)
+        columns[col] = lookup[arrays[f"{col}.codes"]]
+
+    df = pd.DataFrame(columns, columns=CATALOG_COLUMNS)
+    logger.info(f"Catalog snapshot loaded from {path} in {time.time() - start_time:.2f} seconds. Shape: {df.shape}")
+    return df
+
+
+if __name__ == "__main__":
+    import sys
+    from sqlalchemy import create_engine
+
+    database_url = sys.argv[1] if len(sys.argv) > 1 else "sqlite:///./database/fashion.db"
+    output_path = sys.argv[2] if len(sys.argv) > 2 else "catalog_snapshot.bin"
+
+    logging.basicConfig(level=logging.INFO)
+    source_engine = create_engine(database_url)
+    write_catalog_snapshot(read_catalog_frame(source_engine), output_path,
+                           catalog_source_signature(source_engine))
@@ -0,0 +1,172 @@
+"""Dictionary-encoded catalog with constant-time id lookup.
+
+Rows are kept in catalog order (ascending id), which is also the row order of
+the feature matrix and the Annoy index, so a row position doubles as the
+feature index. Attribute columns are pandas categoricals backed by small
+integer codes, and ids resolve to positions through a direct-address table.
+
+The store's arrays (ids, codes, id table, names) can be exported with
+`shared_arrays()` and reopened over a memory-mapped file with `from_shared()`,
+so several worker processes serve from one physical copy. Prices are always
+taken from the DataFrame: they are not part of the artifact hash, so a shared
+file can outlive a price change.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLUMNS = ["gender", "masterCategory", "subCategory", "articleType",
+                       "baseColour", "season", "usage"]
+# Use a dense id -> position table while it stays within this factor of the row count.
+DIRECT_ADDRESS_MAX_SPARSITY = 16
+
+
+class PackedStrings:
+    """Read-only string column stored as one UTF-8 blob plus row offsets."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def pack(cls, values: Sequence[Optional[str]]) -> "PackedStrings":
+        encoded = [("" if pd.isna(value) else str(value)).encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        return self.data[self.offsets[position]:self.offsets[position + 1]].tobytes().decode("utf-8")
+
+
+class CatalogStore:
+    """Compact, id-indexed view over the catalog DataFrame."""
+
+    def __init__(self, df: pd.DataFrame, shared: Optional[Dict[str, np.ndarray]] = None):
+        self.df = df
+        self.ids: np.ndarray = df["id"].to_numpy(dtype=np.int64) if shared is None else shared["ids"]
+        self.codes: Dict[str, np.ndarray] = {}
+        self.categories: Dict[str, List[str]] = {}
+        self._category_lookup: Dict[str, Dict[str, int]] = {}
+        for col in CATEGORICAL_COLUMNS:
+            if col not in df.columns:
+                continue
+            self.codes[col] = df[col].cat.codes.to_numpy() if shared is None else shared[f"codes.{col}"]
+            self.categories[col] = df[col].cat.categories.tolist()
+            self._category_lookup[col] = {value: code for code, value in enumerate(self.categories[col])}
+
+        self._sorted = bool(len(self.ids) == 0 or np.all(self.ids[1:] > self.ids[:-1]))
+        self._order = None if self._sorted else np.argsort(self.ids, kind="stable")
+        self._sorted_ids = self.ids if self._sorted else self.ids[self._order]
+        self._position_by_id = None
+        min_id = int(self.ids.min()) if len(self.ids) else 0
+        max_id = int(self.ids.max()) if len(self.ids) else -1
+        if shared is not None:
+            self._position_by_id = shared.get("position_by_id")
+        elif min_id >= 0 and max_id < DIRECT_ADDRESS_MAX_SPARSITY * len(self.ids) + 1024:
+            self._position_by_id = np.full(max_id + 1, -1, dtype=np.int32)
+            self._position_by_id[self.ids] = np.arange(len(self.ids), dtype=np.int32)
+
+        if shared is not None:
+            self._names = PackedStrings(shared["names.offsets"], shared["names.data"]) if "names.offsets" in shared else None
+        else:
+            self._names = df["productDisplayName"].to_numpy(dtype=object) if "productDisplayName" in df.columns else None
+        self._prices = df["price"].to_numpy(dtype=np.float64) if "price" in df.columns else None
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "CatalogStore":
+        """Convert df in place to integer ids and categorical attributes and index it."""
+        df["id"] = df["id"].astype(np.int64)
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype("category")
+        store = cls(df)
+        logger.info(f"CatalogStore built for {len(store)} items "
+                    f"(DataFrame memory: {df.memory_usage(deep=True).sum() / 1e6:.1f} MB).")
+        return store
+
+    @classmethod
+    def from_shared(cls, df: pd.DataFrame, ids: np.ndarray, arrays: Dict[str, np.ndarray]) -> Optional["CatalogStore"]:
+        """Store over arrays exported by `shared_arrays()` (e.g. memory-mapped), or None if they do not fit df."""
+        if len(ids) != len(df) or not np.array_equal(ids, df["id"].to_numpy(dtype=np.int64)):
+            return None
+        for col in CATEGORICAL_COLUMNS:
+            if col not in df.columns:
+                continue
+            vocab = arrays.get(f"vocab.{col}")
+            if vocab is None or vocab.tobytes().decode("utf-8") != "\0".join(df[col].cat.categories.tolist()):
+                return None
+        return cls(df, {"ids": ids, **arrays})
+
+    def shared_arrays(self) -> Dict[str, np.ndarray]:
+        """The store's arrays (except ids, and prices) in a form `from_shared()` can reopen from a packed array file."""
+        arrays = {}
+        for col, codes in self.codes.items():
+            arrays[f"codes.{col}"] = codes
+            arrays[f"vocab.{col}"] = np.frombuffer("\0".join(self.categories[col]).encode("utf-8"), dtype=np.uint8)
+        if self._position_by_id is not None:
+            arrays["position_by_id"] = self._position_by_id
+        if self._names is not None:
+            names = self._names if isinstance(self._names, PackedStrings) else PackedStrings.pack(self._names)
+            arrays["names.offsets"], arrays["names.data"] = names.offsets, names.data
+        return arrays
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position_of(self, item_id) -> Optional[int]:
+        """Row position of an item id (int or numeric string), or None if unknown."""
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        if self._position_by_id is not None:
+            if 0 <= item_id < len(self._position_by_id):
+                position = int(self._position_by_id[item_id])
+                return position if position >= 0 else None
+            return None
+        slot = int(np.searchsorted(self._sorted_ids, item_id))
+        if slot < len(self._sorted_ids) and self._sorted_ids[slot] == item_id:
+            return slot if self._sorted else int(self._order[slot])
+        return None
+
+    def code_of(self, column: str, value: Optional[str]) -> int:
+        """Category code of a value in a categorical column (-1 if absent)."""
+        return self._category_lookup.get(column, {}).get(value, -1)
+
+    def mask_equal(self, column: str, value: Optional[str]) -> np.ndarray:
+        """Boolean row mask for column == value, compared on category codes."""
+        code = self.code_of(column, value)
+        if code < 0:
+            return np.zeros(len(self.ids), dtype=bool)
+        return self.codes[column] == code
+
+    def value_at(self, column: str, position: int) -> Optional[str]:
+        """Decoded categorical value at a row position."""
+        code = self.codes[column][position]
+        return self.categories[column][code] if code >= 0 else None
+
+    def item(self, position: int) -> Dict[str, Any]:
+        """Response-ready dict for the item at a row position."""
+        item_id = int(self.ids[position])
+        item = {"id": item_id}
+        for col in self.codes:
+            item[col] = self.value_at(col, position)
+        if self._names is not None:
+            item["productDisplayName"] = self._names[position]
+        if self._prices is not None:
+            item["price"] = float(self._prices[position])
+        item["image_url"] = f"/static/images/{item_id}.jpg"
+        return item
+
+    def items(self, positions: Sequence[int]) -> List[Dict[str, Any]]:
+        """Response-ready dicts for several row positions, in the given order."""
+        return [self.item(int(position)) for position in positions]
@@ -0,0 +1,304 @@
+"""Pluggable CPU inference backends for CLIP's image and text encoders.
+
+`predict_attributes` only needs unit-length image and text embeddings, so
+the model behind them is chosen by config:
+
+- "torch": the transformers CLIPModel in fp32 (the reference).
+- "torch-int8": the same model with its Linear layers dynamically quantized
+  to int8, which roughly halves RAM and speeds up the matmul-heavy towers.
+- "onnx": both towers exported once to ONNX and run by ONNX Runtime with
+  all graph optimizations enabled (operator fusion, constant folding).
+
+Every backend keeps the CLIPProcessor for preprocessing and returns float32
+rows, L2-normalized. Run this module to check a backend's accuracy on
+catalog images against the catalog's labels, its agreement with the fp32
+reference, and its load time, latency and memory:
+
+    python clip_backends.py --backends torch torch-int8 onnx --sample 200
+"""
+
+import abc
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+CLIP_BACKENDS = ["torch", "torch-int8", "onnx"]
+ONNX_IMAGE_FILE = "clip_image.onnx"
+ONNX_TEXT_FILE = "clip_text.onnx"
+
+
+def unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def _projected(output):
+    """Projected embedding of `get_text_features`/`get_image_features`.
+
+    transformers 4 returns the tensor itself; transformers 5 returns an output
+    object whose `pooler_output` holds it.
+    """
+    return getattr(output, "pooler_output", output)
+
+
+def configure_torch_threads(intra_op_threads: Optional[int], inter_op_threads: Optional[int]):
+    """Set torch's intra-op (within one operator) and inter-op (between operators) thread counts."""
+    import torch
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e: # Only allowed before torch's first parallel work
+            logger.warning(f"Could not set torch inter-op threads: {e}")
+    logger.info(f"Torch threads: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}")
+
+
+class ClipBackend(abc.ABC):
+    """Unit-length CLIP embeddings of images and texts."""
+
+    name = "base"
+
+    def __init__(self, model_name: str = CLIP_MODEL_NAME):
+        from transformers import CLIPProcessor
+
+        self.model_name = model_name
+        self.processor = CLIPProcessor.from_pretrained(model_name)
+
+    @abc.abstractmethod
+    def encode_images(self, images: List[Any]) -> np.ndarray:
+        """Unit-length float32 embeddings of PIL images, one row per image."""
+
+    @abc.abstractmethod
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Unit-length float32 embeddings of texts, one row per text."""
+
+
+class TorchClipBackend(ClipBackend):
+    """transformers CLIPModel on CPU, optionally with int8 dynamically quantized Linear layers."""
+
+    def __init__(self, model_name: str = CLIP_MODEL_NAME, quantize: bool = False,
+                 intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None):
+        import torch
+        from transformers import CLIPModel
+
+        super().__init__(model_name)
+        configure_torch_threads(intra_op_threads, inter_op_threads)
+        self.name = "torch-int8" if quantize else "torch"
+        self.model = CLIPModel.from_pretrained(model_name).eval()
+        if quantize:
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def encode_images(self, images: List[Any]) -> np.ndarray:
+        import torch
+
+        with torch.inference_mode():
+            inputs = self.processor(images=images, return_tensors="pt")
+            features = _projected(self.model.get_image_features(**inputs))
+        return unit_rows(features.float().numpy())
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        import torch
+
+        with torch.inference_mode():
+            inputs = self.processor(text=texts, return_tensors="pt", padding=True, truncation=True)
+            features = _projected(self.model.get_text_features(**inputs))
+        return unit_rows(features.float().numpy())
+
+
+def export_onnx_towers(model_name: str, export_dir: str):
+    """Export CLIP's image and text towers (with projections) to ONNX files in `export_dir`."""
+    import torch
+    from transformers import CLIPModel
+
+    start_time = time.time()
+    model = CLIPModel.from_pretrained(model_name).eval()
+
+    class ImageTower(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.clip = model
+
+        def forward(self, pixel_values):
+            return _projected(self.clip.get_image_features(pixel_values=pixel_values))
+
+    class TextTower(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.clip = model
+
+        def forward(self, input_ids, attention_mask):
+            return _projected(self.clip.get_text_features(input_ids=input_ids, attention_mask=attention_mask))
+
+    os.makedirs(export_dir, exist_ok=True)
+    image_size = model.config.vision_config.image_size
+    with torch.no_grad():
+        for tower, inputs, names, axes, file_name in [
+            (ImageTower(), (torch.zeros(1, 3, image_size, image_size),), ["pixel_values"],
+             {"pixel_values": {0: "batch"}}, ONNX_IMAGE_FILE),
+            (TextTower(), (torch.ones(1, 8, dtype=torch.long), torch.ones(1, 8, dtype=torch.long)),
+             ["input_ids", "attention_mask"], {"input_ids": {0: "batch", 1: "sequence"},
+                                               "attention_mask": {0: "batch", 1: "sequence"}}, ONNX_TEXT_FILE),
+        ]:
+            # Written next to the final name and renamed, so readers never see a partial file
+            tmp_path = os.path.join(export_dir, f"{file_name}.exporting-{os.getpid()}")
+            torch.onnx.export(tower, inputs, tmp_path, input_names=names, output_names=["embeddings"],
+                              dynamic_axes={**axes, "embeddings": {0: "batch"}}, opset_version=17)
+            os.replace(tmp_path, os.path.join(export_dir, file_name))
+    logger.info(f"Exported CLIP towers to ONNX in {export_dir} in {time.time() - start_time:.2f} seconds.")
+
+
+class OnnxClipBackend(ClipBackend):
+    """CLIP towers exported to ONNX and run by ONNX Runtime with full graph optimization."""
+
+    name = "onnx"
+
+    def __init__(self, model_name: str = CLIP_MODEL_NAME, export_dir: str = "clip_onnx",
+                 intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The 'onnx' CLIP backend needs onnxruntime (pip install onnxruntime)") from e
+
+        super().__init__(model_name)
+        if not all(os.path.exists(os.path.join(export_dir, f)) for f in (ONNX_IMAGE_FILE, ONNX_TEXT_FILE)):
+            export_onnx_towers(model_name, export_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+        providers = ["CPUExecutionProvider"]
+        self.image_session = ort.InferenceSession(os.path.join(export_dir, ONNX_IMAGE_FILE), options, providers=providers)
+        self.text_session = ort.InferenceSession(os.path.join(export_dir, ONNX_TEXT_FILE), options, providers=providers)
+
+    def encode_images(self, images: List[Any]) -> np.ndarray:
+        inputs = self.processor(images=images, return_tensors="np")
+        features, = self.image_session.run(None, {"pixel_values": inputs["pixel_values"].astype(np.float32)})
+        return unit_rows(features)
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        inputs = self.processor(text=texts, return_tensors="np", padding=True, truncation=True)
+        features, = self.text_session.run(None, {"input_ids": inputs["input_ids"].astype(np.int64),
+                                                 "attention_mask": inputs["attention_mask"].astype(np.int64)})
+        return unit_rows(features)
+
+
+def load_clip_backend(kind: str, model_name: str = CLIP_MODEL_NAME, onnx_dir: str = "clip_onnx",
+                      intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None) -> ClipBackend:
+    """Load the CLIP backend named by `kind` (one of CLIP_BACKENDS)."""
+    if kind not in CLIP_BACKENDS:
+        raise ValueError(f"Unknown CLIP backend '{kind}', expected one of {CLIP_BACKENDS}")
+    if kind == "onnx":
+        return OnnxClipBackend(model_name, onnx_dir, intra_op_threads, inter_op_threads)
+    return TorchClipBackend(model_name, quantize=kind == "torch-int8",
+                            intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+
+
+def _rss_mb() -> float:
+    # Peak resident set size of this process; ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _benchmark_backend(kind: str, image_paths: List[str], labels: Dict[str, List[str]], batch_size: int,
+                       onnx_dir: str, threads: Optional[int]) -> Dict[str, Any]:
+    """Load one backend in this (fresh) process and predict attributes for every image."""
+    from PIL import Image
+    from clip_labels import LabelEmbeddings
+
+    logging.basicConfig(level=logging.WARNING)
+    base_mb = _rss_mb()
+    start_time = time.time()
+    backend = load_clip_backend(kind, onnx_dir=onnx_dir, intra_op_threads=threads, inter_op_threads=1)
+    load_seconds = time.time() - start_time
+    start_time = time.time()
+    label_embeddings = LabelEmbeddings.encode(backend, labels)
+    label_seconds = time.time() - start_time
+
+    images = [Image.open(path).convert("RGB") for path in image_paths]
+    single_ms = []
+    for image in images[:20]:
+        start_time = time.perf_counter()
+        backend.encode_images([image])
+        single_ms.append((time.perf_counter() - start_time) * 1000)
+    start_time = time.perf_counter()
+    embeddings = np.vstack([backend.encode_images(images[i:i + batch_size]) for i in range(0, len(images), batch_size)])
+    batched_ms = (time.perf_counter() - start_time) * 1000 / max(len(images), 1)
+    return {
+        "backend": kind,
+        "load_seconds": round(load_seconds, 2),
+        "label_encode_seconds": round(label_seconds, 2),
+        "ms_per_image": round(float(np.median(single_ms)), 1) if single_ms else None,
+        "ms_per_image_batched": round(batched_ms, 1),
+        "peak_rss_mb": round(_rss_mb() - base_mb, 1),
+        "predictions": [label_embeddings.predict(embedding) for embedding in embeddings],
+    }
+
+
+def backend_report(backends: List[str], image_paths: List[str], truth: List[Dict[str, str]],
+                   labels: Dict[str, List[str]], batch_size: int = 16, onnx_dir: str = "clip_onnx",
+                   threads: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Accuracy against the catalog labels, agreement with the first backend, and cost of each backend.
+
+    Each backend runs in its own spawned process so load time and memory are measured from a clean start.
+    """
+    runs = []
+    for kind in backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            runs.append(pool.submit(_benchmark_backend, kind, image_paths, labels, batch_size, onnx_dir, threads).result())
+    return score_backend_runs(runs, truth, list(labels))
+
+
+def score_backend_runs(runs: List[Dict[str, Any]], truth: List[Dict[str, str]], attributes: List[str]) -> List[Dict[str, Any]]:
+    """Per-attribute accuracy of each run's predictions and their agreement with the first run's."""
+    reference = runs[0]["predictions"]
+    report = []
+    for run in runs:
+        row = {key: value for key, value in run.items() if key != "predictions"}
+        predictions = run["predictions"]
+        for attribute in attributes:
+            row[f"{attribute}_accuracy"] = round(float(np.mean(
+                [p[attribute] == t[attribute] for p, t in zip(predictions, truth)])), 4)
+        row[f"agreement_with_{runs[0]['backend']}"] = round(float(np.mean(
+            [p == r for p, r in zip(predictions, reference)])), 4)
+        report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare CLIP backends on catalog images: accuracy, parity, latency, memory.")
+    parser.add_argument("--backends", nargs="+", choices=CLIP_BACKENDS, default=CLIP_BACKENDS,
+                        help="Backends to compare; the first is the parity reference")
+    parser.add_argument("--sample", type=int, default=200, help="Catalog images to classify")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads per backend")
+    parser.add_argument("--onnx-dir", default="clip_onnx")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    import main
+    main.load_catalog_stage()
+    labels = main.clip_attribute_labels()
+    catalog = main.ml_model.catalog
+    positions = [p for p in np.random.default_rng(42).permutation(len(catalog))
+                 if os.path.exists(os.path.join(main.STATIC_DIR, "images", f"{catalog.ids[p]}.jpg"))][:args.sample]
+    image_paths = [os.path.join(main.STATIC_DIR, "images", f"{catalog.ids[p]}.jpg") for p in positions]
+    truth = [catalog.item(p) for p in positions]
+
+    report = backend_report(args.backends, image_paths, truth, labels, args.batch_size, args.onnx_dir, args.threads)
+    columns = list(report[0]) if report else []
+    print("\t".join(columns))
+    for row in report:
+        print("\t".join(str(row.get(col, "")) for col in columns))
@@ -0,0 +1,48 @@
+"""Single-pass CLIP zero-shot attribute prediction.
+
+Every attribute's label strings (all genders, article types, seasons, ...)
+are encoded with CLIP's text tower once, when the catalog and model are
+loaded, and kept as one matrix of unit-length rows. An uploaded image is then
+encoded once with the image tower, and all attributes are decided by a single
+matrix-vector product: each attribute takes the label with the highest cosine
+similarity within its own block of rows. That is the same argmax as the
+per-attribute softmax over `logits_per_image`, without re-encoding the image
+and every label string once per attribute.
+"""
+
+import logging
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TEXT_BATCH_SIZE = 256
+
+
+class LabelEmbeddings:
+    """Unit-length CLIP text embeddings of every attribute's labels, stacked in one matrix."""
+
+    def __init__(self, labels: Dict[str, List[str]], embeddings: np.ndarray, model: Any = None):
+        self.labels = labels
+        self.embeddings = embeddings
+        self.model = model # The CLIP backend the embeddings came from
+        bounds = np.cumsum([0] + [len(attribute_labels) for attribute_labels in labels.values()])
+        self._blocks = {attribute: (int(start), int(end)) for attribute, start, end in zip(labels, bounds[:-1], bounds[1:])}
+
+    @classmethod
+    def encode(cls, backend, labels: Dict[str, List[str]], batch_size: int = TEXT_BATCH_SIZE) -> "LabelEmbeddings":
+        """Encode all label strings with the CLIP backend's text encoder in a few batches."""
+        start_time = time.time()
+        prompts = [label for attribute_labels in labels.values() for label in attribute_labels]
+        embeddings = np.vstack([backend.encode_texts(prompts[start:start + batch_size])
+                                for start in range(0, len(prompts), batch_size)])
+        logger.info(f"Encoded {len(prompts)} CLIP attribute labels in {time.time() - start_time:.2f} seconds.")
+        return cls(labels, embeddings, backend)
+
+    def predict(self, image_embedding: np.ndarray) -> Dict[str, str]:
+        """Best-matching label of every attribute for a unit-length image embedding."""
+        scores = self.embeddings @ image_embedding
+        return {attribute: self.labels[attribute][int(np.argmax(scores[start:end]))]
+                for attribute, (start, end) in self._blocks.items()}
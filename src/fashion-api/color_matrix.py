@@ -0,0 +1,57 @@
+"""Color compatibility rules, compiled into a lookup table over baseColour codes.
+
+`color_compatibility` is the scalar rule. `ColorCompatibilityMatrix` evaluates
+it once for every pair of catalog colors at startup, so filtering candidates
+by color is a single fancy-indexing operation over their category codes
+instead of a Python call per candidate.
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from constants import COLOR_COMPATIBILITY, NEUTRAL_COLORS
+
+
+def color_compatibility(color1: Optional[str], color2: Optional[str]) -> float:
+    """Calculate color compatibility score using COLOR_COMPATIBILITY dictionary."""
+    if not color1 or not color2 or color1 == "Unknown" or color2 == "Unknown":
+        return 0.1
+    if color1 == color2:
+        return 1.0
+    if color2 in COLOR_COMPATIBILITY.get(color1, []) or color1 in COLOR_COMPATIBILITY.get(color2, []):
+        return 0.8
+    if color1 in NEUTRAL_COLORS or color2 in NEUTRAL_COLORS:
+        return 0.5
+    return 0.0
+
+
+class ColorCompatibilityMatrix:
+    """color x color score table indexed by baseColour category codes.
+
+    The last column stands for a missing color (code -1), so `row[codes]` scores
+    missing colors as "Unknown" without remapping the codes.
+    """
+
+    def __init__(self, colors: Sequence[str]):
+        self.colors = list(colors)
+        self._code_by_color = {color: code for code, color in enumerate(self.colors)}
+        labels = self.colors + ["Unknown"]
+        self.matrix = np.array([[color_compatibility(a, b) for b in labels] for a in labels], dtype=np.float32)
+        self._extra_rows: Dict[Optional[str], np.ndarray] = {}
+
+    def row(self, color: Optional[str]) -> np.ndarray:
+        """Scores of `color` against every catalog color (plus "Unknown" last)."""
+        code = self._code_by_color.get(color)
+        if code is not None:
+            return self.matrix[code]
+        row = self._extra_rows.get(color)
+        if row is None:
+            # Colors outside the catalog (e.g. predicted from an image) are compiled on first use.
+            row = np.array([color_compatibility(color, other) for other in self.colors + ["Unknown"]], dtype=np.float32)
+            self._extra_rows[color] = row
+        return row
+
+    def scores(self, color: Optional[str], codes: np.ndarray) -> np.ndarray:
+        """Compatibility of `color` with each candidate's baseColour code."""
+        return self.row(color)[codes]
@@ -0,0 +1,78 @@
+"""Dominant color of an uploaded image, and its nearest catalog baseColour.
+
+`dominant_color` samples the image on a small grid, drops the pixels that
+look like the photo's background (close to the median border color), and
+counts the rest in a coarse 3D histogram over CIE Lab, where equal bin widths
+are roughly equal perceived color differences. The dominant color is the mean
+of the pixels in the fullest bin: one `np.bincount` instead of a per-request
+KMeans fit. `ColorPalette` holds the Lab coordinates of the catalog's colors,
+built once per catalog, so naming a color is a single vectorised distance.
+"""
+
+import logging
+from typing import Sequence
+
+import numpy as np
+from PIL import Image
+
+from constants import BASE_COLOUR_RGB
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_GRID = 64 # Pixels per side of the grid sampled from the image
+LAB_BINS = 8 # Histogram bins per Lab axis
+BACKGROUND_DELTA_E = 12.0 # Pixels closer than this to the border color count as background
+MIN_FOREGROUND_FRACTION = 0.1 # Below this, the "background" is the product itself: keep every pixel
+
+_LAB_LOW = np.array([0.0, -128.0, -128.0], dtype=np.float32)
+_LAB_SPAN = np.array([100.0, 256.0, 256.0], dtype=np.float32)
+# sRGB (D65) -> XYZ, with each row divided by the reference white
+_RGB_TO_XYZ = (np.array([[0.4124564, 0.3575761, 0.1804375],
+                         [0.2126729, 0.7151522, 0.0721750],
+                         [0.0193339, 0.1191920, 0.9503041]])
+               / np.array([[0.95047], [1.0], [1.08883]])).astype(np.float32)
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """CIE Lab coordinates of sRGB colors (0-255) in an array of shape (..., 3)."""
+    srgb = np.asarray(rgb, dtype=np.float32) / 255.0
+    linear = np.where(srgb > 0.04045, ((srgb + 0.055) / 1.055) ** 2.4, srgb / 12.92)
+    xyz = linear @ _RGB_TO_XYZ.T
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    return np.stack([116.0 * f[..., 1] - 16.0, 500.0 * (f[..., 0] - f[..., 1]), 200.0 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def dominant_color(image: Image.Image, size: int = SAMPLE_GRID, bins: int = LAB_BINS) -> np.ndarray:
+    """Mean RGB of the most populated Lab histogram bin among the image's foreground pixels."""
+    # Nearest-neighbour sampling reads only size*size pixels; a histogram needs a sample, not a smooth thumbnail
+    thumbnail = image.resize((size, size), Image.Resampling.NEAREST).convert("RGB")
+    pixels = np.asarray(thumbnail, dtype=np.uint8)
+    lab = rgb_to_lab(pixels)
+
+    border = np.concatenate([lab[0], lab[-1], lab[1:-1, 0], lab[1:-1, -1]])
+    foreground = np.linalg.norm(lab - np.median(border, axis=0), axis=-1) > BACKGROUND_DELTA_E
+    if foreground.mean() < MIN_FOREGROUND_FRACTION:
+        foreground[:] = True
+    rgb, lab = pixels[foreground].astype(np.float32), lab[foreground]
+
+    cells = np.clip(((lab - _LAB_LOW) / _LAB_SPAN * bins).astype(np.intp), 0, bins - 1)
+    bin_ids = (cells[:, 0] * bins + cells[:, 1]) * bins + cells[:, 2]
+    return rgb[bin_ids == np.argmax(np.bincount(bin_ids, minlength=bins ** 3))].mean(axis=0)
+
+
+class ColorPalette:
+    """Lab coordinates of the catalog's baseColours that have a reference RGB value."""
+
+    def __init__(self, colors: Sequence[str]):
+        self.colors = list(colors)
+        available = set(self.colors)
+        self.names = [name for name in BASE_COLOUR_RGB if name in available]
+        self.lab = rgb_to_lab(np.array([BASE_COLOUR_RGB[name] for name in self.names], dtype=np.float32).reshape(-1, 3))
+
+    def closest(self, rgb: np.ndarray) -> str:
+        """Name of the palette color nearest to an RGB color."""
+        if not self.names:
+            logger.warning("No matching colors found between color map and dataset unique colors.")
+            return "Black"
+        distances = np.sum((self.lab - rgb_to_lab(rgb)) ** 2, axis=1)
+        return self.names[int(np.argmin(distances))]
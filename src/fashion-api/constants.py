@@ -290,6 +290,44 @@ COLOR_COMPATIBILITY = {
     "Fluorescent Green": ["Black", "White", "Grey", "Navy Blue", "Pink", "Purple"]
 }
 
+# Colors that go with anything not listed in COLOR_COMPATIBILITY
+NEUTRAL_COLORS = {"Black", "White", "Grey", "Beige", "Navy Blue", "Off White", "Grey Melange"}
+
+# Reference sRGB value of each baseColour, for naming the dominant color of an uploaded image
+BASE_COLOUR_RGB = {
+    "Navy Blue": (0, 0, 128), "Blue": (0, 0, 255), "Black": (0, 0, 0),
+    "Silver": (192, 192, 192), "Grey": (128, 128, 128), "Green": (0, 128, 0),
+    "Purple": (128, 0, 128), "White": (255, 255, 255), "Beige": (245, 245, 220),
+    "Brown": (165, 42, 42), "Bronze": (205, 127, 50), "Teal": (0, 128, 128),
+    "Copper": (184, 115, 51), "Pink": (255, 192, 203), "Off White": (253, 253, 247),
+    "Maroon": (128, 0, 0), "Red": (255, 0, 0), "Khaki": (240, 230, 140),
+    "Orange": (255, 165, 0), "Coffee Brown": (139, 69, 19), "Yellow": (255, 255, 0),
+    "Charcoal": (54, 69, 79), "Gold": (255, 215, 0), "Steel": (176, 196, 222),
+    "Tan": (210, 180, 140), "Magenta": (255, 0, 255), "Lavender": (230, 230, 250),
+    "Sea Green": (46, 139, 87), "Cream": (255, 253, 208), "Peach": (255, 218, 185),
+    "Olive": (128, 128, 0), "Skin": (255, 224, 189), "Burgundy": (128, 0, 32),
+    "Grey Melange": (190, 190, 190), "Rust": (183, 65, 14), "Rose": (255, 0, 127),
+    "Lime Green": (50, 205, 50), "Mauve": (224, 176, 255), "Turquoise Blue": (0, 199, 140),
+    "Metallic": (170, 170, 170), "Mustard": (255, 219, 88), "Taupe": (128, 128, 105),
+    "Nude": (238, 213, 183), "Mushroom Brown": (189, 183, 107), "Fluorescent Green": (127, 255, 0),
+}
+
+# Groups that never pair with another item from the same group (e.g. two tops)
+SELF_INCOMPATIBLE_GROUPS = {"Tops", "Bottomwear", "Dresses", "Outerwear"}
+# Groups that pair with anything
+ACCESSORY_GROUPS = {"Accessories", "Jewellery", "Bags", "Makeup", "Skincare", "Bath and Body", "Haircare", "Fragrance", "Tech Accessories", "Home Decor", "Footwear", "Personal Care"}
+# Article types never paired with Formal items
+FORMAL_EXCLUDED_TYPES = {"Flip Flops", "Sports Sandals"}
+
+# Types that are strongly gendered: recommended only for the exact target gender, not Unisex
+HIGHLY_GENDERED_TYPES = {
+    "Earrings", "Necklace and Chains", "Pendant", "Ring", "Bracelet", "Bangle", "Jewellery Set",
+    "Bra", "Briefs", "Boxers", "Trunk", "Baby Dolls", "Shapewear",
+    "Lipstick", "Lip Gloss", "Nail Polish", "Mascara", "Eyeshadow", # Makeup
+    "Heels", "Skirts", "Dresses", "Lehenga Choli", "Sarees", "Blouse",
+    "Ties", "Cufflinks", "Suspenders", "Ties and Cufflinks",
+}
+
 # constants.py
 
 # Add this dictionary
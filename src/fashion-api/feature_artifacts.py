@@ -0,0 +1,275 @@
+"""Versioned, content-hashed feature artifacts.
+
+Fitted encoders (and the optional ANN projection), the CSR feature matrix, the
+id order and the Annoy index are saved together in one directory named after a
+hash of the catalog contents and the feature parameters. A worker whose catalog hashes to an existing artifact
+set loads it instead of refitting, and any change to the catalog rows (not just
+the row count) produces a new key and therefore a rebuild.
+
+The CSR buffers, the ids, the CatalogStore columns and the exact-search
+postings live in one packed array file that every worker memory-maps read-only, so N workers share one physical
+copy of them through the page cache, the same way they share the Annoy file.
+
+Workers that start together on a new catalog build its set once: the builder
+holds a per-hash build lock and the others wait on it, then load what it
+published. Every worker also holds a shared lease on the set it serves, and
+pruning skips sets that are still leased.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+from contextlib import contextmanager
+from typing import IO, Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn
+from scipy.sparse import csr_matrix
+
+from catalog_snapshot import write_packed_arrays, read_packed_arrays
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 3 # 2: features are stored L2-normalized float32, 3: shared packed array file
+HASHED_COLUMNS = ["id", "gender", "masterCategory", "subCategory", "articleType",
+                  "baseColour", "season", "usage", "productDisplayName"]
+
+MANIFEST_FILE = "manifest.json"
+ENCODERS_FILE = "encoders.pkl"
+SHARED_ARRAYS_FILE = "shared.bin"
+ANNOY_FILE = "annoy.ann"
+LEASE_FILE = "in-use.lock"
+BUILD_LOCK_SUFFIX = ".build.lock"
+
+
+def catalog_content_hash(df: pd.DataFrame, params: Optional[Dict[str, Any]] = None) -> str:
+    """Hash the catalog rows that feed feature generation, plus the feature parameters."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"version": ARTIFACT_VERSION, "params": params or {}}, sort_keys=True).encode("utf-8"))
+    columns = [col for col in HASHED_COLUMNS if col in df.columns]
+    digest.update(",".join(columns).encode("utf-8"))
+    row_hashes = pd.util.hash_pandas_object(df[columns], index=False)
+    digest.update(row_hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def artifact_dir_for(root_dir: str, catalog_hash: str) -> str:
+    """Directory that holds the artifact set for a catalog hash."""
+    return os.path.join(root_dir, catalog_hash[:16])
+
+
+@contextmanager
+def artifact_build_lock(root_dir: str, catalog_hash: str) -> Iterator[None]:
+    """Exclusive per-hash lock held while building an artifact set, so concurrent workers build it once."""
+    os.makedirs(root_dir, exist_ok=True)
+    with open(artifact_dir_for(root_dir, catalog_hash) + BUILD_LOCK_SUFFIX, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def lease_artifact_set(artifact_dir: str) -> IO:
+    """Shared lock marking an artifact set as in use until the returned file is closed."""
+    lease = open(os.path.join(artifact_dir, LEASE_FILE), "a")
+    fcntl.flock(lease, fcntl.LOCK_SH)
+    return lease
+
+
+def _clear_staging_dir(root_dir: str, catalog_hash: str) -> str:
+    staging_dir = f"{artifact_dir_for(root_dir, catalog_hash)}.tmp-{os.getpid()}"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return staging_dir
+
+
+def create_staging_dir(root_dir: str, catalog_hash: str) -> str:
+    """Create an empty staging directory to build a new artifact set into."""
+    staging_dir = _clear_staging_dir(root_dir, catalog_hash)
+    os.makedirs(staging_dir)
+    return staging_dir
+
+
+def stage_artifact_copy(root_dir: str, catalog_hash: str) -> str:
+    """Staging copy of a published artifact set, to rebuild indexes into without touching the published files.
+
+    Files are hard links: the published set is never modified in place and rebuilt
+    files replace their links by rename. The manifest is copied so the new set has
+    its own publish time, and the copy gets its own lease file.
+    """
+    source_dir = artifact_dir_for(root_dir, catalog_hash)
+    staging_dir = _clear_staging_dir(root_dir, catalog_hash)
+    shutil.copytree(source_dir, staging_dir, copy_function=os.link, ignore=shutil.ignore_patterns(LEASE_FILE, MANIFEST_FILE))
+    shutil.copyfile(os.path.join(source_dir, MANIFEST_FILE), os.path.join(staging_dir, MANIFEST_FILE))
+    open(os.path.join(staging_dir, LEASE_FILE), "a").close()
+    return staging_dir
+
+
+def republish_feature_artifacts(staging_dir: str, root_dir: str, catalog_hash: str) -> str:
+    """Replace the published artifact set for a catalog hash with a staged one; hold `artifact_build_lock` around this.
+
+    The previous set is renamed aside rather than deleted, so workers still serving
+    it keep their files until they release its lease and pruning removes it.
+    """
+    final_dir = artifact_dir_for(root_dir, catalog_hash)
+    os.replace(final_dir, f"{final_dir}.retired-{time.time_ns()}")
+    os.replace(staging_dir, final_dir)
+    logger.info(f"Feature artifacts republished to {final_dir}")
+    return final_dir
+
+
+def save_feature_artifacts(
+    staging_dir: str,
+    root_dir: str,
+    catalog_hash: str,
+    onehot_encoder,
+    tfidf_vectorizer,
+    combined_features: csr_matrix,
+    ids,
+    keep: int = 2,
+    projection=None,
+    catalog_arrays: Optional[Dict[str, np.ndarray]] = None,
+    index_arrays: Optional[Dict[str, np.ndarray]] = None
+) -> str:
+    """Write the artifact set into the staging dir and publish it under its hash.
+
+    The Annoy index is expected to already be saved in the staging dir as ANNOY_FILE.
+    `catalog_arrays` (from CatalogStore.shared_arrays) and `index_arrays` (exact-search postings,
+    from SparseExactIndex.shared_arrays) are packed next to the features.
+    """
+    start_time = time.time()
+    with open(os.path.join(staging_dir, ENCODERS_FILE), "wb") as f:
+        pickle.dump({"onehot_encoder": onehot_encoder, "tfidf_vectorizer": tfidf_vectorizer,
+                     "projection": projection}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    combined_features = combined_features.tocsr()
+    arrays = {
+        "features.data": combined_features.data,
+        "features.indices": combined_features.indices,
+        "features.indptr": combined_features.indptr,
+        "ids": np.asarray(ids).astype(np.int64),
+    }
+    arrays.update({f"catalog.{name}": array for name, array in (catalog_arrays or {}).items()})
+    arrays.update({f"index.{name}": array for name, array in (index_arrays or {}).items()})
+    write_packed_arrays(os.path.join(staging_dir, SHARED_ARRAYS_FILE), arrays,
+                        {"feature_shape": list(combined_features.shape)})
+
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "catalog_hash": catalog_hash,
+        "sklearn_version": sklearn.__version__,
+        "n_items": int(combined_features.shape[0]),
+        "feature_dim": int(combined_features.shape[1]),
+        "index_dim": int(projection.n_components) if projection is not None else int(combined_features.shape[1]),
+        "created_at": time.time(),
+    }
+    with open(os.path.join(staging_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    open(os.path.join(staging_dir, LEASE_FILE), "a").close()
+
+    final_dir = artifact_dir_for(root_dir, catalog_hash)
+    try:
+        os.replace(staging_dir, final_dir)
+    except OSError:
+        if not os.path.exists(os.path.join(final_dir, MANIFEST_FILE)):
+            raise
+        # Another worker published the same catalog first; its files are identical.
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return final_dir
+    logger.info(f"Feature artifacts saved to {final_dir} in {time.time() - start_time:.2f} seconds.")
+    prune_feature_artifacts(root_dir, keep=keep)
+    return final_dir
+
+
+def read_shared_arrays(path: str) -> Tuple[csr_matrix, np.ndarray, Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """Feature matrix, ids, catalog and index arrays of a shared array file, as read-only views over its memory map."""
+    arrays, meta = read_packed_arrays(path)
+    combined_features = csr_matrix((arrays["features.data"], arrays["features.indices"], arrays["features.indptr"]),
+                                   shape=tuple(meta["feature_shape"]), copy=False)
+    catalog_arrays = {name[len("catalog."):]: array for name, array in arrays.items() if name.startswith("catalog.")}
+    index_arrays = {name[len("index."):]: array for name, array in arrays.items() if name.startswith("index.")}
+    return combined_features, arrays["ids"], catalog_arrays, index_arrays
+
+
+def load_feature_artifacts(root_dir: str, catalog_hash: str) -> Optional[Dict[str, Any]]:
+    """Load the artifact set for a catalog hash, or return None if it must be rebuilt."""
+    artifact_dir = artifact_dir_for(root_dir, catalog_hash)
+    manifest_path = os.path.join(artifact_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        logger.info(f"No feature artifacts found for catalog hash {catalog_hash[:16]}.")
+        return None
+
+    start_time = time.time()
+    lease = None
+    try:
+        # Lease before reading so a concurrent prune cannot remove the set underneath us
+        lease = lease_artifact_set(artifact_dir)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != ARTIFACT_VERSION or manifest.get("catalog_hash") != catalog_hash:
+            logger.info(f"Feature artifacts in {artifact_dir} are outdated.")
+            lease.close()
+            return None
+        if manifest.get("sklearn_version") != sklearn.__version__:
+            logger.info(f"Feature artifacts were fitted with scikit-learn {manifest.get('sklearn_version')}, rebuilding.")
+            lease.close()
+            return None
+
+        with open(os.path.join(artifact_dir, ENCODERS_FILE), "rb") as f:
+            encoders = pickle.load(f)
+        combined_features, ids, catalog_arrays, index_arrays = read_shared_arrays(os.path.join(artifact_dir, SHARED_ARRAYS_FILE))
+    except Exception as e:
+        logger.warning(f"Failed to load feature artifacts from {artifact_dir}: {e}")
+        if lease is not None:
+            lease.close()
+        return None
+
+    annoy_path = os.path.join(artifact_dir, ANNOY_FILE)
+    logger.info(f"Feature artifacts loaded from {artifact_dir} in {time.time() - start_time:.2f} seconds.")
+    return {
+        "manifest": manifest,
+        "onehot_encoder": encoders["onehot_encoder"],
+        "tfidf_vectorizer": encoders["tfidf_vectorizer"],
+        "projection": encoders.get("projection"),
+        "combined_features": combined_features,
+        "ids": ids,
+        "catalog_arrays": catalog_arrays or None,
+        "index_arrays": index_arrays or None,
+        "annoy_path": annoy_path if os.path.exists(annoy_path) else None,
+        "lease": lease,
+    }
+
+
+def prune_feature_artifacts(root_dir: str, keep: int = 2):
+    """Remove published artifact sets older than the `keep` newest ones that no worker still leases.
+
+    The newest set and its predecessor are always kept, since workers that have
+    not restarted yet may still be serving the predecessor.
+    """
+    if not os.path.isdir(root_dir):
+        return
+    manifests = [os.path.join(root_dir, name, MANIFEST_FILE) for name in os.listdir(root_dir)
+                 if ".tmp-" not in name and not name.endswith(BUILD_LOCK_SUFFIX)]
+    manifests = [path for path in manifests if os.path.exists(path)]
+    manifests.sort(key=os.path.getmtime, reverse=True)
+    for manifest_path in manifests[max(keep, 2):]:
+        stale_dir = os.path.dirname(manifest_path)
+        with open(os.path.join(stale_dir, LEASE_FILE), "a") as lease:
+            try:
+                fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info(f"Keeping stale feature artifacts {stale_dir}: still in use.")
+                continue
+            logger.info(f"Removing stale feature artifacts {stale_dir}")
+            shutil.rmtree(stale_dir, ignore_errors=True)
+        try:
+            os.remove(stale_dir + BUILD_LOCK_SUFFIX)
+        except FileNotFoundError:
+            pass
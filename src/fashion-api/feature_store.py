@@ -0,0 +1,52 @@
+"""L2-normalized float32 feature rows, plus a cache of dense rows for hot items.
+
+The catalog features are stored unit-length in float32 from build time on,
+so the cosine similarity of two items is a plain (sparse) dot product and no
+similarity path has to renormalize rows or allocate float64 copies; the
+matrix also takes half the memory. Query vectors built at request time (e.g.
+from image attributes) go through `normalize_features` to live in the same space.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+from sklearn.preprocessing import normalize
+
+FEATURE_DTYPE = np.float32
+
+
+def normalize_features(features) -> csr_matrix:
+    """Row-normalized float32 CSR copy of a feature matrix (empty rows stay empty)."""
+    features = features.tocsr() if issparse(features) else csr_matrix(features)
+    return normalize(features.astype(FEATURE_DTYPE), norm="l2", copy=False)
+
+
+class DenseRowCache:
+    """LRU cache of dense float32 feature rows for recently requested catalog positions."""
+
+    def __init__(self, features: csr_matrix, max_rows: int = 1024):
+        self.features = features
+        self.max_rows = max_rows
+        self._rows: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, position: int) -> np.ndarray:
+        """Read-only dense row of a catalog position."""
+        position = int(position)
+        with self._lock:
+            row = self._rows.get(position)
+            if row is not None:
+                self._rows.move_to_end(position)
+                return row
+        row = self.features[position].toarray().ravel().astype(FEATURE_DTYPE, copy=False)
+        row.setflags(write=False)
+        with self._lock:
+            self._rows[position] = row
+            while len(self._rows) > self.max_rows:
+                self._rows.popitem(last=False)
+        return row
+
+    def __len__(self) -> int:
+        return len(self._rows)
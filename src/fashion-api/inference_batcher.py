@@ -0,0 +1,112 @@
+"""Micro-batching queue for model inference (CLIP image and text embeddings).
+
+Concurrent requests each need one embedding, and running them one at a time
+with batch size 1 leaves most of the CPU's SIMD width and the model's
+per-call overhead on the table. A `MicroBatcher` owns one worker thread:
+callers enqueue a single input and wait on a future; the worker takes the
+first waiting input, gathers more until it has `max_batch_size` of them or
+`max_wait_ms` has passed, runs one batched forward pass and resolves every
+caller's future with its own row. Under light load a request waits at most
+`max_wait_ms` extra; under heavy load throughput grows with the batch size.
+A batch that fails, or returns a different number of rows than it was given,
+fails every caller in it, and blocking callers give up after `timeout`
+seconds, so no caller waits forever on the worker.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Single-input calls answered by batched calls of `batch_fn` on one worker thread.
+
+    `batch_fn` takes a list of inputs and returns one result per input, in order.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Sequence[Any]], max_batch_size: int = 16,
+                 max_wait_ms: float = 5.0, name: str = "inference", timeout: Optional[float] = 30.0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout # Seconds a blocking call waits for its result (None: no limit)
+        self.name = name
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self._worker = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one input; the future resolves to its result."""
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        """Blocking single-input call (for code already running on a worker thread).
+
+        Raises concurrent.futures.TimeoutError if the result takes longer than `timeout`.
+        """
+        future = self.submit(item)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel() # Skipped by the worker if it is still queued
+            raise
+
+    def _gather(self, first: tuple) -> List[tuple]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None: # Closing: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [entry for entry in self._gather(first) if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = list(self.batch_fn([item for item, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(batch)} inputs")
+            except BaseException as e: # Even a BaseException must not leave callers waiting or stop the worker
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e!r}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {"batches": self.batches, "items": self.items, "largest_batch": self.largest_batch,
+                    "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                    "queued": self._queue.qsize()}
+
+    def close(self):
+        """Stop the worker after the inputs already queued."""
+        self._queue.put(None)
@@ -0,0 +1,59 @@
+"""Catalog items pre-serialized to JSON once, indexed by row position.
+
+Every item's response JSON (the `Item` model, including image_url) is built
+when the catalog loads and kept in one byte blob plus row offsets. Endpoints
+assemble their bodies by joining these fragments and return them as raw
+bytes, so per-item cost at request time is a slice and a join instead of a
+dict, a pydantic model and a serialization pass.
+"""
+
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+from catalog_store import CatalogStore
+
+logger = logging.getLogger(__name__)
+
+
+class ItemFragments:
+    """Item JSON fragments for every catalog row position."""
+
+    def __init__(self, catalog: CatalogStore, serialize: Callable[[Dict[str, Any]], bytes]):
+        start_time = time.time()
+        self.catalog = catalog
+        self._serialize = serialize
+        fragments = []
+        missing_price = np.zeros(len(catalog), dtype=bool)
+        for position in range(len(catalog)):
+            item = catalog.item(position)
+            missing_price[position] = item.get("price") is None or item["price"] != item["price"]
+            fragments.append(serialize(item))
+        self.offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+        np.cumsum([len(fragment) for fragment in fragments], out=self.offsets[1:])
+        self.data = b"".join(fragments)
+        self.missing_price = missing_price
+        logger.info(f"Pre-serialized {len(fragments)} catalog items ({len(self.data) / 1e6:.1f} MB) "
+                    f"in {time.time() - start_time:.2f} seconds.")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, position: int, default_price: Optional[float] = None) -> bytes:
+        """JSON of the item at a row position; `default_price` fills in a missing price."""
+        position = int(position)
+        if default_price is not None and self.missing_price[position]:
+            return self._serialize({**self.catalog.item(position), "price": default_price})
+        return self.data[self.offsets[position]:self.offsets[position + 1]]
+
+    def array(self, positions: Iterable[int], default_price: Optional[float] = None) -> bytes:
+        """JSON array of the items at the given row positions, in order."""
+        return b"[" + b",".join(self.get(position, default_price) for position in positions) + b"]"
+
+
+def json_fragment(value: Any) -> bytes:
+    """Compact UTF-8 JSON for small response parts (keys, metrics) around item fragments."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,44 @@
+"""Per-request latency budget that recommendation stages consult to degrade gracefully.
+
+A budget starts when the request starts (so time spent queued for a worker
+counts against it) and is passed through the pipeline stages. Before an
+expensive step a stage asks whether enough of the budget remains; if not, it
+takes a cheaper path (a smaller candidate pool, fewer low-priority types,
+relevance order instead of MMR) and records the degradation, which the
+response then reports. Tail latency becomes bounded by the budget instead of
+by the slowest item's candidate pool.
+"""
+
+import logging
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+REDUCED_POOL = "reduced_pool"
+DROPPED_ACCESSORY_TYPES = "dropped_accessory_types"
+RELEVANCE_ORDER = "relevance_order"
+
+
+class LatencyBudget:
+    """Deadline for one request plus the degradations taken to meet it."""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds # None: unlimited, nothing ever degrades
+        self.started_at = time.monotonic()
+        self.degradations: List[str] = []
+
+    def remaining(self) -> float:
+        if self.seconds is None:
+            return float("inf")
+        return self.seconds - (time.monotonic() - self.started_at)
+
+    def should_degrade(self, degradation: str, reserve: float) -> bool:
+        """True (and records `degradation`) when less than `reserve` seconds remain."""
+        if self.remaining() >= reserve:
+            return False
+        if degradation not in self.degradations:
+            self.degradations.append(degradation)
+            logger.warning(f"Latency budget of {self.seconds}s running low "
+                           f"({max(self.remaining(), 0.0) * 1000:.0f} ms left): {degradation}")
+        return True
@@ -1,15 +1,22 @@
 """Main FastAPI application with ML model and database integration using SQLite and SQLAlchemy."""
 
 import os
+import secrets
+import shutil
 from random import random, sample, shuffle, randint
-from typing import List, Dict, Any, Optional
+from typing import IO, List, Dict, Any, Optional, Sequence, Tuple
 from contextlib import asynccontextmanager
 from io import BytesIO
 import time
+import asyncio
+import hashlib
+import json
+import threading
 
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends, Header
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from sqlalchemy import create_engine, text, Column, Integer, String, Float, select, MetaData, Table, inspect
 from sqlalchemy.orm import sessionmaker
@@ -18,16 +25,42 @@ from sqlalchemy.orm import Session
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import OneHotEncoder
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.cluster import KMeans
 from scipy.sparse import hstack, vstack, csr_matrix
 import numpy as np
 from PIL import Image
-from transformers import CLIPProcessor, CLIPModel
+from transformers import CLIPProcessor
 import chromadb
 from chromadb.utils.embedding_functions import OpenCLIPEmbeddingFunction
 from annoy import AnnoyIndex
-from constants import ARTICLE_TYPE_GROUPS, ACCESSORY_COMBINATIONS, SEASONAL_ACCESSORIES, COMPATIBLE_TYPES, COLOR_COMPATIBILITY
+from constants import (ARTICLE_TYPE_GROUPS, ACCESSORY_COMBINATIONS, SEASONAL_ACCESSORIES, COMPATIBLE_TYPES,
+                       COLOR_COMPATIBILITY, USAGE_COMPATIBILITY, SELF_INCOMPATIBLE_GROUPS, ACCESSORY_GROUPS,
+                       FORMAL_EXCLUDED_TYPES)
+from catalog_snapshot import read_catalog_frame, catalog_source_signature, load_catalog_snapshot, write_catalog_snapshot
+from feature_artifacts import (catalog_content_hash, create_staging_dir, save_feature_artifacts,
+                               load_feature_artifacts, artifact_dir_for, artifact_build_lock, lease_artifact_set,
+                               stage_artifact_copy, republish_feature_artifacts, prune_feature_artifacts,
+                               ANNOY_FILE)
+from catalog_store import CatalogStore
+from color_matrix import ColorCompatibilityMatrix, color_compatibility
+from color_palette import ColorPalette, dominant_color
+from outfit_rules import CompiledOutfitRules, group_of, group_types, target_types, gender_group
+from outfit_store import OutfitStore, OUTFITS_FILE
+from response_cache import ResponseCache
+from projection import FeatureProjection, recall_vs_exact
+from sparse_search import SparseExactIndex, SPARSE_INDEX_PREFIX
+from mmr import mmr_select, mmr_rank
+from feature_store import normalize_features, DenseRowCache
+from item_fragments import ItemFragments, json_fragment
+from clip_labels import LabelEmbeddings
+from clip_backends import ClipBackend, load_clip_backend, CLIP_MODEL_NAME
+from inference_batcher import MicroBatcher
+from annoy_builder import build_annoy_index_file, submit_annoy_build, submit_build_job, shutdown_build_executor
+from partitioned_index import (PartitionedIndex, PARTITIONS_DIR, catalog_partitions, build_partition_annoy_files,
+                               exact_partition_arrays)
+from readiness import ReadinessTracker, LOADING
+from bounded_executor import BoundedExecutor, Overloaded
+from single_flight import SingleFlight
+from latency_budget import LatencyBudget, REDUCED_POOL, DROPPED_ACCESSORY_TYPES, RELEVANCE_ORDER
 import logging
 from sklearn.metrics import ndcg_score
 # --- Add these imports if not already present ---
@@ -43,9 +76,52 @@ DATABASE_URL = "sqlite:///./database/fashion.db" # SQLite database file path
 STATIC_DIR = "static"
 CHROMA_DB_PATH = "../../database/production_fashion.db" # ChromaDB path - might not be directly used in this version but kept for consistency
 CORS_ORIGINS = ["http://localhost:5173", "http://localhost:5174"]
-ANNOY_INDEX_PATH = "fashion_annoy_index.ann"
+FEATURE_ARTIFACTS_DIR = "artifacts" # Content-hashed encoders, features and Annoy index
+FEATURE_ARTIFACTS_KEEP = 2
+READINESS_RETRY_AFTER_SECONDS = 5 # Retry-After sent while a startup component is warming up
 ANNOY_N_TREES = 50
 ANNOY_SEARCH_K_FACTOR = 100
+RETRIEVAL_BACKEND = "annoy" # Candidate retrieval: "annoy" (ANN index) or "sparse" (exact inverted-index search)
+PARTITIONED_RETRIEVAL = True # Query per-articleType partitions instead of filtering one large global pool
+PARTITION_BY_GENDER = False # Split each articleType partition by gender as well
+PARTITION_EXACT_MAX_ITEMS = 5000 # Partitions up to this size are scanned exactly; larger ones get an Annoy sub-index
+PARTITION_ANNOY_N_TREES = 20
+PARTITION_CANDIDATES_PER_TYPE = 100 # Nearest items fetched per recommended type from its partition
+OUTFIT_STORE_ENABLED = True # Serve product pages from the materialized outfit store when one matches
+RESPONSE_CACHE_MAX_ENTRIES = 5000 # Product-page / image responses kept in the in-process LRU cache
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESPONSE_CACHE_TTL_SECONDS = 600
+DEFAULT_PRICE = 29.99 # Shown in product listings for items without a price
+DENSE_ROW_CACHE_SIZE = 1024 # Dense feature rows of recently requested items kept for similarity scoring
+ANNOY_BUILD_JOBS = -1 # Threads for Annoy's tree build (-1 = all cores)
+ANNOY_ON_DISK_BUILD = False # Build the index directly into its file instead of in RAM
+ANN_PROJECTION_METHOD = None # None (raw features), "svd" or "random": project vectors before indexing
+ANN_PROJECTION_DIM = 128 # Target dimensionality for the ANN projection (64-256)
+CATALOG_SNAPSHOT_ENABLED = True # Load the catalog from a columnar snapshot instead of the ORM
+CATALOG_SNAPSHOT_PATH = "catalog_snapshot.bin"
+REQUEST_LANES = { # Per-endpoint limits for CPU-bound work run off the event loop
+    "product_page": {"max_concurrency": 4, "max_queue": 64, "queue_timeout": 5.0},
+    "image": {"max_concurrency": 2, "max_queue": 8, "queue_timeout": 10.0},
+    "search": {"max_concurrency": 2, "max_queue": 16, "queue_timeout": 5.0},
+    "products": {"max_concurrency": 4, "max_queue": 64, "queue_timeout": 2.0},
+    "evaluate": {"max_concurrency": 1, "max_queue": 0, "queue_timeout": 0.0},
+}
+ADMIN_API_TOKEN = None # Token required in the X-Admin-Token header of /api/admin/*; None disables those endpoints
+OVERLOAD_RETRY_AFTER_SECONDS = 1 # Retry-After sent when a lane sheds load
+PRODUCT_PAGE_LATENCY_BUDGET = 0.5 # Seconds for an outfit (queue wait included) before stages start degrading
+IMAGE_LATENCY_BUDGET = 2.0 # Same for image recommendations, which include CLIP inference
+BUDGET_RESERVE_FULL_POOL = 0.4 # Remaining seconds needed to retrieve and rank full candidate pools
+BUDGET_RESERVE_ACCESSORIES = 0.2 # Remaining seconds needed to also rank usage/season accessory types
+BUDGET_RESERVE_MMR = 0.1 # Remaining seconds needed for MMR diversification instead of relevance order
+DEGRADED_POOL_FRACTION = 0.25 # Share of the candidate pool kept when it has to shrink
+DEGRADED_POOL_MIN_ITEMS = 20 # Candidates a type always keeps when its pool shrinks
+CLIP_BATCH_MAX_SIZE = 16 # Images (or search texts) embedded together in one CLIP forward pass
+CLIP_BATCH_MAX_WAIT_MS = 5 # Longest a request waits for concurrent ones to join its batch
+CLIP_BATCH_TIMEOUT_SECONDS = 30.0 # Longest a request waits for its CLIP embedding before giving up
+CLIP_BACKEND = "torch" # "torch" (fp32), "torch-int8" (dynamically quantized Linear layers) or "onnx" (ONNX Runtime)
+CLIP_ONNX_DIR = "clip_onnx" # Where the "onnx" backend exports the CLIP towers on first load
+CLIP_INTRA_OP_THREADS = 4 # Threads the CLIP backend uses inside one operator (matmuls, convolutions)
+CLIP_INTER_OP_THREADS = 1 # Threads the CLIP backend uses to run independent operators side by side
 
 # --- SQLAlchemy Setup ---
 engine = create_engine(DATABASE_URL)
@@ -93,6 +169,7 @@ class Item(BaseModel):
 class OutfitRecommendation(BaseModel):
     recommendations: Dict[str, List[Item]]
     metrics: Optional[Dict[str, float]] = None
+    degradations: Optional[List[str]] = None # Cheaper paths taken to stay within the latency budget
 
 class ProductPageResponse(BaseModel):
     product: Item
@@ -121,36 +198,38 @@ class ProductsSortParams(BaseModel):
 
 # --- Database Module ---
 def load_data() -> pd.DataFrame:
-    """Load data from the database using SQLAlchemy."""
+    """Load the catalog column-wise, preferring the columnar snapshot when it is fresh."""
     logger.info("Loading data from database...")
     start_time = time.time()
-    db: Session = SessionLocal()
-    try:
-        items = db.query(ClothingItem).all()
-        df = pd.DataFrame([item.__dict__ for item in items])
-        df["id"] = df["id"].astype(str) # Keep IDs as strings internally
-    finally:
-        db.close()
+    df = None
+    if CATALOG_SNAPSHOT_ENABLED:
+        source_signature = catalog_source_signature(engine)
+        df = load_catalog_snapshot(CATALOG_SNAPSHOT_PATH, source_signature)
+    if df is None:
+        df = read_catalog_frame(engine)
+        if CATALOG_SNAPSHOT_ENABLED:
+            try:
+                write_catalog_snapshot(df, CATALOG_SNAPSHOT_PATH, source_signature)
+            except OSError as e:
+                logger.warning(f"Could not write catalog snapshot to {CATALOG_SNAPSHOT_PATH}: {e}")
     logger.info(f"Data loaded in {time.time() - start_time:.2f} seconds. Shape: {df.shape}")
     return df
 
 def get_item(item_id: str) -> Optional[Dict[str, Any]]:
-    """Retrieve an item from the database by string ID using SQLAlchemy."""
+    """Retrieve an item from the catalog store by ID."""
     try:
-        if ml_model.df is None:
-            logger.error("DataFrame not loaded.")
-            raise HTTPException(status_code=500, detail="Server data not initialized")
+        if ml_model.catalog is None:
+            logger.error("Catalog not loaded.")
+            raise service_unavailable("catalog")
 
-        item_series = ml_model.df[ml_model.df["id"] == item_id]
-        if item_series.empty:
-             logger.warning(f"Item with ID {item_id} not found in dataframe.")
+        position = ml_model.catalog.position_of(item_id)
+        if position is None:
+             logger.warning(f"Item with ID {item_id} not found in catalog.")
              return None
 
-        item = item_series.iloc[0].to_dict()
-        item_id_int = int(item['id'])
-        item["id"] = item_id_int
-        item["image_url"] = f"/static/images/{item_id_int}.jpg"
-        return item
+        return ml_model.catalog.item(position)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving item {item_id}: {e}")
         raise HTTPException(status_code=404, detail=f"Item {item_id} retrieval error: {e}")
@@ -161,32 +240,97 @@ class MLModel:
     """Class to store ML model and data for the application."""
     def __init__(self):
         self.df: Optional[pd.DataFrame] = None
-        self.combined_features: Optional[csr_matrix] = None
+        self.catalog: Optional[CatalogStore] = None
+        self.color_matrix: Optional[ColorCompatibilityMatrix] = None
+        self.color_palette: Optional[ColorPalette] = None
+        self.rules: Optional[CompiledOutfitRules] = None
+        self.item_fragments: Optional[ItemFragments] = None
+        self.combined_features: Optional[csr_matrix] = None # L2-normalized float32 rows
+        self.dense_rows: Optional[DenseRowCache] = None
         self.feature_dim: Optional[int] = None
-        self.id_to_index: Dict[str, int] = {}
-        self.index_to_id: Dict[int, str] = {}
+        self.projection: Optional[FeatureProjection] = None
+        self.index_dim: Optional[int] = None
         self.onehot_encoder: Optional[OneHotEncoder] = None
         self.tfidf_vectorizer: Optional[TfidfVectorizer] = None
-        self.clip_model: Optional[CLIPModel] = None
+        self.clip_model: Optional[ClipBackend] = None # Image/text encoders of the configured CLIP_BACKEND
         self.clip_processor: Optional[CLIPProcessor] = None
+        self.label_embeddings: Optional[LabelEmbeddings] = None # CLIP text embeddings of the attribute labels
+        self.clip_image_batcher: Optional[MicroBatcher] = None
+        self.clip_text_embedder: Optional[OpenCLIPEmbeddingFunction] = None # Text tower behind /api/search
+        self.clip_text_batcher: Optional[MicroBatcher] = None
         self.chroma_client: Optional[chromadb.Client] = None
         self.annoy_index: Optional[AnnoyIndex] = None
+        self.sparse_index: Optional[SparseExactIndex] = None
+        self.index_arrays: Optional[Dict[str, np.ndarray]] = None # Exact-search postings from the shared array file
+        self.partitioned_index: Optional[PartitionedIndex] = None
+        self.outfit_store: Optional[OutfitStore] = None
+        self.annoy_path: Optional[str] = None
+        self.catalog_hash: Optional[str] = None
+        self.artifact_lease: Optional[IO] = None # Shared lock keeping the served artifact set from being pruned
 
 ml_model = MLModel()
+readiness = ReadinessTracker(["catalog", "recommender", "clip", "chroma"])
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS)
+request_executor = BoundedExecutor(REQUEST_LANES)
+coalesced_requests = SingleFlight() # Concurrent identical product/image/search requests share one computation
+
+def service_unavailable(*components: str) -> HTTPException:
+    """503 for requests that need startup components which are not ready yet."""
+    pending = readiness.not_ready_components(list(components))
+    logger.warning(f"Rejecting request, components not ready: {pending}")
+    return HTTPException(status_code=503, detail=f"Service is warming up, not ready: {pending}",
+                         headers={"Retry-After": str(READINESS_RETRY_AFTER_SECONDS)})
+
+async def run_in_lane(lane: str, fn, *args, **kwargs):
+    """Run blocking endpoint work on the bounded executor; overload becomes 429/503 with Retry-After."""
+    try:
+        return await request_executor.run(lane, fn, *args, **kwargs)
+    except Overloaded as e:
+        logger.warning(f"Shedding load: {e}")
+        raise HTTPException(status_code=e.status_code, detail=f"Server busy: {e}",
+                            headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_SECONDS)})
+
+def load_clip_stage():
+    """Load the CLIP model used by image recommendations and start its batching queue."""
+    ml_model.clip_model, ml_model.clip_processor = init_ml_model()
+    if ml_model.clip_image_batcher is not None:
+        ml_model.clip_image_batcher.close()
+    ml_model.clip_image_batcher = MicroBatcher(lambda images: ml_model.clip_model.encode_images(images),
+                                               CLIP_BATCH_MAX_SIZE, CLIP_BATCH_MAX_WAIT_MS, name="clip-images",
+                                               timeout=CLIP_BATCH_TIMEOUT_SECONDS)
+
+_text_embedder_lock = threading.Lock()
+
+def clip_text_batcher() -> MicroBatcher:
+    """Batching queue for search-query embeddings; the OpenCLIP text model loads on first use."""
+    with _text_embedder_lock:
+        if ml_model.clip_text_batcher is None:
+            ml_model.clip_text_embedder = OpenCLIPEmbeddingFunction()
+            ml_model.clip_text_batcher = MicroBatcher(ml_model.clip_text_embedder, CLIP_BATCH_MAX_SIZE,
+                                                      CLIP_BATCH_MAX_WAIT_MS, name="clip-texts",
+                                                      timeout=CLIP_BATCH_TIMEOUT_SECONDS)
+    return ml_model.clip_text_batcher
+
+def load_chroma_stage():
+    """Open the ChromaDB client used by text search."""
+    ml_model.chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    try:
+         ml_model.chroma_client.get_collection("fashion")
+         logger.info("ChromaDB client initialized and 'fashion' collection found.")
+    except Exception:
+         logger.warning("ChromaDB 'fashion' collection not found. Search endpoint might fail.")
 
 def init_ml_model() -> tuple:
-    """Initialize the CLIP model and processor."""
-    logger.info("Initializing CLIP model...")
+    """Initialize the configured CLIP backend and its processor."""
+    logger.info(f"Initializing CLIP model ({CLIP_BACKEND} backend)...")
     start_time = time.time()
-    clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-    clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+    clip_model = load_clip_backend(CLIP_BACKEND, CLIP_MODEL_NAME, CLIP_ONNX_DIR,
+                                   CLIP_INTRA_OP_THREADS, CLIP_INTER_OP_THREADS)
     logger.info(f"CLIP model initialized in {time.time() - start_time:.2f} seconds.")
-    return clip_model, clip_processor
+    return clip_model, clip_model.processor
 
-def preprocess_data(df: pd.DataFrame) -> tuple:
-    """Preprocess the dataframe with enhanced features for ML model."""
-    logger.info("Preprocessing data...")
-    start_time = time.time()
+def fill_missing_values(df: pd.DataFrame):
+    """Fill missing attribute values in place with each column's mode."""
     columns_to_fill = ["baseColour", "productDisplayName", "articleType", "gender",
                        "masterCategory", "subCategory", "season", "usage"]
     for col in columns_to_fill:
@@ -199,6 +343,12 @@ def preprocess_data(df: pd.DataFrame) -> tuple:
             logger.warning(f"Column '{col}' not found in DataFrame during preprocessing.")
             df[col] = "Unknown"
 
+def preprocess_data(df: pd.DataFrame) -> tuple:
+    """Preprocess the dataframe with enhanced features for ML model."""
+    logger.info("Preprocessing data...")
+    start_time = time.time()
+    fill_missing_values(df)
+
     categorical_cols = ["gender", "masterCategory", "subCategory", "articleType",
                         "baseColour", "season", "usage"]
     categorical_cols = [col for col in categorical_cols if col in df.columns]
@@ -227,37 +377,74 @@ def preprocess_data(df: pd.DataFrame) -> tuple:
         combined_features = feature_list[0]
     else:
         combined_features = hstack(feature_list).tocsr()
+    # Unit-length float32 rows: cosine similarity is a plain dot product everywhere downstream
+    combined_features = normalize_features(combined_features)
 
-    logger.info(f"Combined features created. Shape: {combined_features.shape}")
-
-    id_to_index = {str(row["id"]): idx for idx, row in df.iterrows()}
-    index_to_id = {idx: str(row["id"]) for idx, row in df.iterrows()}
+    logger.info(f"Combined features created (L2-normalized float32). Shape: {combined_features.shape}")
 
     logger.info(f"Preprocessing completed in {time.time() - start_time:.2f} seconds.")
-    return onehot_encoder, tfidf_vectorizer, combined_features, id_to_index, index_to_id
+    return onehot_encoder, tfidf_vectorizer, combined_features
 
 
 def build_annoy_index(features: csr_matrix, index_path: str):
-    """Builds and saves an Annoy index."""
+    """Builds and saves an Annoy index in this process."""
     logger.info("Building Annoy index...")
-    start_time = time.time()
+    build_annoy_index_file(features, index_path, ANNOY_N_TREES,
+                           n_jobs=ANNOY_BUILD_JOBS, on_disk=ANNOY_ON_DISK_BUILD)
     feature_dim = features.shape[1]
-    annoy_index = AnnoyIndex(feature_dim, 'angular')
-
-    for i in range(features.shape[0]):
-        vector = features[i].toarray().flatten()
-        annoy_index.add_item(i, vector)
-        if (i + 1) % 5000 == 0:
-            logger.info(f"Added {i+1}/{features.shape[0]} items to Annoy index.")
-
-    logger.info(f"Building {ANNOY_N_TREES} trees...")
-    annoy_index.build(ANNOY_N_TREES)
-    logger.info(f"Annoy index built with {annoy_index.get_n_items()} items in {time.time() - start_time:.2f} seconds.")
-
-    logger.info(f"Saving Annoy index to {index_path}...")
-    annoy_index.save(index_path)
-    logger.info("Annoy index saved.")
-    return annoy_index, feature_dim
+    return load_annoy_index(feature_dim, index_path), feature_dim
+
+def build_annoy_index_in_background(features: csr_matrix, index_path: str):
+    """Builds and saves an Annoy index in the background build process (returns a future)."""
+    logger.info(f"Submitting Annoy index build for {features.shape[0]} items to the build process...")
+    return submit_annoy_build(features, index_path, ANNOY_N_TREES,
+                              n_jobs=ANNOY_BUILD_JOBS, on_disk=ANNOY_ON_DISK_BUILD)
+
+def ann_index_vectors(features: csr_matrix):
+    """Vectors the Annoy index is built on: the raw features, or their projection if configured."""
+    if ml_model.projection is not None:
+        return ml_model.projection.transform(features)
+    return features
+
+def ann_query_vector(target_features: csr_matrix) -> np.ndarray:
+    """Dense Annoy query vector for a single feature row."""
+    if ml_model.projection is not None:
+        return ml_model.projection.transform(target_features)[0]
+    return target_features.toarray().flatten()
+
+def retrieval_index():
+    """The index behind the configured retrieval backend (None until it is loaded)."""
+    return ml_model.sparse_index if RETRIEVAL_BACKEND == "sparse" else ml_model.annoy_index
+
+def retrieve_candidates(target_features: csr_matrix, n: int) -> List[int]:
+    """Catalog positions of the n items nearest to a feature row, best first."""
+    if RETRIEVAL_BACKEND == "sparse":
+        positions, _ = ml_model.sparse_index.search(target_features, n)
+        return positions.tolist()
+    positions, _ = ml_model.annoy_index.get_nns_by_vector(ann_query_vector(target_features), n,
+                                                          search_k=-1, include_distances=True)
+    return positions
+
+def partition_candidates(
+    target_features: csr_matrix,
+    article_types: List[str],
+    genders: Optional[List[str]],
+    exclude: Optional[int] = None,
+    per_type: Optional[int] = None
+) -> List[int]:
+    """Nearest items of each type from its own partition, falling back to the type's group if it has none."""
+    index = ml_model.partitioned_index
+    per_type = per_type or PARTITION_CANDIDATES_PER_TYPE
+    query_vector = ann_query_vector(target_features) if index.has_annoy else None
+    pool = []
+    for article_type in article_types:
+        found = index.search(index.keys_for([article_type], genders), target_features, query_vector,
+                             per_type, exclude)
+        if not found and group_types(article_type):
+            found = index.search(index.keys_for(group_types(article_type), genders), target_features,
+                                 query_vector, per_type, exclude)
+        pool.extend(found)
+    return list(dict.fromkeys(pool))
 
 def load_annoy_index(feature_dim: int, index_path: str) -> Optional[AnnoyIndex]:
     """Loads an Annoy index from disk."""
@@ -277,50 +464,15 @@ def optimized_mmr(
     candidate_indices: List[int],
     candidate_features: csr_matrix,
     top_n: int,
-    lambda_param: float = 0.5
+    lambda_param: float = 0.5,
+    normalized: bool = False
 ) -> List[int]:
-    """Optimized MMR selection on a pre-filtered candidate set."""
+    """Optimized MMR selection on a pre-filtered candidate set (O(N·k), no pairwise similarity matrix)."""
     if not candidate_indices or candidate_features.shape[0] == 0:
         return []
 
-    num_candidates = candidate_features.shape[0]
-    top_n = min(top_n, num_candidates)
-
-    target_vector_2d = target_vector.reshape(1, -1)
-    relevance_scores = cosine_similarity(target_vector_2d, candidate_features).flatten()
-
-    diversity_matrix = cosine_similarity(candidate_features)
-    np.fill_diagonal(diversity_matrix, -np.inf)
-
-    selected_candidate_idxs = []
-    remaining_candidate_idxs = list(range(num_candidates))
-
-    if num_candidates > 0:
-        first_selection_idx_in_candidates = np.argmax(relevance_scores)
-        selected_candidate_idxs.append(first_selection_idx_in_candidates)
-        remaining_candidate_idxs.remove(first_selection_idx_in_candidates)
-
-    while len(selected_candidate_idxs) < top_n and remaining_candidate_idxs:
-        mmr_scores = {}
-        for idx_in_candidates in remaining_candidate_idxs:
-            relevance = relevance_scores[idx_in_candidates]
-            if selected_candidate_idxs:
-                 max_similarity_to_selected = np.max(diversity_matrix[idx_in_candidates, selected_candidate_idxs])
-            else:
-                 max_similarity_to_selected = -np.inf
-
-            mmr_score = lambda_param * relevance - (1 - lambda_param) * max_similarity_to_selected
-            mmr_scores[idx_in_candidates] = mmr_score
-
-        if not mmr_scores:
-            break
-
-        best_next_idx_in_candidates = max(mmr_scores, key=mmr_scores.get)
-        selected_candidate_idxs.append(best_next_idx_in_candidates)
-        remaining_candidate_idxs.remove(best_next_idx_in_candidates)
-
-    final_selected_original_indices = [candidate_indices[i] for i in selected_candidate_idxs]
-    return final_selected_original_indices
+    selected_candidate_idxs = mmr_select(target_vector, candidate_features, top_n, lambda_param, normalized=normalized)
+    return [candidate_indices[i] for i in selected_candidate_idxs]
 
 def get_ml_recommendations(
     target_features: csr_matrix,
@@ -329,27 +481,40 @@ def get_ml_recommendations(
     target_color: Optional[str],
     target_id: Optional[str] = None,
     top_n: int = 3,
-    lambda_mmr: float = 0.5
+    lambda_mmr: float = 0.5,
+    budget: Optional[LatencyBudget] = None
 ) -> tuple[List[Dict], float]:
-    """Generate recommendations using Annoy and optimized MMR with tiered filtering and faster data handling."""
+    """Generate recommendations using Annoy and optimized MMR with tiered filtering and faster data handling.
+
+    With a `budget`, retrieval shrinks and MMR gives way to relevance order as it runs low.
+    """
     start_time = time.time()
+    budget = budget if budget is not None else LatencyBudget()
     df = ml_model.df
-    annoy_index = ml_model.annoy_index
+    catalog = ml_model.catalog
+    index = retrieval_index()
     all_features = ml_model.combined_features
 
-    if annoy_index is None or all_features is None or df is None:
-        logger.error("ML model components not initialized (Annoy, features, df).")
+    if index is None or all_features is None or df is None or catalog is None:
+        logger.error("ML model components not initialized (retrieval index, features, df, catalog).")
         return [], 0.0
 
     target_vector_dense = target_features.toarray().flatten()
 
-    # --- REDUCE NEIGHBORS --- Bring back to a more reasonable multiplier
-    num_neighbors_to_fetch = min(ANNOY_SEARCH_K_FACTOR * top_n * 8, annoy_index.get_n_items()) # Compromise multiplier
     annoy_start = time.time()
-    initial_indices, _ = annoy_index.get_nns_by_vector(
-        target_vector_dense, num_neighbors_to_fetch, search_k=-1, include_distances=True
-    )
-    logger.info(f"[get_ml_recommendations] Annoy search ({len(initial_indices)} neighbors, multiplier=8) for {target_id or 'image'} took {time.time() - annoy_start:.4f}s")
+    pool_fraction = DEGRADED_POOL_FRACTION if budget.should_degrade(REDUCED_POOL, BUDGET_RESERVE_FULL_POOL) else 1.0
+    if ml_model.partitioned_index is not None:
+        # The target type's partition, plus its group's partitions for the Attempt 3 fallback
+        partition_types = [target_article_type] + group_types(target_article_type)
+        initial_indices = partition_candidates(target_features, partition_types, [product_gender, "Unisex"],
+                                               exclude=catalog.position_of(target_id) if target_id else None,
+                                               per_type=max(1, int(PARTITION_CANDIDATES_PER_TYPE * pool_fraction)))
+    else:
+        # --- REDUCE NEIGHBORS --- Bring back to a more reasonable multiplier
+        num_neighbors_to_fetch = min(ANNOY_SEARCH_K_FACTOR * top_n * 8, index.get_n_items()) # Compromise multiplier
+        num_neighbors_to_fetch = max(1, int(num_neighbors_to_fetch * pool_fraction))
+        initial_indices = retrieve_candidates(target_features, num_neighbors_to_fetch)
+    logger.info(f"[get_ml_recommendations] {RETRIEVAL_BACKEND} search ({len(initial_indices)} neighbors) for {target_id or 'image'} took {time.time() - annoy_start:.4f}s")
 
     if not initial_indices:
         logger.warning(f"[get_ml_recommendations] Annoy returned no neighbors initially for {target_article_type}.")
@@ -392,7 +557,8 @@ def get_ml_recommendations(
     # Build boolean masks on the smaller candidate_filter_df
     type_mask = candidate_filter_df["articleType"] == target_article_type
     gender_mask = candidate_filter_df["gender"].isin([product_gender, "Unisex"])
-    self_mask = (candidate_filter_df["id"] != target_id) if target_id else pd.Series([True] * len(candidate_filter_df), index=candidate_filter_df.index)
+    target_position = catalog.position_of(target_id) if target_id else None
+    self_mask = candidate_filter_df['original_index'] != target_position
 
     # Combine non-color masks
     base_filter_mask = type_mask & gender_mask & self_mask
@@ -404,10 +570,8 @@ def get_ml_recommendations(
     if strict_indices_no_color: # Check if list is not empty
         strict_df_for_color = candidate_filter_df.loc[base_filter_mask].copy() # Get df matching base filters
         if target_color:
-            color_scores = strict_df_for_color["baseColour"].apply(
-                lambda x: color_compatibility(target_color, x if pd.notna(x) else "Unknown")
-            )
-            min_color_threshold = 0.15 if len(strict_df_for_color[color_scores >= 0.15]) >= top_n else 0.0
+            color_scores = color_scores_for(target_color, strict_df_for_color["original_index"].to_numpy())
+            min_color_threshold = 0.15 if np.count_nonzero(color_scores >= 0.15) >= top_n else 0.0
             color_mask = color_scores >= min_color_threshold
 
             # Get original indices passing the color filter
@@ -434,7 +598,7 @@ def get_ml_recommendations(
     if not filtered_indices:
         # Attempts 1 & 2 failed - no items of strict type (+ gender + self) found
         logger.warning(f"[Attempt 3] No candidates found matching strict type '{target_article_type}' even after relaxing color. Falling back to broader group.")
-        target_group = next((group for group, types in ARTICLE_TYPE_GROUPS.items() if target_article_type in types), None)
+        target_group = group_of(target_article_type)
 
         if target_group:
             group_candidate_types = ARTICLE_TYPE_GROUPS.get(target_group, [])
@@ -456,10 +620,8 @@ def get_ml_recommendations(
             if fallback_indices_no_color:
                  fallback_df_for_color = candidate_filter_df.loc[base_filter_mask_fb].copy()
                  if target_color:
-                     color_scores_fb = fallback_df_for_color["baseColour"].apply(
-                         lambda x: color_compatibility(target_color, x if pd.notna(x) else "Unknown")
-                     )
-                     min_color_threshold_fb = 0.15 if len(fallback_df_for_color[color_scores_fb >= 0.15]) >= top_n else 0.0
+                     color_scores_fb = color_scores_for(target_color, fallback_df_for_color["original_index"].to_numpy())
+                     min_color_threshold_fb = 0.15 if np.count_nonzero(color_scores_fb >= 0.15) >= top_n else 0.0
                      color_mask_fb = color_scores_fb >= min_color_threshold_fb
                      attempt3_indices = fallback_df_for_color.loc[color_mask_fb, 'original_index'].tolist()
                      logger.debug(f"[Attempt 3] Candidates after fallback color filter (threshold {min_color_threshold_fb}): {len(attempt3_indices)}")
@@ -505,21 +667,24 @@ def get_ml_recommendations(
 
 
     mmr_start = time.time()
-    selected_original_indices = optimized_mmr(
-        target_vector_dense,
-        filtered_original_indices, # Pass the list of original indices
-        candidate_features_sparse, # Pass the corresponding features
-        top_n,
-        lambda_param=lambda_mmr
-    )
+    if budget.should_degrade(RELEVANCE_ORDER, BUDGET_RESERVE_MMR):
+        relevance = np.asarray(candidate_features_sparse @ target_vector_dense).ravel()
+        selected_original_indices = [filtered_original_indices[i] for i in np.argsort(-relevance, kind="stable")[:top_n]]
+    else:
+        selected_original_indices = optimized_mmr(
+            target_vector_dense,
+            filtered_original_indices, # Pass the list of original indices
+            candidate_features_sparse, # Pass the corresponding features
+            top_n,
+            lambda_param=lambda_mmr,
+            normalized=True # Catalog rows and query vectors are stored L2-normalized
+        )
     logger.info(f"[get_ml_recommendations] MMR selection took {time.time() - mmr_start:.4f}s")
 
     if not selected_original_indices:
         logger.warning(f"[get_ml_recommendations] MMR did not select any items from the '{final_filter_stage}' candidates for {target_article_type}.")
         return [], 0.0
 
-    # Fetch full data for *only* the selected items using their original indices
-    results_df = df.loc[selected_original_indices]
     results = []
 
     # Get expected types from the final candidate pool *before* MMR
@@ -529,8 +694,8 @@ def get_ml_recommendations(
     final_expected_types = final_candidate_types_df['articleType'].unique()
     logger.debug(f"Validating MMR results against expected types from '{final_filter_stage}': {final_expected_types}")
 
-    for _, item_row in results_df.iterrows():
-         item_dict = item_row.to_dict()
+    # Fetch full data for *only* the selected items using their original indices
+    for item_dict in catalog.items(selected_original_indices):
          current_item_type = item_dict.get('articleType')
 
          # Validate against the types that were actually in the pool given to MMR
@@ -538,11 +703,6 @@ def get_ml_recommendations(
               logger.warning(f"MMR selected item {item_dict.get('id')} with unexpected type '{current_item_type}' for request '{target_article_type}'. Expected one of {final_expected_types} (from stage '{final_filter_stage}'). Skipping.")
               continue
 
-         # Convert ID back to int for the response model
-         item_id_int = int(item_dict['id'])
-         item_dict['id'] = item_id_int
-         # Add image URL
-         item_dict['image_url'] = f"/static/images/{item_id_int}.jpg"
          results.append(item_dict)
 
     novelty_score = inverse_popularity_score(results) if results else 0.0
@@ -552,45 +712,54 @@ def get_ml_recommendations(
     return results, novelty_score
 
 # --- Utilities ---
-def color_compatibility(color1: Optional[str], color2: Optional[str]) -> float:
-    """Calculate color compatibility score using COLOR_COMPATIBILITY dictionary."""
-    if not color1 or not color2 or color1 == "Unknown" or color2 == "Unknown":
-        return 0.1
-    if color1 == color2:
-        return 1.0
-    if color2 in COLOR_COMPATIBILITY.get(color1, []) or color1 in COLOR_COMPATIBILITY.get(color2, []):
-        return 0.8
-    neutrals = {"Black", "White", "Grey", "Beige", "Navy Blue", "Off White", "Grey Melange"}
-    if color1 in neutrals or color2 in neutrals:
-        return 0.5
-    return 0.0
+def serialize_item(item: Dict[str, Any]) -> bytes:
+    """Response JSON of one catalog item dict."""
+    return Item(**item).model_dump_json().encode("utf-8")
+
+def item_fragments() -> ItemFragments:
+    """Pre-serialized item JSON for the current catalog."""
+    if ml_model.item_fragments is None or ml_model.item_fragments.catalog is not ml_model.catalog:
+        ml_model.item_fragments = ItemFragments(ml_model.catalog, serialize_item)
+    return ml_model.item_fragments
+
+def color_scores_for(target_color: Optional[str], positions: np.ndarray) -> np.ndarray:
+    """Color compatibility of target_color with the catalog items at the given row positions."""
+    catalog = ml_model.catalog
+    if ml_model.color_matrix is None or ml_model.color_matrix.colors != catalog.categories["baseColour"]:
+        ml_model.color_matrix = ColorCompatibilityMatrix(catalog.categories["baseColour"])
+    return ml_model.color_matrix.scores(target_color, catalog.codes["baseColour"][positions])
+
+def outfit_rules() -> CompiledOutfitRules:
+    """Outfit rules compiled against the current catalog's category codes."""
+    catalog = ml_model.catalog
+    categories = (catalog.categories["articleType"], catalog.categories["usage"], catalog.categories["gender"])
+    if ml_model.rules is None or not ml_model.rules.matches(*categories):
+        ml_model.rules = CompiledOutfitRules(*categories)
+    return ml_model.rules
+
+def dense_feature_row(position: int) -> np.ndarray:
+    """Dense feature row of a catalog item, cached for hot items."""
+    if ml_model.dense_rows is None or ml_model.dense_rows.features is not ml_model.combined_features:
+        ml_model.dense_rows = DenseRowCache(ml_model.combined_features, DENSE_ROW_CACHE_SIZE)
+    return ml_model.dense_rows.get(position)
 
 def check_negative_constraints(target_item: dict, candidate_item: dict) -> bool:
     """Check for incompatible combinations based on updated ARTICLE_TYPE_GROUPS."""
-    def get_group(article_type: str) -> Optional[str]:
-        for group_name, types in ARTICLE_TYPE_GROUPS.items():
-            if article_type in types:
-                return group_name
-        return None
-
-    target_group = get_group(target_item["articleType"])
-    candidate_group = get_group(candidate_item["articleType"])
+    target_group = group_of(target_item["articleType"])
+    candidate_group = group_of(candidate_item["articleType"])
 
     if target_group is None or candidate_group is None:
         return True
 
-    self_incompatible_groups = {"Tops", "Bottomwear", "Dresses", "Outerwear"}
-    accessory_groups = {"Accessories", "Jewellery", "Bags", "Makeup", "Skincare", "Bath and Body", "Haircare", "Fragrance", "Tech Accessories", "Home Decor", "Footwear", "Personal Care"}
-
-    if target_group == candidate_group and target_group in self_incompatible_groups:
+    if target_group == candidate_group and target_group in SELF_INCOMPATIBLE_GROUPS:
         return False
 
-    if target_group in accessory_groups or candidate_group in accessory_groups:
+    if target_group in ACCESSORY_GROUPS or candidate_group in ACCESSORY_GROUPS:
          return True
 
-    if target_item.get("usage") == "Formal" and candidate_item.get("articleType") in ["Flip Flops", "Sports Sandals"]:
+    if target_item.get("usage") == "Formal" and candidate_item.get("articleType") in FORMAL_EXCLUDED_TYPES:
          return False
-    if candidate_item.get("usage") == "Formal" and target_item.get("articleType") in ["Flip Flops", "Sports Sandals"]:
+    if candidate_item.get("usage") == "Formal" and target_item.get("articleType") in FORMAL_EXCLUDED_TYPES:
          return False
 
     return True
@@ -609,91 +778,55 @@ def get_accessory_types(usage: str, season: str) -> List[str]:
 def get_dominant_color(image: Image.Image) -> np.ndarray:
     """Get the dominant color from an image."""
     try:
-        image = image.resize((100, 100))
-        img_array = np.array(image).reshape(-1, 3)
-        n_clusters = min(3, len(np.unique(img_array, axis=0)))
-        if n_clusters == 0: return np.array([0,0,0])
-
-        kmeans = KMeans(n_clusters=n_clusters, random_state=0, n_init=1).fit(img_array)
-        counts = np.bincount(kmeans.labels_)
-        return kmeans.cluster_centers_[np.argmax(counts)]
+        return dominant_color(image)
     except Exception as e:
         logger.error(f"Error in get_dominant_color: {e}")
         return np.array([0, 0, 0])
 
-def find_closest_color(target_color: np.ndarray, color_names: List[str]) -> str:
-    """Find the closest color name to the target RGB."""
-    color_map = {
-        "Navy Blue": (0, 0, 128), "Blue": (0, 0, 255), "Black": (0, 0, 0),
-        "Silver": (192, 192, 192), "Grey": (128, 128, 128), "Green": (0, 128, 0),
-        "Purple": (128, 0, 128), "White": (255, 255, 255), "Beige": (245, 245, 220),
-        "Brown": (165, 42, 42), "Bronze": (205, 127, 50), "Teal": (0, 128, 128),
-        "Copper": (184, 115, 51), "Pink": (255, 192, 203), "Off White": (253, 253, 247),
-        "Maroon": (128, 0, 0), "Red": (255, 0, 0), "Khaki": (240, 230, 140),
-        "Orange": (255, 165, 0), "Coffee Brown": (139, 69, 19), "Yellow": (255, 255, 0),
-        "Charcoal": (54, 69, 79), "Gold": (255, 215, 0), "Steel": (176, 196, 222),
-        "Tan": (210, 180, 140), "Magenta": (255, 0, 255), "Lavender": (230, 230, 250),
-        "Sea Green": (46, 139, 87), "Cream": (255, 253, 208), "Peach": (255, 218, 185),
-        "Olive": (128, 128, 0), "Skin": (255, 224, 189), "Burgundy": (128, 0, 32),
-        "Grey Melange": (190, 190, 190), "Rust": (183, 65, 14), "Rose": (255, 0, 127),
-        "Lime Green": (50, 205, 50), "Mauve": (224, 176, 255), "Turquoise Blue": (0, 199, 140),
-        "Metallic": (170, 170, 170), "Mustard": (255, 219, 88), "Taupe": (128, 128, 105),
-        "Nude": (238, 213, 183), "Mushroom Brown": (189, 183, 107), "Fluorescent Green": (127, 255, 0),
+def color_palette() -> ColorPalette:
+    """Lab palette of the current catalog's baseColours, for naming an image's dominant color."""
+    colors = ml_model.catalog.categories["baseColour"]
+    if ml_model.color_palette is None or ml_model.color_palette.colors != colors:
+        ml_model.color_palette = ColorPalette(colors)
+    return ml_model.color_palette
+
+def clip_attribute_labels() -> Dict[str, List[str]]:
+    """Labels CLIP chooses from for each predicted attribute: the catalog's values, or fallbacks."""
+    fallback_labels = {
+         "gender": ["Men", "Women", "Unisex"],
+         "season": ["Summer", "Winter", "Spring", "Fall"],
+         "usage": ["Casual", "Formal", "Sports"],
     }
-    available_colors = {name: rgb for name, rgb in color_map.items() if name in color_names}
-    if not available_colors:
-        logger.warning("No matching colors found between color map and dataset unique colors.")
-        return "Black"
-
-    target_rgb = target_color.astype(int)
-    min_dist = float("inf")
-    closest_color_name = list(available_colors.keys())[0]
-
-    for name, rgb in available_colors.items():
-        dist = np.linalg.norm(np.array(rgb) - target_rgb)
-        if dist < min_dist:
-            min_dist = dist
-            closest_color_name = name
-    return closest_color_name
+    attribute_labels = {}
+    for label_type in ["gender", "articleType", "season", "usage", "masterCategory", "subCategory"]:
+        labels = ml_model.catalog.categories[label_type]
+        if len(labels) < 2:
+            labels = fallback_labels.get(label_type, ["Unknown"])
+            logger.warning(f"Using fallback labels for CLIP prediction: {label_type}")
+        attribute_labels[label_type] = labels
+    return attribute_labels
+
+def label_embeddings() -> LabelEmbeddings:
+    """CLIP text embeddings of the current catalog's attribute labels, encoded once."""
+    labels = clip_attribute_labels()
+    cached = ml_model.label_embeddings
+    if cached is None or cached.model is not ml_model.clip_model or cached.labels != labels:
+        ml_model.label_embeddings = LabelEmbeddings.encode(ml_model.clip_model, labels)
+    return ml_model.label_embeddings
 
 def predict_attributes(image: Image.Image) -> dict:
-    """Predict attributes from an image using CLIP."""
-    if not ml_model.clip_model or not ml_model.clip_processor or ml_model.df is None:
-        logger.error("CLIP model/processor or DataFrame not initialized for prediction.")
+    """Predict attributes from an image using CLIP: one image encoding scored against precomputed label embeddings."""
+    if not ml_model.clip_model or not ml_model.clip_processor or ml_model.catalog is None:
+        logger.error("CLIP model/processor or catalog not initialized for prediction.")
         return {}
 
-    attributes = {}
     start_time = time.time()
     try:
-        attribute_labels = {
-            "gender": ml_model.df["gender"].unique().tolist(),
-            "articleType": ml_model.df["articleType"].unique().tolist(),
-            "season": ml_model.df["season"].unique().tolist(),
-            "usage": ml_model.df["usage"].unique().tolist(),
-            "masterCategory": ml_model.df["masterCategory"].unique().tolist(),
-            "subCategory": ml_model.df["subCategory"].unique().tolist(),
-        }
-        fallback_labels = {
-             "gender": ["Men", "Women", "Unisex"],
-             "season": ["Summer", "Winter", "Spring", "Fall"],
-             "usage": ["Casual", "Formal", "Sports"],
-        }
+        batcher = ml_model.clip_image_batcher
+        image_embedding = batcher(image) if batcher is not None else ml_model.clip_model.encode_images([image])[0]
+        attributes = label_embeddings().predict(image_embedding)
 
-        for label_type, labels in attribute_labels.items():
-            if not labels or len(labels) < 2:
-                labels = fallback_labels.get(label_type, ["Unknown"])
-                logger.warning(f"Using fallback labels for CLIP prediction: {label_type}")
-
-            inputs = ml_model.clip_processor(text=labels, images=image, return_tensors="pt", padding=True, truncation=True)
-            outputs = ml_model.clip_model(**inputs)
-            logits_per_image = outputs.logits_per_image
-            probs = logits_per_image.softmax(dim=1)
-            predicted_index = probs.argmax().item()
-            attributes[label_type] = labels[predicted_index]
-
-        dominant_color_rgb = get_dominant_color(image)
-        unique_base_colors = ml_model.df["baseColour"].unique().tolist()
-        attributes["baseColour"] = find_closest_color(dominant_color_rgb, unique_base_colors)
+        attributes["baseColour"] = color_palette().closest(get_dominant_color(image))
 
         logger.info(f"CLIP attribute prediction took {time.time() - start_time:.2f}s")
         return attributes
@@ -711,6 +844,15 @@ async def lifespan(app: FastAPI):
     await startup_event()
     yield
     logger.info("Application shutdown.")
+    startup_task = getattr(app.state, "startup_task", None)
+    if startup_task is not None and not startup_task.done():
+        startup_task.cancel()
+        logger.info("Cancelled unfinished startup stages.")
+    shutdown_build_executor()
+    request_executor.shutdown()
+    for batcher in (ml_model.clip_image_batcher, ml_model.clip_text_batcher):
+        if batcher is not None:
+            batcher.close()
     if ml_model.annoy_index:
         ml_model.annoy_index.unload()
         logger.info("Annoy index unloaded.")
@@ -726,277 +868,450 @@ class ProductAdmin(ModelView, model=ClothingItem):
 
 admin.add_view(ProductAdmin)
 
-async def startup_event():
-    """Initialize application resources on startup."""
-    logger.info("Running startup event...")
-    try:
-        start_total = time.time()
-        init_db() # Initialize database on startup
-        ml_model.df = load_data()
-        if ml_model.df.empty:
-             raise RuntimeError("Failed to load data, DataFrame is empty.")
-
-        (ml_model.onehot_encoder, ml_model.tfidf_vectorizer,
-         ml_model.combined_features, ml_model.id_to_index,
-         ml_model.index_to_id) = preprocess_data(ml_model.df)
-
-        if ml_model.combined_features is None:
-            raise RuntimeError("Feature preprocessing failed, combined_features is None.")
+def load_catalog_stage():
+    """Load the catalog and build the CatalogStore over it."""
+    df = load_data()
+    if df.empty:
+         raise RuntimeError("Failed to load data, DataFrame is empty.")
+    fill_missing_values(df)
+    catalog = CatalogStore.from_dataframe(df)
+    ml_model.color_matrix = ColorCompatibilityMatrix(catalog.categories["baseColour"])
+    ml_model.color_palette = ColorPalette(catalog.categories["baseColour"])
+    ml_model.rules = CompiledOutfitRules(catalog.categories["articleType"], catalog.categories["usage"],
+                                         catalog.categories["gender"])
+    ml_model.item_fragments = ItemFragments(catalog, serialize_item)
+    ml_model.df = df
+    ml_model.catalog = catalog
+
+def feature_params() -> Dict[str, Any]:
+    """Feature/index parameters that are part of the artifact key."""
+    params = {"annoy_n_trees": ANNOY_N_TREES}
+    if RETRIEVAL_BACKEND == "sparse":
+        # Sparse artifact sets carry no Annoy file, so keep them apart from Annoy ones.
+        params["retrieval_backend"] = RETRIEVAL_BACKEND
+    elif PARTITIONED_RETRIEVAL:
+        params.update({"partition_by_gender": PARTITION_BY_GENDER, "partition_exact_max_items": PARTITION_EXACT_MAX_ITEMS,
+                       "partition_annoy_n_trees": PARTITION_ANNOY_N_TREES})
+    if ANN_PROJECTION_METHOD:
+        params.update({"ann_projection": ANN_PROJECTION_METHOD, "ann_projection_dim": ANN_PROJECTION_DIM})
+    return params
+
+def open_partitioned_index(artifact_dir: Optional[str]) -> Optional[PartitionedIndex]:
+    """Per-articleType retrieval partitions, with Annoy sub-indexes and shared postings from the artifact set if it has them."""
+    if not PARTITIONED_RETRIEVAL:
+        return None
+    annoy_dir = os.path.join(artifact_dir, PARTITIONS_DIR) if artifact_dir else None
+    return PartitionedIndex.load(ml_model.catalog, ml_model.combined_features, PARTITION_BY_GENDER,
+                                 annoy_dir, ml_model.index_dim, normalized=True, shared=ml_model.index_arrays)
+
+def open_sparse_index() -> SparseExactIndex:
+    """Exact index over all features, reopened from the shared postings when the artifact set has them."""
+    if ml_model.index_arrays is not None and f"{SPARSE_INDEX_PREFIX}postings.data" in ml_model.index_arrays:
+        return SparseExactIndex.from_shared(ml_model.index_arrays, SPARSE_INDEX_PREFIX)
+    return SparseExactIndex(ml_model.combined_features, normalized=True)
+
+def shared_index_arrays(staging_dir: str) -> Dict[str, np.ndarray]:
+    """Exact-search postings of the configured backend, to publish in the shared array file."""
+    arrays = {}
+    if RETRIEVAL_BACKEND == "sparse":
+        arrays.update(SparseExactIndex(ml_model.combined_features, normalized=True).shared_arrays(SPARSE_INDEX_PREFIX))
+    if PARTITIONED_RETRIEVAL:
+        annoy_dir = os.path.join(staging_dir, PARTITIONS_DIR) if RETRIEVAL_BACKEND != "sparse" else None
+        arrays.update(exact_partition_arrays(ml_model.catalog, ml_model.combined_features, PARTITION_BY_GENDER, annoy_dir))
+    return arrays
+
+def outfit_store_fingerprint() -> str:
+    """Identifies everything a materialized outfit depends on: catalog, rules and retrieval settings.
+
+    Stored outfits embed each item's JSON, so prices (not part of the catalog hash) count too.
+    """
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "constants.py"), "rb") as f:
+        rules_hash = hashlib.sha256(f.read()).hexdigest()
+    prices_hash = hashlib.sha256(pd.util.hash_pandas_object(ml_model.df["price"], index=False).to_numpy().tobytes()).hexdigest()
+    settings = {"catalog_hash": ml_model.catalog_hash, "rules_hash": rules_hash, "prices_hash": prices_hash,
+                "retrieval_backend": RETRIEVAL_BACKEND, "partitioned_retrieval": PARTITIONED_RETRIEVAL,
+                "partition_by_gender": PARTITION_BY_GENDER, "partition_candidates": PARTITION_CANDIDATES_PER_TYPE,
+                "annoy_search_k_factor": ANNOY_SEARCH_K_FACTOR}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+def outfit_store_path() -> str:
+    return os.path.join(artifact_dir_for(FEATURE_ARTIFACTS_DIR, ml_model.catalog_hash), OUTFITS_FILE)
+
+def load_recommender_stage():
+    """Load the feature artifacts and retrieval indexes, then the materialized outfit store if one matches."""
+    load_feature_stage()
+    ml_model.outfit_store = OutfitStore.open(outfit_store_path(), outfit_store_fingerprint()) if OUTFIT_STORE_ENABLED else None
+    response_cache.clear()
+
+def use_shared_arrays(artifacts: Dict[str, Any]):
+    """Serve features and catalog columns from the artifact set's memory-mapped shared array file."""
+    ml_model.combined_features = artifacts["combined_features"]
+    ml_model.index_arrays = artifacts["index_arrays"]
+    if artifacts["catalog_arrays"] is not None:
+        shared_catalog = CatalogStore.from_shared(ml_model.df, artifacts["ids"], artifacts["catalog_arrays"])
+        if shared_catalog is not None:
+            if ml_model.item_fragments is not None and ml_model.item_fragments.catalog is ml_model.catalog:
+                ml_model.item_fragments.catalog = shared_catalog # Same rows, so the fragments still apply
+            ml_model.catalog = shared_catalog
+        else:
+            logger.warning("Shared catalog arrays do not match the loaded catalog; keeping the private CatalogStore.")
+
+def hold_artifact_lease(lease: IO):
+    """Keep the lease on the artifact set now being served, releasing the previous one."""
+    previous, ml_model.artifact_lease = ml_model.artifact_lease, lease
+    if previous is not None:
+        previous.close()
+
+def load_feature_stage():
+    """Load the feature artifacts for the current catalog, rebuilding them if the catalog changed."""
+    ml_model.catalog_hash = catalog_content_hash(ml_model.df, feature_params())
+    if use_published_artifacts():
+        return
+    with artifact_build_lock(FEATURE_ARTIFACTS_DIR, ml_model.catalog_hash):
+        # Another worker may have published this catalog's artifacts while we waited for the lock
+        if not use_published_artifacts():
+            build_feature_artifacts()
+
+def use_published_artifacts() -> bool:
+    """Serve the published artifact set for the current catalog hash; False if there is no usable one."""
+    artifacts = load_feature_artifacts(FEATURE_ARTIFACTS_DIR, ml_model.catalog_hash)
+    if artifacts is None:
+        return False
 
+    needs_annoy = RETRIEVAL_BACKEND != "sparse"
+    if ((artifacts["annoy_path"] is not None or not needs_annoy)
+            and np.array_equal(artifacts["ids"], ml_model.catalog.ids)):
+        ml_model.onehot_encoder = artifacts["onehot_encoder"]
+        ml_model.tfidf_vectorizer = artifacts["tfidf_vectorizer"]
+        use_shared_arrays(artifacts)
         ml_model.feature_dim = ml_model.combined_features.shape[1]
-
-        ml_model.annoy_index = load_annoy_index(ml_model.feature_dim, ANNOY_INDEX_PATH)
-        if ml_model.annoy_index is None:
-            logger.info("Building Annoy index from scratch...")
-            ml_model.annoy_index, _ = build_annoy_index(ml_model.combined_features, ANNOY_INDEX_PATH)
-        elif ml_model.annoy_index.get_n_items() != ml_model.combined_features.shape[0]:
-             logger.warning(f"Annoy index item count ({ml_model.annoy_index.get_n_items()}) "
-                            f"mismatches feature count ({ml_model.combined_features.shape[0]}). Rebuilding.")
-             ml_model.annoy_index.unload()
-             ml_model.annoy_index, _ = build_annoy_index(ml_model.combined_features, ANNOY_INDEX_PATH)
-
-
-        ml_model.clip_model, ml_model.clip_processor = init_ml_model()
-
+        ml_model.projection = artifacts["projection"]
+        ml_model.index_dim = ml_model.projection.n_components if ml_model.projection is not None else ml_model.feature_dim
+        if not needs_annoy:
+            ml_model.sparse_index = open_sparse_index()
+            ml_model.partitioned_index = open_partitioned_index(None)
+            hold_artifact_lease(artifacts["lease"])
+            return True
+        ml_model.annoy_index = load_annoy_index(ml_model.index_dim, artifacts["annoy_path"])
+        if ml_model.annoy_index is not None:
+            ml_model.annoy_path = artifacts["annoy_path"]
+            ml_model.partitioned_index = open_partitioned_index(os.path.dirname(artifacts["annoy_path"]))
+            hold_artifact_lease(artifacts["lease"])
+            return True
+    artifacts["lease"].close()
+    return False
+
+def build_feature_artifacts():
+    """Fit the features and build the indexes for the current catalog, then publish them as its artifact set."""
+    logger.info(f"Building feature artifacts for catalog hash {ml_model.catalog_hash[:16]}...")
+    ml_model.index_arrays = None # Until this catalog's artifact set is published
+    (ml_model.onehot_encoder, ml_model.tfidf_vectorizer,
+     ml_model.combined_features) = preprocess_data(ml_model.df)
+
+    if ml_model.combined_features is None:
+        raise RuntimeError("Feature preprocessing failed, combined_features is None.")
+
+    ml_model.feature_dim = ml_model.combined_features.shape[1]
+    ml_model.projection = None
+    if ANN_PROJECTION_METHOD:
+        ml_model.projection = FeatureProjection(ANN_PROJECTION_METHOD, ANN_PROJECTION_DIM).fit(ml_model.combined_features)
+        logger.info(f"ANN projection: {ml_model.projection.describe()}")
+    ml_model.index_dim = ml_model.projection.n_components if ml_model.projection is not None else ml_model.feature_dim
+
+    needs_annoy = RETRIEVAL_BACKEND != "sparse"
+    staging_dir = create_staging_dir(FEATURE_ARTIFACTS_DIR, ml_model.catalog_hash)
+    if needs_annoy:
+        # The tree builds run in the build process, so this worker thread only waits on them.
+        index_vectors = ann_index_vectors(ml_model.combined_features)
+        builds = [build_annoy_index_in_background(index_vectors, os.path.join(staging_dir, ANNOY_FILE))]
+        if PARTITIONED_RETRIEVAL:
+            builds.append(submit_build_job(
+                build_partition_annoy_files, index_vectors, catalog_partitions(ml_model.catalog, PARTITION_BY_GENDER),
+                os.path.join(staging_dir, PARTITIONS_DIR), PARTITION_ANNOY_N_TREES, PARTITION_EXACT_MAX_ITEMS,
+                n_jobs=ANNOY_BUILD_JOBS))
+        for build in builds:
+            build.result()
+    artifact_dir = save_feature_artifacts(staging_dir, FEATURE_ARTIFACTS_DIR, ml_model.catalog_hash,
+                                          ml_model.onehot_encoder, ml_model.tfidf_vectorizer,
+                                          ml_model.combined_features, ml_model.catalog.ids,
+                                          keep=FEATURE_ARTIFACTS_KEEP, projection=ml_model.projection,
+                                          catalog_arrays=ml_model.catalog.shared_arrays(),
+                                          index_arrays=shared_index_arrays(staging_dir))
+    # Serve from the published shared file like every other worker, instead of this process's private copy
+    published = load_feature_artifacts(FEATURE_ARTIFACTS_DIR, ml_model.catalog_hash)
+    if published is not None:
+        use_shared_arrays(published)
+        hold_artifact_lease(published["lease"])
+    if not needs_annoy:
+        ml_model.sparse_index = open_sparse_index()
+        ml_model.partitioned_index = open_partitioned_index(None)
+        return
+    ml_model.annoy_path = os.path.join(artifact_dir, ANNOY_FILE)
+    ml_model.annoy_index = load_annoy_index(ml_model.index_dim, ml_model.annoy_path)
+    ml_model.partitioned_index = open_partitioned_index(artifact_dir)
+
+_annoy_rebuild_lock = asyncio.Lock()
+
+async def rebuild_annoy_index():
+    """Rebuild the Annoy index (and the partition sub-indexes in use) off-process, republish the artifact set and hot-swap them in."""
+    async with _annoy_rebuild_lock:
+        features, catalog_hash = ml_model.combined_features, ml_model.catalog_hash
+        start_time = time.time()
+        # Published sets are immutable: build into a staging copy and publish it as the set's new generation
+        staging_dir = await asyncio.to_thread(stage_artifact_copy, FEATURE_ARTIFACTS_DIR, catalog_hash)
         try:
-            ml_model.chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-            try:
-                 ml_model.chroma_client.get_collection("fashion")
-                 logger.info("ChromaDB client initialized and 'fashion' collection found.")
-            except Exception:
-                 logger.warning("ChromaDB 'fashion' collection not found. Search endpoint might fail.")
+            index_vectors = await asyncio.to_thread(ann_index_vectors, features)
+            builds = [build_annoy_index_in_background(index_vectors, os.path.join(staging_dir, ANNOY_FILE))]
+            if ml_model.partitioned_index is not None:
+                # Partitioned retrieval is what serves product pages and image recommendations
+                builds.append(submit_build_job(
+                    build_partition_annoy_files, index_vectors, catalog_partitions(ml_model.catalog, PARTITION_BY_GENDER),
+                    os.path.join(staging_dir, PARTITIONS_DIR), PARTITION_ANNOY_N_TREES, PARTITION_EXACT_MAX_ITEMS,
+                    n_jobs=ANNOY_BUILD_JOBS))
+            await asyncio.gather(*(asyncio.wrap_future(build) for build in builds))
+            artifact_dir, lease = await asyncio.to_thread(publish_rebuilt_artifacts, staging_dir, catalog_hash)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        index_path = os.path.join(artifact_dir, ANNOY_FILE)
+        new_index = await asyncio.to_thread(load_annoy_index, index_vectors.shape[1], index_path)
+        if new_index is None:
+            lease.close()
+            raise RuntimeError(f"Rebuilt Annoy index missing at {index_path}")
+        new_partitions = await asyncio.to_thread(open_partitioned_index, artifact_dir)
+        # Single reference assignments: in-flight requests finish on the old indexes, which are
+        # unmapped once they drop them. Other workers pick up the new generation when they next load it.
+        ml_model.annoy_index = new_index
+        ml_model.annoy_path = index_path
+        ml_model.partitioned_index = new_partitions
+        hold_artifact_lease(lease)
+        response_cache.clear()
+        await asyncio.to_thread(prune_feature_artifacts, FEATURE_ARTIFACTS_DIR, FEATURE_ARTIFACTS_KEEP)
+        logger.info(f"Annoy index{' and partitions' if new_partitions is not None else ''} rebuilt and swapped "
+                    f"in {time.time() - start_time:.2f} seconds.")
+
+def publish_rebuilt_artifacts(staging_dir: str, catalog_hash: str) -> Tuple[str, IO]:
+    """Publish a rebuilt artifact set in place of the current one and lease it before any prune can see it."""
+    with artifact_build_lock(FEATURE_ARTIFACTS_DIR, catalog_hash):
+        artifact_dir = republish_feature_artifacts(staging_dir, FEATURE_ARTIFACTS_DIR, catalog_hash)
+        return artifact_dir, lease_artifact_set(artifact_dir)
+
+async def run_startup_stages():
+    """Run the startup stages in parallel; the recommender stage waits for the catalog."""
+    start_total = time.time()
+
+    async def catalog_then_recommender():
+        if await readiness.run_stage("catalog", load_catalog_stage):
+            await readiness.run_stage("recommender", load_recommender_stage)
+
+    await asyncio.gather(
+        catalog_then_recommender(),
+        readiness.run_stage("clip", load_clip_stage),
+        readiness.run_stage("chroma", load_chroma_stage),
+    )
+    if readiness.is_ready("catalog", "clip"):
+        # Encode the attribute labels now rather than on the first image upload
+        try:
+            await asyncio.to_thread(label_embeddings)
         except Exception as e:
-            logger.error(f"Failed to initialize ChromaDB client at {CHROMA_DB_PATH}: {e}", exc_info=True)
-
-
-        logger.info(f"Total startup time: {time.time() - start_total:.2f} seconds.")
+            logger.error(f"Could not precompute CLIP label embeddings: {e}", exc_info=True)
+    logger.info(f"Total startup time: {time.time() - start_total:.2f} seconds. Components: {readiness.snapshot()}")
 
+async def startup_event():
+    """Initialize the database and start the background startup stages."""
+    logger.info("Running startup event...")
+    try:
+        init_db() # Initialize database on startup
     except Exception as e:
         logger.error(f"Error during application startup: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Critical error during startup: {e}") from e
+    # Keep a reference so the task is not garbage collected while it runs.
+    app.state.startup_task = asyncio.create_task(run_startup_stages())
 
 
 # --- Endpoints ---
-@app.get("/api/product/{item_id}", response_model=ProductPageResponse)
-async def product_page(item_id: str):
-    """Get product details and outfit recommendations."""
-    logger.info(f"Received request for product page: {item_id}")
-    start_time = time.time()
-
-    try:
-        item_id_int = int(item_id)
-        if item_id_int <= 0:
-            raise ValueError("Item ID must be a positive integer.")
-    except ValueError:
-        logger.error(f"Invalid item_id format: {item_id}")
-        raise HTTPException(status_code=400, detail="Invalid item ID format.")
-
-    # 1. Get Target Item Info
-    product = get_item(item_id)
-    if product is None:
-        logger.error(f"Product {item_id} not found.")
-        raise HTTPException(status_code=404, detail="Item not found")
+def outfit_json(recommendations: Dict[str, Sequence[int]], metrics: Dict[str, float],
+                degradations: Sequence[str] = ()) -> bytes:
+    """OutfitRecommendation JSON assembled from pre-serialized item fragments."""
+    fragments = item_fragments()
+    body = b",".join(json_fragment(rec_type) + b":" + fragments.array(positions)
+                     for rec_type, positions in recommendations.items())
+    body = b'{"recommendations":{' + body + b'},"metrics":' + json_fragment({k: float(v) for k, v in metrics.items()})
+    if degradations:
+        body += b',"degradations":' + json_fragment(list(degradations))
+    return body + b"}"
+
+def compute_outfit_json(product: Dict[str, Any], target_idx: int, budget: Optional[LatencyBudget] = None) -> bytes:
+    """OutfitRecommendation JSON for one catalog item; used live by product_page and by the materialization job.
+
+    With a `budget`, stages take cheaper paths as it runs low and the response lists them.
+    """
+    logger.info(f"Target Item: ID={product['id']}, Type={product['articleType']}, Gender={product['gender']}, Usage={product['usage']}, Color={product.get('baseColour')}")
+    return outfit_recommendation_json(ml_model.combined_features[target_idx], dense_feature_row(target_idx), product,
+                                      target_idx, budget, label=f"product {product['id']}")
 
-    target_idx = ml_model.id_to_index.get(item_id)
-    if target_idx is None or ml_model.combined_features is None:
-        logger.error(f"Could not find index or features for item {item_id}")
-        raise HTTPException(status_code=404, detail="Item data or features not found.")
+def outfit_recommendation_json(
+    target_features: csr_matrix,
+    target_vector_dense: np.ndarray,
+    target: Dict[str, Any],
+    target_idx: Optional[int] = None,
+    budget: Optional[LatencyBudget] = None,
+    label: str = "image"
+) -> bytes:
+    """OutfitRecommendation JSON for a target feature row and its attributes, from one shared candidate pool.
+
+    `target_idx` is the target's own catalog position, excluded from the pool (None for an uploaded image).
+    """
+    request_start_time = time.time()
+    budget = budget if budget is not None else LatencyBudget()
 
-    target_features = ml_model.combined_features[target_idx]
-    target_vector_dense = target_features.toarray().flatten() # For Annoy/MMR
-    target_gender, target_usage, target_season = product["gender"], product["usage"], product["season"]
-    target_color, target_article_type = product.get("baseColour"), product["articleType"]
+    target_gender, target_usage, target_season = target["gender"], target["usage"], target["season"]
+    target_color, target_article_type = target.get("baseColour"), target["articleType"]
 
     # 2. Determine All Required Recommendation Types
-    compatible_types_list = get_compatible_types(target_article_type)
-    accessory_types = get_accessory_types(target_usage, target_season)
-    all_target_types = list(set(compatible_types_list + accessory_types))
-    logger.info(f"Required recommendation types: {all_target_types}")
+    all_target_types = list(target_types(target_article_type, target_usage, target_season)) # Sorted for consistent processing order
+    rules = outfit_rules()
+    catalog = ml_model.catalog
+    logger.info(f"Required recommendation types ({len(all_target_types)}): {all_target_types}")
 
     recommendations_dict = {}
     metrics_agg = {'novelty': []}
 
     # --- Optimization: Single Annoy Search ---
-    annoy_index = ml_model.annoy_index
+    index = retrieval_index()
     all_features = ml_model.combined_features
     df = ml_model.df
 
-    if annoy_index is None or all_features is None or df is None:
-        logger.error("ML model components not initialized for product page.")
+    if index is None or all_features is None or df is None:
+        logger.error(f"ML model components not initialized for {label}.")
         raise HTTPException(status_code=500, detail="Server error: Recommender components unavailable.")
 
-    # Fetch a larger pool - adjust multiplier as needed (balance recall and performance)
-    # Consider how many *total* items you might need across all types. E.g., 20 types * 5 items = 100 base. Add buffer.
-    num_potential_neighbors = min(ANNOY_SEARCH_K_FACTOR * len(all_target_types) * 5, annoy_index.get_n_items()) # More targeted multiplier
-    num_potential_neighbors = max(num_potential_neighbors, 200) # Ensure a minimum pool size
-    logger.info(f"Fetching {num_potential_neighbors} initial candidates from Annoy.")
-
     annoy_start = time.time()
-    initial_indices, _ = annoy_index.get_nns_by_vector(
-        target_vector_dense, num_potential_neighbors, search_k=-1, include_distances=True
-    )
-    logger.info(f"Single Annoy search for product {item_id} took {time.time() - annoy_start:.4f}s, found {len(initial_indices)} candidates.")
+    pool_fraction = DEGRADED_POOL_FRACTION if budget.should_degrade(REDUCED_POOL, BUDGET_RESERVE_FULL_POOL) else 1.0
+    if ml_model.partitioned_index is not None:
+        # One small k-NN query per required type into its own partition
+        target_gender_group = gender_group(target_gender)
+        partition_genders = None if target_gender_group == "Unisex" else [target_gender_group, "Unisex"]
+        initial_indices = partition_candidates(target_features, all_target_types, partition_genders, exclude=target_idx,
+                                               per_type=max(1, int(PARTITION_CANDIDATES_PER_TYPE * pool_fraction)))
+    else:
+        # Fetch a larger pool - adjust multiplier as needed
+        num_items_needed_base = len(all_target_types) * 5 # Base estimate
+        buffer_multiplier = 4 # Multiplier for candidates per needed item (adjust based on filtering strictness)
+        num_potential_neighbors = min(int(ANNOY_SEARCH_K_FACTOR * num_items_needed_base * buffer_multiplier), index.get_n_items())
+        num_potential_neighbors = max(num_potential_neighbors, 500) # Ensure a minimum reasonable pool size
+        num_potential_neighbors = max(1, int(num_potential_neighbors * pool_fraction))
+        logger.info(f"Fetching {num_potential_neighbors} initial candidates from {RETRIEVAL_BACKEND} index.")
+        initial_indices = retrieve_candidates(target_features, num_potential_neighbors)
+    logger.info(f"Single {RETRIEVAL_BACKEND} search for {label} took {time.time() - annoy_start:.4f}s, found {len(initial_indices)} candidates.")
 
     if not initial_indices:
-        logger.warning(f"Annoy returned no initial candidates for product {item_id}.")
-        # Return empty recommendations gracefully
-        return ProductPageResponse(
-             product=Item(**product),
-             recommendations=OutfitRecommendation(recommendations={}, metrics={'novelty': 0.0})
-         )
-
-    # --- Optimization: Pre-filter the Pool ---
-    # Fetch only necessary columns for the *entire pool* once
-    filtering_cols = ["id", "articleType", "gender", "baseColour"]
-    cols_to_fetch = [col for col in filtering_cols if col in df.columns]
-    if "id" not in cols_to_fetch: cols_to_fetch.append("id")
-
-    try:
-        candidate_pool_df = df.loc[initial_indices, cols_to_fetch].copy()
-        candidate_pool_df['original_index'] = initial_indices # Keep track of original index
-        logger.debug(f"Created candidate_pool_df with shape {candidate_pool_df.shape}")
-    except Exception as e:
-         logger.error(f"Error creating candidate_pool_df: {e}")
-         # Fallback or raise error
-         raise HTTPException(status_code=500, detail="Error preparing candidate data.")
-
-    # Apply base filters (gender, self-exclusion) to the entire pool ONCE
-    base_gender_mask = candidate_pool_df["gender"].isin([target_gender, "Unisex"])
-    base_self_mask = candidate_pool_df["id"] != item_id
-    base_filtered_pool_df = candidate_pool_df[base_gender_mask & base_self_mask]
-    logger.info(f"Base filtering reduced pool size to {len(base_filtered_pool_df)} candidates.")
-
-    # 3. Loop Through Required Types and Filter/Rank the Pre-filtered Pool
-    for rec_type in all_target_types:
-        loop_start_time = time.time()
-        logger.debug(f"Processing recommendations for type: {rec_type}")
-
-        # --- Filtering Specific to this rec_type ---
-        # Attempt 1: Strict Type Match
-        type_mask = base_filtered_pool_df["articleType"] == rec_type
-        candidates_for_type_df = base_filtered_pool_df[type_mask]
-
-        # Attempt 2: Fallback to Group (if strict type yielded nothing)
-        if candidates_for_type_df.empty:
-            target_group = next((group for group, types in ARTICLE_TYPE_GROUPS.items() if rec_type in types), None)
-            if target_group:
-                group_candidate_types = ARTICLE_TYPE_GROUPS.get(target_group, [])
-                # Maybe prioritize items *within* the group but *not* the original target type if target != rec_type?
-                # For simplicity here, just use all types in the group
-                fallback_type_mask = base_filtered_pool_df["articleType"].isin(group_candidate_types)
-                candidates_for_type_df = base_filtered_pool_df[fallback_type_mask]
-                logger.debug(f"Falling back to group '{target_group}' for type '{rec_type}', found {len(candidates_for_type_df)} candidates.")
-            else:
-                 logger.debug(f"No candidates found for strict type '{rec_type}' and no fallback group.")
-                 continue # Skip to next rec_type if no candidates
-
-
-        if candidates_for_type_df.empty:
-             logger.debug(f"No candidates remain for '{rec_type}' after type/group filtering.")
-             continue
-
-        # Apply Color Filter
-        if target_color:
-            color_scores = candidates_for_type_df["baseColour"].apply(
-                lambda x: color_compatibility(target_color, x if pd.notna(x) else "Unknown")
-            )
-            # Dynamic threshold: Require at least 3 good matches if possible
-            min_color_threshold = 0.15 if len(candidates_for_type_df[color_scores >= 0.15]) >= 3 else 0.0
-            color_mask = color_scores >= min_color_threshold
-            final_candidates_df_for_type = candidates_for_type_df[color_mask]
-            logger.debug(f"Applied color filter for '{rec_type}', threshold {min_color_threshold}. Candidates: {len(final_candidates_df_for_type)}")
-        else:
-            final_candidates_df_for_type = candidates_for_type_df # No color filter needed
-
-        if final_candidates_df_for_type.empty:
-            logger.debug(f"No candidates remain for '{rec_type}' after color filtering.")
-            continue
-
-        # --- MMR Ranking ---
-        final_candidate_indices = final_candidates_df_for_type['original_index'].tolist()
-        if not final_candidate_indices:
+        logger.warning(f"Annoy returned no initial candidates for {label}.")
+        return outfit_json({}, {'novelty': 0.0}, budget.degradations)
+
+    # --- Batched Ranking: score and group the whole pool once ---
+    pool_prep_start = time.time()
+    pool = np.asarray(initial_indices, dtype=np.int64)
+    in_bounds = (pool >= 0) & (pool < min(len(catalog), all_features.shape[0]))
+    if not in_bounds.all():
+        logger.warning(f"Filtered out {np.count_nonzero(~in_bounds)} invalid indices from {RETRIEVAL_BACKEND} results.")
+    pool = pool[in_bounds if target_idx is None else in_bounds & (pool != target_idx)] # Self-exclusion
+    if len(pool) == 0:
+        logger.warning(f"No valid candidates remained for {label} after range check and self-exclusion.")
+        return outfit_json({}, {'novelty': 0.0}, budget.degradations)
+
+    # Relevance of every pool item to the target (rows are unit-length), and the rows MMR slices per type
+    pool_rows = all_features[pool]
+    pool_relevance = np.asarray(pool_rows @ target_vector_dense).ravel()
+    pool_types = catalog.codes["articleType"][pool]
+    pool_usages = catalog.codes["usage"][pool]
+    pool_genders = catalog.codes["gender"][pool]
+    pool_colors = color_scores_for(target_color, pool) if target_color else None
+    all_type_codes = catalog.codes["articleType"]
+    type_counts = np.bincount(all_type_codes[all_type_codes >= 0], minlength=len(catalog.categories["articleType"]))
+
+    # Group pool items by type with one stable sort, so each group stays in retrieval order
+    order = np.argsort(pool_types, kind="stable")
+    group_codes, starts = np.unique(pool_types[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    pool_by_type = {int(code): order[start:end] for code, start, end in zip(group_codes, starts, ends)}
+    type_code = {article_type: code for code, article_type in enumerate(catalog.categories["articleType"])}
+    logger.info(f"Batched ranking prep for {len(pool)} candidates ({len(pool_by_type)} types) took {time.time() - pool_prep_start:.4f}s")
+
+    # 3. Filter and rank each required type's slice of the pool. Compatible garments go first;
+    # usage/season accessories are the first to be dropped when the budget runs low.
+    loop_processing_start = time.time()
+    core_types = set(COMPATIBLE_TYPES.get(target_article_type, []))
+    novelty_by_type = {}
+    for rec_type in sorted(all_target_types, key=lambda t: t not in core_types):
+        if rec_type not in core_types and budget.should_degrade(DROPPED_ACCESSORY_TYPES, BUDGET_RESERVE_ACCESSORIES):
             continue
 
-        try:
-            # Fetch features only for the final candidates for this type
-            candidate_features_sparse = all_features[final_candidate_indices]
-        except IndexError as e:
-             logger.error(f"IndexError fetching features for {rec_type}: {e}. Indices: {final_candidate_indices[:5]}...")
-             continue # Skip this type if features can't be fetched
-
-        mmr_start = time.time()
-        selected_original_indices = optimized_mmr(
-            target_vector_dense,
-            final_candidate_indices, # Pass original indices
-            candidate_features_sparse,
-            top_n=5, # Request slightly more for negative constraint filtering
-            lambda_param=0.5 # Or your preferred lambda
-        )
-        logger.debug(f"MMR for {rec_type} took {time.time() - mmr_start:.4f}s, selected {len(selected_original_indices)} indices.")
-
-        if not selected_original_indices:
+        # Article Type (Attempt 1: Strict, Attempt 2: Fallback Group)
+        local = pool_by_type.get(type_code.get(rec_type, -2))
+        filter_stage = f"Strict Type ({rec_type})"
+        if local is None:
+            target_group = group_of(rec_type)
+            if not target_group:
+                logger.debug(f"[{rec_type}] No candidates found for strict type and no fallback group.")
+                continue
+            fallback_codes = [type_code[t] for t in ARTICLE_TYPE_GROUPS[target_group] if t in type_code]
+            local = np.flatnonzero(np.isin(pool_types, fallback_codes))
+            filter_stage = f"Fallback Group ({target_group})"
+
+        # Contextual filters: usage, then gender (exact target gender for highly gendered types, else also Unisex)
+        local = local[rules.usage_mask(target_usage, pool_usages[local])]
+        local = local[rules.gender_mask(target_gender, rec_type, pool_genders[local])]
+
+        # Color filter with a dynamic threshold: require at least 3 good matches if possible
+        if pool_colors is not None and len(local):
+            color_scores = pool_colors[local]
+            min_color_threshold = 0.15 if np.count_nonzero(color_scores >= 0.15) >= 3 else 0.0
+            local = local[color_scores >= min_color_threshold]
+
+        if not len(local):
+            logger.debug(f"[{rec_type}] No candidates remain after {filter_stage} and usage/gender/color filters.")
             continue
 
-        # --- Final Selection & Formatting ---
-        # Fetch full data for selected items
-        results_df = df.loc[selected_original_indices]
-        recs_list = []
-        for _, item_row in results_df.iterrows():
-             item_dict = item_row.to_dict()
-             # Convert ID back to int for the response model
-             item_id_int = int(item_dict['id'])
-             item_dict['id'] = item_id_int
-             # Add image URL
-             item_dict['image_url'] = f"/static/images/{item_id_int}.jpg"
-             recs_list.append(item_dict)
-
-        # Apply negative constraints and limit to top 3
-        filtered_recs = [item for item in recs_list if check_negative_constraints(product, item)][:3]
-
-        if filtered_recs:
-            recommendations_dict[rec_type] = [Item(**item) for item in filtered_recs]
-            novelty = inverse_popularity_score(filtered_recs)
-            metrics_agg['novelty'].append(novelty)
-            logger.debug(f"Successfully generated {len(filtered_recs)} recommendations for {rec_type}.")
-
-        logger.debug(f"Processing type {rec_type} took {time.time() - loop_start_time:.4f}s")
+        # Large pools (e.g. a fallback group) keep only their most relevant items when time is short
+        if len(local) > DEGRADED_POOL_MIN_ITEMS and budget.should_degrade(REDUCED_POOL, BUDGET_RESERVE_FULL_POOL):
+            keep = max(DEGRADED_POOL_MIN_ITEMS, int(len(local) * DEGRADED_POOL_FRACTION))
+            local = local[np.sort(np.argsort(-pool_relevance[local], kind="stable")[:keep])]
 
+        # --- MMR Ranking on the shared relevance and normalized rows (plain relevance order when out of time) ---
+        if budget.should_degrade(RELEVANCE_ORDER, BUDGET_RESERVE_MMR):
+            ranked = np.argsort(-pool_relevance[local], kind="stable")[:5]
+        else:
+            ranked = mmr_rank(pool_relevance[local], pool_rows[local], top_n=5, lambda_param=0.5) # Slightly more for negative constraints
+        selected_local = local[ranked]
+        selected = pool[selected_local]
+
+        # Apply negative constraints on the code arrays and limit to top 3
+        compatible = rules.compatible_mask(target_article_type, target_usage, pool_types[selected_local], pool_usages[selected_local])
+        final_recs = selected[compatible][:3]
+
+        if len(final_recs):
+            recommendations_dict[rec_type] = final_recs.tolist()
+            # Novelty: inverse popularity of each recommended item's article type
+            rec_codes = pool_types[selected_local][compatible][:3]
+            novelty_by_type[rec_type] = np.mean(np.where(rec_codes >= 0, 1 - type_counts[rec_codes] / len(catalog), 0.5))
+            logger.debug(f"[{rec_type}] {filter_stage}: {len(local)} candidates, {len(final_recs)} recommendations.")
+        else:
+             logger.debug(f"[{rec_type}] No recommendations passed negative constraints.")
 
+    # Report types in their sorted order, whatever order they were ranked in
+    recommendations_dict = {t: recommendations_dict[t] for t in all_target_types if t in recommendations_dict}
+    metrics_agg['novelty'] = [novelty_by_type[t] for t in recommendations_dict]
     avg_metrics = {k: np.mean(v) if v else 0.0 for k, v in metrics_agg.items()}
+    logger.info(f"Loop processing finished in {time.time() - loop_processing_start:.4f}s")
 
-    logger.info(f"Product page request for {item_id} completed in {time.time() - start_time:.2f}s")
-    return ProductPageResponse(
-        product=Item(**product),
-        recommendations=OutfitRecommendation(recommendations=recommendations_dict, metrics=avg_metrics)
-    )
-
-# main.py (or wherever your FastAPI app is defined)
-
-# --- [ Imports should be here: FastAPI, BaseModel, logging, np, pd, etc. ] ---
-# --- [ SQLAlchemy setup, MLModel class, other functions like get_item, etc. should be here ] ---
-# --- [ Make sure USAGE_COMPATIBILITY is imported from constants ] ---
-from constants import (
-    ARTICLE_TYPE_GROUPS,
-    ACCESSORY_COMBINATIONS,
-    SEASONAL_ACCESSORIES,
-    COMPATIBLE_TYPES,
-    COLOR_COMPATIBILITY,
-    USAGE_COMPATIBILITY # <-- Ensure this is imported
-)
-import logging
-import time
-import numpy as np
-import pandas as pd
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-# ... other necessary imports
+    total_time = time.time() - request_start_time
+    logger.info(f"Outfit recommendations for {label} completed in {total_time:.2f}s. Found recommendations for {len(recommendations_dict)} types.")
 
-logger = logging.getLogger(__name__)
+    # Final check if recommendations_dict is empty after all processing
+    if not recommendations_dict:
+         logger.warning(f"No recommendations generated for any type for {label}.")
 
-# Assume ml_model instance, Item, ProductPageResponse, OutfitRecommendation models exist
-# Assume get_item, get_compatible_types, get_accessory_types, color_compatibility,
-# optimized_mmr, check_negative_constraints, inverse_popularity_score functions exist and work as before.
+    return outfit_json(recommendations_dict, avg_metrics, budget.degradations)
 
 @app.get("/api/product/{item_id}", response_model=ProductPageResponse)
 async def product_page(item_id: str):
@@ -1012,391 +1327,143 @@ async def product_page(item_id: str):
         logger.error(f"Invalid item_id format: {item_id}")
         raise HTTPException(status_code=400, detail="Invalid item ID format.")
 
+    cache_key = ("product", ml_model.catalog_hash, item_id_int)
+    cached = response_cache.get(cache_key) if ml_model.catalog_hash is not None else None
+    if cached is not None:
+        logger.info(f"Served cached product page for {item_id} in {time.time() - request_start_time:.4f}s")
+        return Response(content=cached, media_type="application/json")
+
     # 1. Get Target Item Info
     get_item_start = time.time()
-    product = get_item(item_id) # Assumes get_item reads from ml_model.df
+    product = get_item(item_id)
     if product is None:
         logger.error(f"Product {item_id} not found.")
         raise HTTPException(status_code=404, detail="Item not found")
     logger.debug(f"get_item took {time.time() - get_item_start:.4f}s")
 
-    target_idx = ml_model.id_to_index.get(item_id)
-    if target_idx is None or ml_model.combined_features is None:
+    if ml_model.combined_features is None or retrieval_index() is None:
+        raise service_unavailable("recommender")
+
+    target_idx = ml_model.catalog.position_of(item_id)
+    if target_idx is None:
         logger.error(f"Could not find index or features for item {item_id}")
         raise HTTPException(status_code=404, detail="Item data or features not found.")
 
-    target_features = ml_model.combined_features[target_idx]
-    target_vector_dense = target_features.toarray().flatten() # For Annoy/MMR
-    target_gender, target_usage, target_season = product["gender"], product["usage"], product["season"]
-    target_color, target_article_type = product.get("baseColour"), product["articleType"]
-    logger.info(f"Target Item: ID={item_id}, Type={target_article_type}, Gender={target_gender}, Usage={target_usage}, Color={target_color}")
-
-    # 2. Determine All Required Recommendation Types
-    compatible_types_list = get_compatible_types(target_article_type)
-    accessory_types = get_accessory_types(target_usage, target_season)
-    all_target_types = sorted(list(set(compatible_types_list + accessory_types))) # Sort for consistent processing order
-    logger.info(f"Required recommendation types ({len(all_target_types)}): {all_target_types}")
-
-    recommendations_dict = {}
-    metrics_agg = {'novelty': []}
-
-    # --- Optimization: Single Annoy Search ---
-    annoy_index = ml_model.annoy_index
-    all_features = ml_model.combined_features
-    df = ml_model.df
-
-    if annoy_index is None or all_features is None or df is None:
-        logger.error("ML model components not initialized for product page.")
-        raise HTTPException(status_code=500, detail="Server error: Recommender components unavailable.")
-
-    # Fetch a larger pool - adjust multiplier as needed
-    num_items_needed_base = len(all_target_types) * 5 # Base estimate
-    buffer_multiplier = 4 # Multiplier for candidates per needed item (adjust based on filtering strictness)
-    num_potential_neighbors = min(int(ANNOY_SEARCH_K_FACTOR * num_items_needed_base * buffer_multiplier), annoy_index.get_n_items())
-    num_potential_neighbors = max(num_potential_neighbors, 500) # Ensure a minimum reasonable pool size
-    logger.info(f"Fetching {num_potential_neighbors} initial candidates from Annoy.")
-
-    annoy_start = time.time()
-    initial_indices, _ = annoy_index.get_nns_by_vector(
-        target_vector_dense, num_potential_neighbors, search_k=-1, include_distances=True
-    )
-    logger.info(f"Single Annoy search for product {item_id} took {time.time() - annoy_start:.4f}s, found {len(initial_indices)} candidates.")
-
-    if not initial_indices:
-        logger.warning(f"Annoy returned no initial candidates for product {item_id}.")
-        return ProductPageResponse(
-             product=Item(**product),
-             recommendations=OutfitRecommendation(recommendations={}, metrics={'novelty': 0.0})
-         )
-
-    # --- Optimization: Pre-filter the Pool ---
-    # Fetch only necessary columns for the *entire pool* once
-    pool_fetch_start = time.time()
-    filtering_cols = ["id", "articleType", "gender", "baseColour", "usage"] # Added 'usage'
-    cols_to_fetch = [col for col in filtering_cols if col in df.columns]
-    if "id" not in cols_to_fetch: cols_to_fetch.append("id") # Ensure ID is always fetched
-
-    try:
-        # Ensure indices are valid before using .loc
-        valid_initial_indices = [idx for idx in initial_indices if idx < len(df)]
-        if len(valid_initial_indices) != len(initial_indices):
-            logger.warning(f"Filtered out {len(initial_indices) - len(valid_initial_indices)} invalid indices from Annoy results.")
-
-        if not valid_initial_indices:
-             raise ValueError("No valid indices remained after range check.")
-
-        candidate_pool_df = df.iloc[valid_initial_indices][cols_to_fetch].copy() # Use iloc for integer indices
-        candidate_pool_df['original_index'] = valid_initial_indices # Keep track of original index
-        logger.debug(f"Created candidate_pool_df with shape {candidate_pool_df.shape}")
-    except Exception as e:
-         logger.error(f"Error creating candidate_pool_df: {e}", exc_info=True)
-         raise HTTPException(status_code=500, detail="Error preparing candidate data.")
-    logger.debug(f"Pool data fetch took {time.time() - pool_fetch_start:.4f}s")
-
-
-    # Apply base filters (self-exclusion) to the entire pool ONCE
-    # Gender/Usage filters are better applied per rec_type loop
-    base_filter_start = time.time()
-    base_self_mask = candidate_pool_df["id"] != item_id
-    base_filtered_pool_df = candidate_pool_df[base_self_mask]
-    logger.info(f"Base filtering (self-exclusion) reduced pool size to {len(base_filtered_pool_df)}. Took {time.time() - base_filter_start:.4f}s")
-
-    # 3. Loop Through Required Types and Filter/Rank the Pre-filtered Pool
-    loop_processing_start = time.time()
-    for rec_type in all_target_types:
-        loop_iter_start_time = time.time()
-        logger.debug(f"--- Processing recommendations for type: {rec_type} ---")
-
-        # Filter by Article Type (Attempt 1: Strict)
-        type_filter_start = time.time()
-        type_mask = base_filtered_pool_df["articleType"] == rec_type
-        candidates_for_type_df = base_filtered_pool_df[type_mask]
-        filter_stage = f"Strict Type ({rec_type})"
-
-        # Filter by Article Type (Attempt 2: Fallback Group)
-        if candidates_for_type_df.empty:
-            target_group = next((group for group, types in ARTICLE_TYPE_GROUPS.items() if rec_type in types), None)
-            if target_group:
-                group_candidate_types = ARTICLE_TYPE_GROUPS.get(target_group, [])
-                # Use all types in the group for fallback
-                fallback_type_mask = base_filtered_pool_df["articleType"].isin(group_candidate_types)
-                candidates_for_type_df = base_filtered_pool_df[fallback_type_mask]
-                filter_stage = f"Fallback Group ({target_group})"
-                logger.debug(f"[{rec_type}] Falling back to group '{target_group}', found {len(candidates_for_type_df)} candidates initially.")
-            else:
-                 logger.debug(f"[{rec_type}] No candidates found for strict type and no fallback group.")
-                 continue # Skip to next rec_type
-
-        if candidates_for_type_df.empty:
-             logger.debug(f"[{rec_type}] No candidates found after type/group filtering.")
-             continue
-        logger.debug(f"[{rec_type}] Type filter ({filter_stage}) took {time.time() - type_filter_start:.4f}s. Candidates: {len(candidates_for_type_df)}")
-
-        # --- Contextual Filtering ---
-        contextual_filter_start = time.time()
-
-        # 1. Usage Filter
-        allowed_usages = USAGE_COMPATIBILITY.get(target_usage, USAGE_COMPATIBILITY.get("Unknown", list(df['usage'].unique()))) # Safe fallback
-        usage_mask = candidates_for_type_df["usage"].isin(allowed_usages)
-        candidates_after_usage = candidates_for_type_df[usage_mask]
-
-        if candidates_after_usage.empty:
-            logger.debug(f"[{rec_type}] No candidates remain after usage filter (Target: {target_usage}, Allowed: {allowed_usages}).")
-            continue
-
-        # 2. Gender Filter
-        # Map target gender for broader matching (Boys->Men, Girls->Women)
-        if target_gender in ["Men", "Boys"]: target_gender_group = "Men"
-        elif target_gender in ["Women", "Girls"]: target_gender_group = "Women"
-        else: target_gender_group = "Unisex"
-
-        # Define types that are strongly gendered
-        highly_gendered_types = {
-             "Earrings", "Necklace and Chains", "Pendant", "Ring", "Bracelet", "Bangle", "Jewellery Set",
-             "Bra", "Briefs", "Boxers", "Trunk", "Baby Dolls", "Shapewear", # Added Shapewear
-             "Lipstick", "Lip Gloss", "Nail Polish", "Mascara", "Eyeshadow", # Makeup
-             "Heels", "Skirts", "Dresses", "Lehenga Choli", "Sarees", "Blouse", # Added Blouse
-             "Ties", "Cufflinks", "Suspenders", "Ties and Cufflinks", # Added Ties and Cufflinks
-         }
-
-        if target_gender_group != "Unisex":
-            allowed_genders = [target_gender_group, "Unisex"]
-            if rec_type in highly_gendered_types:
-                 # Strict: Only allow items explicitly matching the target gender group
-                 gender_mask = candidates_after_usage["gender"] == target_gender_group
-                 gender_filter_type = "Strict"
-            else:
-                 # Relaxed: Allow target gender group OR Unisex
-                 gender_mask = candidates_after_usage["gender"].isin(allowed_genders)
-                 gender_filter_type = "Relaxed"
-            logger.debug(f"[{rec_type}] Applying {gender_filter_type} gender filter for target '{target_gender_group}'. Allowed: {allowed_genders if gender_filter_type=='Relaxed' else [target_gender_group]}")
-        else: # Target is Unisex
-             gender_mask = pd.Series([True] * len(candidates_after_usage), index=candidates_after_usage.index) # Allow any gender
-             logger.debug(f"[{rec_type}] Skipping gender filter as target is Unisex.")
-
-        candidates_after_gender = candidates_after_usage[gender_mask]
-
-        if candidates_after_gender.empty:
-            logger.debug(f"[{rec_type}] No candidates remain after gender filter.")
-            continue
-
-        logger.debug(f"[{rec_type}] Contextual filtering took {time.time() - contextual_filter_start:.4f}s. Candidates after Usage/Gender: {len(candidates_after_gender)}")
-
-        # Use the result of contextual filtering for the next steps
-        final_candidates_df_for_type = candidates_after_gender
-
-        # Apply Color Filter
-        color_filter_start = time.time()
-        if target_color:
-            color_scores = final_candidates_df_for_type["baseColour"].apply(
-                lambda x: color_compatibility(target_color, x if pd.notna(x) else "Unknown")
-            )
-            # Dynamic threshold: Require at least 3 good matches if possible
-            min_color_threshold = 0.15 if len(final_candidates_df_for_type[color_scores >= 0.15]) >= 3 else 0.0
-            color_mask = color_scores >= min_color_threshold
-            final_candidates_df_for_type = final_candidates_df_for_type[color_mask]
-            logger.debug(f"[{rec_type}] Applied color filter (Threshold: {min_color_threshold}), took {time.time() - color_filter_start:.4f}s. Candidates: {len(final_candidates_df_for_type)}")
-        else:
-            logger.debug(f"[{rec_type}] No target color, skipping color filter.")
-            # final_candidates_df_for_type remains as is from gender filter
-
-        if final_candidates_df_for_type.empty:
-            logger.debug(f"[{rec_type}] No candidates remain after color filtering.")
-            continue
-
-        # --- MMR Ranking ---
-        final_candidate_indices = final_candidates_df_for_type['original_index'].tolist()
-        if not final_candidate_indices:
-            logger.debug(f"[{rec_type}] No valid original indices for MMR.")
-            continue
-
-        # Fetch features only for the final candidates for this type
-        mmr_prep_start = time.time()
-        try:
-            # Ensure indices are within bounds of the features matrix
-            max_feature_index = all_features.shape[0] - 1
-            valid_mmr_indices = [idx for idx in final_candidate_indices if idx <= max_feature_index]
-            if len(valid_mmr_indices) != len(final_candidate_indices):
-                 logger.warning(f"[{rec_type}] Filtered out {len(final_candidate_indices) - len(valid_mmr_indices)} indices out of bounds for feature matrix.")
-
-            if not valid_mmr_indices:
-                 logger.warning(f"[{rec_type}] No valid indices remaining for MMR feature fetching.")
-                 continue
-
-            candidate_features_sparse = all_features[valid_mmr_indices]
-            # Crucially, pass the valid_mmr_indices to MMR, not final_candidate_indices directly if filtering occurred
-            indices_for_mmr = valid_mmr_indices
-        except IndexError as e:
-             logger.error(f"[{rec_type}] IndexError fetching features for MMR: {e}. Indices: {final_candidate_indices[:5]}...")
-             continue # Skip this type if features can't be fetched
-        except Exception as e:
-             logger.error(f"[{rec_type}] Error fetching features for MMR: {e}", exc_info=True)
-             continue
-
-        logger.debug(f"[{rec_type}] MMR feature prep took {time.time() - mmr_prep_start:.4f}s")
-
-        mmr_exec_start = time.time()
-        selected_original_indices = optimized_mmr(
-            target_vector_dense,
-            indices_for_mmr, # Pass the potentially filtered list of original indices
-            candidate_features_sparse,
-            top_n=5, # Request slightly more for negative constraint filtering
-            lambda_param=0.5
-        )
-        logger.debug(f"[{rec_type}] MMR execution took {time.time() - mmr_exec_start:.4f}s, selected {len(selected_original_indices)} indices.")
-
-        if not selected_original_indices:
-            logger.debug(f"[{rec_type}] MMR returned no items.")
-            continue
-
-        # --- Final Selection & Formatting ---
-        post_mmr_start = time.time()
-        # Fetch full data for selected items using the original indices from MMR
-        try:
-             # Ensure selected indices are valid for the main DataFrame 'df'
-             max_df_index = len(df) - 1
-             valid_selected_indices = [idx for idx in selected_original_indices if idx <= max_df_index]
-             if len(valid_selected_indices) != len(selected_original_indices):
-                  logger.warning(f"[{rec_type}] Filtered out {len(selected_original_indices) - len(valid_selected_indices)} MMR indices out of bounds for main DataFrame.")
-
-             if not valid_selected_indices:
-                  logger.warning(f"[{rec_type}] No valid MMR indices remaining after DataFrame bounds check.")
-                  continue
-
-             # Use .iloc as selected_original_indices are integer positions
-             results_df = df.iloc[valid_selected_indices]
-        except Exception as e:
-             logger.error(f"[{rec_type}] Error fetching final item data after MMR: {e}", exc_info=True)
-             continue
-
-
-        recs_list = []
-        for _, item_row in results_df.iterrows():
-             try:
-                 item_dict = item_row.to_dict()
-                 # Convert ID back to int for the response model
-                 item_id_int = int(item_dict['id'])
-                 item_dict['id'] = item_id_int
-                 # Add image URL
-                 item_dict['image_url'] = f"/static/images/{item_id_int}.jpg"
-                 recs_list.append(item_dict)
-             except Exception as e:
-                 logger.warning(f"[{rec_type}] Error formatting item {item_row.get('id', 'Unknown')}: {e}")
-
-        # Apply negative constraints and limit to top 3
-        final_recs = [item for item in recs_list if check_negative_constraints(product, item)][:3]
-
-        if final_recs:
-            recommendations_dict[rec_type] = [Item(**item) for item in final_recs]
-            novelty = inverse_popularity_score(final_recs)
-            metrics_agg['novelty'].append(novelty)
-            logger.debug(f"[{rec_type}] Successfully generated {len(final_recs)} recommendations. Post-MMR took {time.time() - post_mmr_start:.4f}s")
-        else:
-             logger.debug(f"[{rec_type}] No recommendations passed negative constraints or formatting failed.")
-
-        logger.debug(f"--- Finished processing type {rec_type} in {time.time() - loop_iter_start_time:.4f}s ---")
-
-
-    avg_metrics = {k: np.mean(v) if v else 0.0 for k, v in metrics_agg.items()}
-    logger.info(f"Loop processing finished in {time.time() - loop_processing_start:.4f}s")
-
-    total_time = time.time() - request_start_time
-    logger.info(f"Product page request for {item_id} completed in {total_time:.2f}s. Found recommendations for {len(recommendations_dict)} types.")
-
-    # Final check if recommendations_dict is empty after all processing
-    if not recommendations_dict:
-         logger.warning(f"No recommendations generated for any type for product {item_id}.")
-
-    return ProductPageResponse(
-        product=Item(**product),
-        recommendations=OutfitRecommendation(recommendations=recommendations_dict, metrics=avg_metrics)
-    )
+    stored = ml_model.outfit_store.get(target_idx) if ml_model.outfit_store is not None else None
+    if stored is not None:
+        logger.info(f"Served materialized outfit for product {item_id} in {time.time() - request_start_time:.4f}s")
+        body = b'{"product":' + item_fragments().get(target_idx) + b',"recommendations":' + stored + b'}'
+        if ml_model.catalog_hash is not None:
+            response_cache.put(cache_key, body)
+        return Response(content=body, media_type="application/json")
+
+    async def compute_page() -> bytes:
+        # The budget includes the wait for an executor slot
+        budget = LatencyBudget(PRODUCT_PAGE_LATENCY_BUDGET)
+        outfit = await run_in_lane("product_page", compute_outfit_json, product, target_idx, budget)
+        body = b'{"product":' + item_fragments().get(target_idx) + b',"recommendations":' + outfit + b'}'
+        if ml_model.catalog_hash is not None and not budget.degradations: # Degraded pages are not cached
+            response_cache.put(cache_key, body)
+        return body
+
+    body = await coalesced_requests.run(cache_key, compute_page)
+    return Response(content=body, media_type="application/json")
 
 @app.post("/api/recommend-from-image", response_model=OutfitRecommendation)
 async def recommend_from_image(file: UploadFile = File(...)):
     """Recommend outfits based on an uploaded image."""
     start_time = time.time()
     if not ml_model.onehot_encoder or not ml_model.tfidf_vectorizer or not ml_model.clip_model:
-         raise HTTPException(status_code=500, detail="ML models not initialized for image recommendation.")
+         logger.error("ML models not initialized for image recommendation.")
+         raise service_unavailable("catalog", "recommender", "clip")
 
     try:
         contents = await file.read()
-        image = Image.open(BytesIO(contents)).convert("RGB")
-
-        attributes = predict_attributes(image)
-        if not attributes:
-            raise HTTPException(status_code=400, detail="Could not extract attributes from image.")
-
-        logger.info(f"Predicted attributes: {attributes}")
-
-        synthetic_name = f"{attributes.get('gender', 'Unisex')}'s {attributes.get('baseColour', '')} {attributes.get('articleType', 'Fashion Item')}"
-        categorical_data = [attributes.get(col, "Unknown") for col in ["gender", "masterCategory", "subCategory", "articleType", "baseColour", "season", "usage"]]
-
-        try:
-            onehot = ml_model.onehot_encoder.transform([categorical_data])
-            tfidf = ml_model.tfidf_vectorizer.transform([synthetic_name])
-            target_features = hstack([onehot, tfidf]).tocsr()
-        except Exception as e:
-            logger.error(f"Error transforming predicted attributes: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Error processing predicted attributes")
-
-
-        target_article_type = attributes.get("articleType", "Shirts")
-        target_gender = attributes.get("gender", "Unisex")
-        target_usage = attributes.get("usage", "Casual")
-        target_season = attributes.get("season", "Summer")
-        target_color = attributes.get("baseColour", None)
+        cache_key = ("image", ml_model.catalog_hash, hashlib.sha256(contents).hexdigest())
+        cached = response_cache.get(cache_key) if ml_model.catalog_hash is not None else None
+        if cached is not None:
+            logger.info(f"Served cached image recommendation in {time.time() - start_time:.4f}s")
+            return Response(content=cached, media_type="application/json")
+
+        async def compute_recommendation() -> bytes:
+            budget = LatencyBudget(IMAGE_LATENCY_BUDGET)
+            body = await run_in_lane("image", image_recommendation_json, contents, budget)
+            if ml_model.catalog_hash is not None and not budget.degradations: # Degraded results are not cached
+                response_cache.put(cache_key, body)
+            return body
+
+        body = await coalesced_requests.run(cache_key, compute_recommendation)
+        logger.info(f"Image recommendation request completed in {time.time() - start_time:.2f}s")
+        return Response(content=body, media_type="application/json")
 
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error processing image recommendation: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
-        compatible_types_list = get_compatible_types(target_article_type)
-        accessory_types = get_accessory_types(target_usage, target_season)
-        all_target_types = list(set(compatible_types_list + accessory_types))
+def image_recommendation_json(contents: bytes, budget: Optional[LatencyBudget] = None) -> bytes:
+    """OutfitRecommendation JSON for an uploaded image (runs on the request executor)."""
+    budget = budget if budget is not None else LatencyBudget()
+    image = Image.open(BytesIO(contents)).convert("RGB")
 
-        recommendations_dict = {}
-        metrics_agg = {'novelty': []}
+    attributes = predict_attributes(image)
+    if not attributes:
+        raise HTTPException(status_code=400, detail="Could not extract attributes from image.")
 
-        logger.info(f"Generating recommendations from image for types: {all_target_types}")
+    logger.info(f"Predicted attributes: {attributes}")
 
-        for rec_type in all_target_types:
-             recs, novelty = get_ml_recommendations(
-                 target_features, rec_type, target_gender, target_color, target_id=None, top_n=3
-             )
-             if recs:
-                 recommendations_dict[rec_type] = [Item(**item) for item in recs]
-                 metrics_agg['novelty'].append(novelty)
+    synthetic_name = f"{attributes.get('gender', 'Unisex')}'s {attributes.get('baseColour', '')} {attributes.get('articleType', 'Fashion Item')}"
+    categorical_data = [attributes.get(col, "Unknown") for col in ["gender", "masterCategory", "subCategory", "articleType", "baseColour", "season", "usage"]]
 
-        avg_metrics = {k: np.mean(v) if v else 0.0 for k, v in metrics_agg.items()}
+    try:
+        onehot = ml_model.onehot_encoder.transform([categorical_data])
+        tfidf = ml_model.tfidf_vectorizer.transform([synthetic_name])
+        target_features = normalize_features(hstack([onehot, tfidf]))
+    except Exception as e:
+        logger.error(f"Error transforming predicted attributes: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error processing predicted attributes")
 
-        logger.info(f"Image recommendation request completed in {time.time() - start_time:.2f}s")
-        return OutfitRecommendation(recommendations=recommendations_dict, metrics=avg_metrics)
 
-    except HTTPException as he:
-        raise he
-    except Exception as e:
-        logger.error(f"Error processing image recommendation: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+    target = {
+        "articleType": attributes.get("articleType", "Shirts"),
+        "gender": attributes.get("gender", "Unisex"),
+        "usage": attributes.get("usage", "Casual"),
+        "season": attributes.get("season", "Summer"),
+        "baseColour": attributes.get("baseColour", None),
+    }
+    # One retrieval for the whole outfit, partitioned and ranked per type like a product page
+    target_vector_dense = target_features.toarray().ravel().astype(np.float32)
+    return outfit_recommendation_json(target_features, target_vector_dense, target, budget=budget)
 
 @app.post("/api/search", response_model=SearchResult)
 async def search(query: str = Form(...)):
     """Search for images based on a text query using ChromaDB."""
     if ml_model.chroma_client is None:
-        raise HTTPException(status_code=503, detail="Search service not available (ChromaDB not initialized).")
+        logger.error("Search service not available (ChromaDB not initialized).")
+        raise service_unavailable("chroma")
     if not query or query.isspace():
          raise HTTPException(status_code=400, detail="Search query cannot be empty.")
+    search_key = ("search", " ".join(query.lower().split())) # CLIP's tokenizer ignores case and extra spaces
+    return await coalesced_requests.run(search_key, lambda: run_in_lane("search", search_images, query))
 
+def search_images(query: str) -> SearchResult:
+    """Nearest catalog images to a text query (runs on the request executor)."""
     start_time = time.time()
     try:
+        text_batcher = clip_text_batcher()
         try:
             fashion_collection = ml_model.chroma_client.get_collection(
                 "fashion",
-                embedding_function=OpenCLIPEmbeddingFunction(),
+                embedding_function=ml_model.clip_text_embedder,
             )
         except Exception as e:
             logger.error(f"Could not get ChromaDB collection 'fashion': {e}")
             raise HTTPException(status_code=500, detail="Search collection unavailable.")
 
+        # The query embedding is computed in a batch with concurrent searches
         results = fashion_collection.query(
-            query_texts=[query],
+            query_embeddings=[text_batcher(query)],
             n_results=10,
             include=["metadatas", "distances", "uris"]
         )
@@ -1465,40 +1532,54 @@ async def get_products(
     - featured: If true, return only featured products
     - random: If true, return random products
     """
+    return await run_in_lane("products", products_page, limit, offset, gender, masterCategory, subCategory,
+                             articleType, baseColour, season, usage, price_min, price_max, sort_by,
+                             sort_direction, featured, random)
+
+def products_page(
+    limit: int,
+    offset: int,
+    gender: Optional[str],
+    masterCategory: Optional[str],
+    subCategory: Optional[str],
+    articleType: Optional[str],
+    baseColour: Optional[str],
+    season: Optional[str],
+    usage: Optional[str],
+    price_min: Optional[float],
+    price_max: Optional[float],
+    sort_by: str,
+    sort_direction: str,
+    featured: bool,
+    random: bool
+) -> Response:
+    """Filtered, sorted page of products for /api/products (runs on the request executor)."""
     try:
-        if ml_model.df is None:
-            logger.error("DataFrame not loaded.")
-            raise HTTPException(status_code=500, detail="Server data not initialized")
-
-        # Start with full dataframe
-        filtered_df = ml_model.df.copy()
-
-        # Apply filters
-        if gender:
-            filtered_df = filtered_df[filtered_df["gender"] == gender]
-        if masterCategory:
-            filtered_df = filtered_df[filtered_df["masterCategory"] == masterCategory]
-        if subCategory:
-            filtered_df = filtered_df[filtered_df["subCategory"] == subCategory]
-        if articleType:
-            filtered_df = filtered_df[filtered_df["articleType"] == articleType]
-        if baseColour:
-            filtered_df = filtered_df[filtered_df["baseColour"] == baseColour]
-        if season:
-            filtered_df = filtered_df[filtered_df["season"] == season]
-        if usage:
-            filtered_df = filtered_df[filtered_df["usage"] == usage]
+        if ml_model.catalog is None:
+            logger.error("Catalog not loaded.")
+            raise service_unavailable("catalog")
+
+        catalog = ml_model.catalog
+        prices = ml_model.df["price"].to_numpy(dtype=np.float64)
+
+        # Apply filters as boolean masks over category codes
+        mask = np.ones(len(catalog), dtype=bool)
+        attribute_filters = {"gender": gender, "masterCategory": masterCategory, "subCategory": subCategory,
+                             "articleType": articleType, "baseColour": baseColour, "season": season, "usage": usage}
+        for col, value in attribute_filters.items():
+            if value:
+                mask &= catalog.mask_equal(col, value)
         if price_min is not None:
-            filtered_df = filtered_df[filtered_df["price"] >= price_min]
+            mask &= prices >= price_min
         if price_max is not None:
-            filtered_df = filtered_df[filtered_df["price"] <= price_max]
+            mask &= prices <= price_max
+
+        positions = np.flatnonzero(mask)
 
         # Mark featured products (for demonstration - here we're marking every 5th product as featured)
         # In a real app, you'd have a "featured" column in your database
-        filtered_df["featured"] = filtered_df.index % 5 == 0
-
         if featured:
-            filtered_df = filtered_df[filtered_df["featured"]]
+            positions = positions[positions % 5 == 0]
 
         # Apply sorting
         if sort_by not in ["id", "price", "productDisplayName"]:
@@ -1506,43 +1587,31 @@ async def get_products(
 
         ascending = sort_direction.lower() != "desc"
 
-        if sort_by == "productDisplayName":
-            # Handle potential NaN values in productDisplayName
-            filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending, na_position='last')
+        if sort_by == "id":
+            # Catalog rows are already in ascending id order
+            if not ascending:
+                positions = positions[::-1]
         else:
-            filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
+            # Handle potential NaN values (price or productDisplayName) by sorting them last
+            positions = ml_model.df[sort_by].iloc[positions].sort_values(
+                ascending=ascending, na_position='last', kind='stable').index.to_numpy()
 
         # Handle random selection
         if random:
-            filtered_df = filtered_df.sample(min(len(filtered_df), limit))
+            positions = np.random.permutation(positions)[:min(len(positions), limit)]
 
         # Apply pagination
-        paginated_df = filtered_df.iloc[offset:offset+limit]
-
-        # Convert to list of dictionaries and format
-        products = []
-        for _, row in paginated_df.iterrows():
-            product_dict = row.to_dict()
-
-            # Convert ID to int
-            product_id = int(product_dict['id'])
-            product_dict['id'] = product_id
-
-            # Add image URL
-            product_dict['image_url'] = f"/static/images/{product_id}.jpg"
-
-            # Ensure price exists
-            if 'price' not in product_dict or pd.isna(product_dict['price']):
-                product_dict['price'] = 29.99  # Default price
+        paginated_positions = positions[offset:offset+limit]
 
-            products.append(Item(**product_dict))
+        # Assemble the response from pre-serialized items (default price where missing)
+        body = b'{"products":' + item_fragments().array(paginated_positions, default_price=DEFAULT_PRICE) + b'}'
 
         # Get total count for pagination
-        total_count = len(filtered_df)
+        total_count = len(positions)
 
-        logger.info(f"Returned {len(products)} products out of {total_count} filtered (from total {len(ml_model.df)})")
+        logger.info(f"Returned {len(paginated_positions)} products out of {total_count} filtered (from total {len(ml_model.df)})")
 
-        response = ProductsResponse(products=products)
+        response = Response(content=body, media_type="application/json")
 
         # Add pagination metadata to response headers (would need to modify ProductsResponse)
         # response.headers["X-Total-Count"] = str(total_count)
@@ -1552,6 +1621,8 @@ async def get_products(
 
         return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_products: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error retrieving products: {str(e)}")
@@ -1595,84 +1666,54 @@ async def get_random_products(
     try:
         logger.info(f"Random products request received. Limit: {limit}, Gender: {gender}")
 
-        if ml_model.df is None:
+        if ml_model.catalog is None and readiness.state("catalog") == LOADING:
+            # The startup stage is already loading it
+            raise service_unavailable("catalog")
+
+        if ml_model.catalog is None:
             # Try to initialize data if it's not loaded
-            logger.warning("DataFrame not loaded. Attempting to load data.")
+            logger.warning("Catalog not loaded. Attempting to load data.")
             try:
                 # Make sure DB is initialized
                 init_db()
-                # Try to load data
-                ml_model.df = load_data()
-
-                # If we've loaded data but other ML components aren't initialized,
-                # initialize the minimal components needed for this endpoint
-                if ml_model.df is not None and ml_model.df.empty == False:
-                    if ml_model.id_to_index is None or not ml_model.id_to_index:
-                        logger.info("Initializing minimal components for random products endpoint")
-                        ml_model.id_to_index = {str(row["id"]): idx for idx, row in ml_model.df.iterrows()}
-                        ml_model.index_to_id = {idx: str(row["id"]) for idx, row in ml_model.df.iterrows()}
+                # Try to load data and build the minimal components needed for this endpoint
+                load_catalog_stage()
             except Exception as e:
                 logger.error(f"Failed to load data: {e}")
                 raise HTTPException(status_code=500, detail=f"Failed to load product data: {str(e)}")
 
-            if ml_model.df is None or ml_model.df.empty:
+            if ml_model.catalog is None or len(ml_model.catalog) == 0:
                 # If still empty, return a helpful error
-                logger.error("DataFrame is still None or empty after loading attempt")
+                logger.error("Catalog is still None or empty after loading attempt")
                 raise HTTPException(status_code=500, detail="Product data not available")
 
-        # Start with the full DataFrame
-        filtered_df = ml_model.df.copy()
+        catalog = ml_model.catalog
 
         # Apply gender filter if specified
         if gender:
             # Include Unisex products with the specified gender
-            filtered_df = filtered_df[
-                (filtered_df["gender"] == gender) | (filtered_df["gender"] == "Unisex")
-            ]
-            logger.info(f"Filtering by gender '{gender}'. Found {len(filtered_df)} matching products.")
+            positions = np.flatnonzero(catalog.mask_equal("gender", gender) | catalog.mask_equal("gender", "Unisex"))
+            logger.info(f"Filtering by gender '{gender}'. Found {len(positions)} matching products.")
+        else:
+            positions = np.arange(len(catalog))
 
         # If there are no products after filtering, return an empty result
-        if filtered_df.empty:
+        if len(positions) == 0:
             logger.warning(f"No products found with gender: {gender}")
             return ProductsResponse(products=[])
 
         # Sample random products
-        sample_size = min(limit, len(filtered_df))
-        sampled_df = filtered_df.sample(n=sample_size)
+        sample_size = min(limit, len(positions))
+        sampled_positions = np.random.choice(positions, size=sample_size, replace=False)
 
-        # Convert to response format with proper IDs and image URLs
-        products = []
-        for _, row in sampled_df.iterrows():
-            try:
-                product_dict = row.to_dict()
+        # Assemble the response from pre-serialized items (default price where missing)
+        body = b'{"products":' + item_fragments().array(sampled_positions, default_price=DEFAULT_PRICE) + b'}'
 
-                # Convert ID to int (but handle string ID case)
-                try:
-                    product_id = int(product_dict['id'])
-                except ValueError:
-                    # If we can't convert to int, keep as is
-                    product_id = product_dict['id']
-
-                product_dict['id'] = product_id
-
-                # Add image URL - handle both int and string IDs
-                if isinstance(product_id, int):
-                    product_dict['image_url'] = f"/static/images/{product_id}.jpg"
-                else:
-                    product_dict['image_url'] = f"/static/images/{product_id}.jpg"
-
-                # Ensure price exists (add default if missing)
-                if 'price' not in product_dict or pd.isna(product_dict['price']):
-                    product_dict['price'] = 29.99
-
-                products.append(Item(**product_dict))
-            except Exception as e:
-                logger.warning(f"Error processing product row: {e}")
-                continue
-
-        logger.info(f"Returning {len(products)} random products")
-        return ProductsResponse(products=products)
+        logger.info(f"Returning {len(sampled_positions)} random products")
+        return Response(content=body, media_type="application/json")
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_random_products: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
@@ -1792,10 +1833,9 @@ def inverse_popularity_score(recommendations: List[Dict]):
         return 0.0
 
 
-def get_true_relevances(target_features_sparse, recommended_items, id_to_index_map, all_features_sparse):
+def get_true_relevances(target_features_sparse, recommended_items, catalog, all_features_sparse):
     """Calculates true relevance (cosine similarity) for recommended items."""
-    indices = [id_to_index_map.get(str(item.get('id'))) for item in recommended_items
-               if str(item.get('id')) in id_to_index_map]
+    indices = [catalog.position_of(item.get('id')) for item in recommended_items]
 
     if not indices:
         return np.array([])
@@ -1806,17 +1846,13 @@ def get_true_relevances(target_features_sparse, recommended_items, id_to_index_m
 
     try:
         if hasattr(target_features_sparse, "toarray"):
-             target_features_dense_2d = target_features_sparse.toarray().reshape(1, -1)
+             target_features_dense = target_features_sparse.toarray().ravel()
         else:
-             target_features_dense_2d = np.asarray(target_features_sparse).reshape(1, -1)
+             target_features_dense = np.asarray(target_features_sparse).ravel()
 
+        # Feature rows are L2-normalized, so the dot product is the cosine similarity
         recommended_features = all_features_sparse[valid_indices]
-
-        relevances = cosine_similarity(
-            target_features_dense_2d,
-            recommended_features
-        )[0]
-        return np.asarray(relevances)
+        return np.asarray(recommended_features @ target_features_dense).ravel()
     except Exception as e:
         logger.error(f"Error calculating relevances: {e}", exc_info=True)
         return np.array([])
@@ -1824,13 +1860,17 @@ def get_true_relevances(target_features_sparse, recommended_items, id_to_index_m
 @app.get("/api/evaluate")
 async def evaluate_recommendations():
     """Evaluates ML recommender against baselines with NDCG metrics."""
-    if ml_model.df is None or ml_model.combined_features is None:
+    return await run_in_lane("evaluate", evaluate_random_product)
+
+def evaluate_random_product() -> Dict[str, Any]:
+    """Evaluation report for /api/evaluate on one random product (runs on the request executor)."""
+    if ml_model.catalog is None or ml_model.combined_features is None:
         raise HTTPException(status_code=500, detail="Evaluation cannot run: Data or features not loaded.")
 
     try:
-        target_product = ml_model.df.sample(1).iloc[0].to_dict()
+        target_idx = int(np.random.randint(len(ml_model.catalog)))
+        target_product = ml_model.catalog.item(target_idx)
         target_id = str(target_product['id'])
-        target_idx = ml_model.id_to_index[target_id]
         target_features = ml_model.combined_features[target_idx]
 
         ml_recs, ml_novelty = get_ml_recommendations(
@@ -1846,11 +1886,8 @@ async def evaluate_recommendations():
         random_recs_list = random_recommender(top_n=5)
 
         def get_scores(recommendations):
-            indices = [ml_model.id_to_index[str(item['id'])] for item in recommendations]
-            return cosine_similarity(
-                target_features.toarray(),
-                ml_model.combined_features[indices].toarray()
-            )[0] if indices else []
+            indices = [ml_model.catalog.position_of(item['id']) for item in recommendations]
+            return (ml_model.combined_features[indices] @ target_features.T).toarray().ravel() if indices else []
 
         try:
             ml_relevances = get_scores(ml_recs)
@@ -1903,7 +1940,11 @@ async def evaluate_recommendations():
 @app.get("/api/evaluate-all")
 async def evaluate_all_products(sample_size: int = 1000, k: int = 5):
     """Evaluates ML recommender against baselines across many products with corrected NDCG."""
-    if ml_model.df is None or ml_model.combined_features is None:
+    return await run_in_lane("evaluate", evaluate_sample, sample_size, k)
+
+def evaluate_sample(sample_size: int, k: int) -> Dict[str, Any]:
+    """Evaluation report for /api/evaluate-all (runs on the request executor)."""
+    if ml_model.df is None or ml_model.catalog is None or ml_model.combined_features is None:
         raise HTTPException(status_code=500, detail="Evaluation cannot run: Data or features not loaded.")
 
     try:
@@ -1924,15 +1965,10 @@ async def evaluate_all_products(sample_size: int = 1000, k: int = 5):
         }
 
         processed_count = 0
-        for _, target_product_series in eval_sample.iterrows():
-            target_product = target_product_series.to_dict()
+        for target_idx in eval_sample.index:
+            target_product = ml_model.catalog.item(target_idx)
             try:
                 target_id = str(target_product['id'])
-                if target_id not in ml_model.id_to_index:
-                     logger.warning(f"Skipping product {target_id}: Not found in id_to_index map.")
-                     continue
-
-                target_idx = ml_model.id_to_index[target_id]
                 target_features = ml_model.combined_features[target_idx]
 
                 ml_recs, ml_novelty = get_ml_recommendations(
@@ -1945,7 +1981,7 @@ async def evaluate_all_products(sample_size: int = 1000, k: int = 5):
                 )
 
                 ml_true_relevances = get_true_relevances(
-                    target_features, ml_recs, ml_model.id_to_index, ml_model.combined_features
+                    target_features, ml_recs, ml_model.catalog, ml_model.combined_features
                 )
 
                 num_ml_recs = len(ml_recs)
@@ -1961,7 +1997,7 @@ async def evaluate_all_products(sample_size: int = 1000, k: int = 5):
 
                 popularity_recs = popularity_based_recommender(top_n=k)
                 pop_true_relevances = get_true_relevances(
-                    target_features, popularity_recs, ml_model.id_to_index, ml_model.combined_features
+                    target_features, popularity_recs, ml_model.catalog, ml_model.combined_features
                 )
                 num_pop_recs = len(popularity_recs)
                 pop_scores_by_rank = np.arange(num_pop_recs, 0, -1)
@@ -1976,7 +2012,7 @@ async def evaluate_all_products(sample_size: int = 1000, k: int = 5):
 
                 random_recs = random_recommender(top_n=k)
                 rand_true_relevances = get_true_relevances(
-                    target_features, random_recs, ml_model.id_to_index, ml_model.combined_features
+                    target_features, random_recs, ml_model.catalog, ml_model.combined_features
                 )
                 num_rand_recs = len(random_recs)
                 rand_scores_by_rank = np.arange(num_rand_recs, 0, -1)
@@ -2032,12 +2068,81 @@ async def evaluate_all_products(sample_size: int = 1000, k: int = 5):
         logger.error(f"Full evaluation error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Evaluation failed: {str(e)}")
 
+@app.get("/api/evaluate-index")
+async def evaluate_index(sample_size: int = 200, k: int = 10):
+    """Recall@k of the live retrieval index (raw or projected Annoy, or sparse) against exact cosine search."""
+    if ml_model.combined_features is None or retrieval_index() is None:
+        raise service_unavailable("recommender")
+    return await run_in_lane("evaluate", index_recall_report, sample_size, k)
+
+def index_recall_report(sample_size: int, k: int) -> Dict[str, Any]:
+    """Recall report for /api/evaluate-index (runs on the request executor)."""
+    features = ml_model.combined_features
+    rng = np.random.default_rng(42)
+    positions = rng.choice(features.shape[0], size=min(max(sample_size, 1), features.shape[0]), replace=False)
+
+    def search(position: int, top_k: int) -> List[int]:
+        return retrieve_candidates(features[position], top_k)
+
+    report = recall_vs_exact(features, search, positions, k)
+    report["index"] = {
+        "backend": RETRIEVAL_BACKEND,
+        "projection": ml_model.projection.describe() if ml_model.projection is not None else None,
+        "dims": ml_model.index_dim,
+        "index_mb": round(os.path.getsize(ml_model.annoy_path) / 1e6, 2) if ml_model.annoy_path else None,
+    }
+    return report
+
 
 # --- Optional: Add root endpoint or health check ---
 @app.get("/")
 async def read_root():
     return {"message": "Fashion Recommendation API is running."}
 
+@app.get("/ready")
+async def readiness_check():
+    """Per-component startup state; 200 once the catalog endpoints can serve traffic."""
+    components = readiness.snapshot()
+    serving = readiness.is_ready("catalog", "recommender")
+    return JSONResponse(status_code=200 if serving else 503,
+                        content={"ready": serving, "components": components})
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Admit /api/admin/* requests only with the configured ADMIN_API_TOKEN."""
+    if ADMIN_API_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+@app.post("/api/admin/rebuild-index", status_code=202, dependencies=[Depends(require_admin_token)])
+async def rebuild_index():
+    """Start a background Annoy rebuild (partition sub-indexes included); the current indexes keep serving until the swap."""
+    if RETRIEVAL_BACKEND != "annoy":
+        raise HTTPException(status_code=400, detail=f"The '{RETRIEVAL_BACKEND}' retrieval backend has no index to rebuild.")
+    if not readiness.is_ready("recommender") or ml_model.annoy_path is None:
+        raise service_unavailable("recommender")
+    running = getattr(app.state, "annoy_rebuild_task", None)
+    if running is not None and not running.done():
+        raise HTTPException(status_code=409, detail="An index rebuild is already running.")
+
+    def log_rebuild_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Annoy index rebuild failed: {task.exception()}")
+
+    app.state.annoy_rebuild_task = asyncio.create_task(rebuild_annoy_index())
+    app.state.annoy_rebuild_task.add_done_callback(log_rebuild_failure)
+    return {"status": "rebuild started", "n_trees": ANNOY_N_TREES, "partitions": ml_model.partitioned_index is not None}
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Hit/miss/eviction counters of the product-page and image response cache."""
+    return response_cache.stats()
+
+@app.get("/api/coalescing-stats")
+async def coalescing_stats():
+    """Computations vs. coalesced duplicates of concurrent identical product/image/search requests."""
+    return coalesced_requests.stats()
+
 @app.get("/health")
 async def health_check():
     if ml_model.df is not None and not ml_model.df.empty:
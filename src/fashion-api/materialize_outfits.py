@@ -0,0 +1,85 @@
+"""Batch job: precompute outfit recommendations for every catalog item.
+
+Loads the catalog and feature artifacts the same way the service does, fans the
+catalog out over a process pool running `compute_outfit_json`, and
+writes the results to the outfit store next to the feature artifacts, where
+`product_page` picks them up on its next start. Run from the fashion-api dir:
+
+    python materialize_outfits.py --workers 8
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 256
+
+_worker_main = None
+
+
+def _init_worker():
+    """Load the catalog and feature artifacts once per worker process."""
+    global _worker_main
+    import main
+    logging.getLogger().setLevel(logging.WARNING)
+    main.load_catalog_stage()
+    main.load_feature_stage()
+    _worker_main = main
+
+
+def _compute_chunk(positions: List[int]) -> List[Tuple[int, bytes]]:
+    results = []
+    for position in positions:
+        product = _worker_main.ml_model.catalog.item(position)
+        try:
+            outfit = _worker_main.compute_outfit_json(product, position)
+        except Exception as e:
+            logger.error(f"Failed to materialize outfit for item {product['id']}: {e}")
+            continue
+        results.append((position, outfit))
+    return results
+
+
+def materialize_outfits(workers: int, chunk_size: int = DEFAULT_CHUNK_SIZE, limit: int = 0) -> str:
+    """Compute and persist outfits for the whole catalog (or its first `limit` items); returns the store path."""
+    import main
+    from outfit_store import OutfitStoreWriter
+
+    start_time = time.time()
+    # Builds and publishes the feature artifacts if they are missing, so workers only load them.
+    main.load_catalog_stage()
+    main.load_feature_stage()
+    n_items = len(main.ml_model.catalog) if limit <= 0 else min(limit, len(main.ml_model.catalog))
+    chunks = [chunk.tolist() for chunk in np.array_split(np.arange(n_items), max(1, -(-n_items // chunk_size)))]
+
+    writer = OutfitStoreWriter(main.outfit_store_path(), main.outfit_store_fingerprint())
+    materialized = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        for done, rows in enumerate(executor.map(_compute_chunk, chunks), start=1):
+            writer.add_many(rows)
+            materialized += len(rows)
+            if done % 10 == 0 or done == len(chunks):
+                logger.info(f"Materialized {materialized}/{n_items} outfits "
+                            f"({time.time() - start_time:.1f}s elapsed).")
+    path = writer.close()
+    logger.info(f"Materialized {writer.count} outfits in {time.time() - start_time:.2f} seconds.")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute outfit recommendations for every product.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--limit", type=int, default=0, help="Only materialize the first N items (0 = all)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    materialize_outfits(args.workers, args.chunk_size, args.limit)
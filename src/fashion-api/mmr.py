@@ -0,0 +1,79 @@
+"""Greedy Maximal Marginal Relevance selection in O(N·k).
+
+MMR picks k items one at a time, each maximizing
+`lambda * relevance - (1 - lambda) * max similarity to the items already
+picked`. Only the max-similarity term changes between steps, and it changes
+by a single new column: the similarity of every candidate to the item just
+picked. So instead of the full N x N similarity matrix, selection keeps a
+running max-similarity vector and updates it with one matrix-vector product
+per pick. Rows are L2-normalized once (or passed in pre-normalized), so dot
+products are cosines, and sparse rows stay sparse throughout.
+"""
+
+from typing import List
+
+import numpy as np
+from scipy.sparse import issparse
+from sklearn.preprocessing import normalize
+
+
+def _dense_row(matrix, row: int) -> np.ndarray:
+    vector = matrix[row]
+    return vector.toarray().ravel() if issparse(vector) else np.asarray(vector).ravel()
+
+
+def unit_vector(vector: np.ndarray) -> np.ndarray:
+    """L2-normalized copy of a dense vector (zero vectors stay zero)."""
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def mmr_select(
+    target_vector: np.ndarray,
+    candidate_features,
+    top_n: int,
+    lambda_param: float = 0.5,
+    normalized: bool = False
+) -> List[int]:
+    """Rows of `candidate_features` (sparse or dense) chosen by MMR, in selection order.
+
+    Pass `normalized=True` when the candidate rows and target are already
+    L2-normalized to skip the normalization copy.
+    """
+    if min(top_n, candidate_features.shape[0]) <= 0:
+        return []
+
+    target = np.asarray(target_vector.toarray() if issparse(target_vector) else target_vector, dtype=np.float64).ravel()
+    if not normalized:
+        candidate_features = normalize(candidate_features, norm="l2")
+        target = unit_vector(target)
+
+    relevance = np.asarray(candidate_features @ target).ravel()
+    return mmr_rank(relevance, candidate_features, top_n, lambda_param)
+
+
+def mmr_rank(relevance: np.ndarray, normalized_rows, top_n: int, lambda_param: float = 0.5) -> List[int]:
+    """MMR over L2-normalized rows whose relevance to the target is already computed.
+
+    Lets a caller score a whole candidate pool against the target once and
+    then rank any subset of it by slicing `relevance` and the rows.
+    """
+    num_candidates = normalized_rows.shape[0]
+    top_n = min(top_n, num_candidates)
+    if top_n <= 0:
+        return []
+
+    available = np.ones(num_candidates, dtype=bool)
+    max_similarity = np.full(num_candidates, -np.inf)
+
+    selected = [int(np.argmax(relevance))]
+    available[selected[0]] = False
+    while len(selected) < top_n:
+        similarity = np.asarray(normalized_rows @ _dense_row(normalized_rows, selected[-1])).ravel()
+        np.maximum(max_similarity, similarity, out=max_similarity)
+        scores = lambda_param * relevance - (1 - lambda_param) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+    return selected
@@ -0,0 +1,113 @@
+"""Outfit rules from constants.py compiled into lookup tables.
+
+Group membership, target-type lists and fallback groups are catalog
+independent and compiled once at import. `CompiledOutfitRules` maps the rules
+onto the catalog's category codes (type -> group arrays, per-usage and
+per-gender allow-masks, formal exclusions), so per-candidate rule checks run
+as numpy mask operations over code arrays.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from constants import (ARTICLE_TYPE_GROUPS, COMPATIBLE_TYPES, ACCESSORY_COMBINATIONS, SEASONAL_ACCESSORIES,
+                       USAGE_COMPATIBILITY, SELF_INCOMPATIBLE_GROUPS, ACCESSORY_GROUPS, FORMAL_EXCLUDED_TYPES,
+                       HIGHLY_GENDERED_TYPES)
+
+GROUP_NAMES: List[str] = list(ARTICLE_TYPE_GROUPS)
+_GROUP_INDEX: Dict[str, int] = {name: index for index, name in enumerate(GROUP_NAMES)}
+_GROUP_BY_TYPE: Dict[str, str] = {}
+for _group_name, _types in ARTICLE_TYPE_GROUPS.items():
+    for _article_type in _types:
+        _GROUP_BY_TYPE.setdefault(_article_type, _group_name) # First group wins, as in the original scan
+
+
+def group_of(article_type: Optional[str]) -> Optional[str]:
+    """ARTICLE_TYPE_GROUPS group of an article type (the first one that lists it)."""
+    return _GROUP_BY_TYPE.get(article_type)
+
+
+def group_types(article_type: Optional[str]) -> List[str]:
+    """All article types in the group of `article_type` (empty if it has no group)."""
+    return ARTICLE_TYPE_GROUPS.get(group_of(article_type), [])
+
+
+@lru_cache(maxsize=4096)
+def target_types(article_type: str, usage: str, season: str) -> Tuple[str, ...]:
+    """Sorted recommendation types for a target: compatible types plus usage/season accessories."""
+    types = set(COMPATIBLE_TYPES.get(article_type, []))
+    types.update(ACCESSORY_COMBINATIONS.get(usage, []))
+    types.update(SEASONAL_ACCESSORIES.get(season, []))
+    return tuple(sorted(types))
+
+
+def gender_group(gender: Optional[str]) -> str:
+    """Broad gender of a target item: Boys count as Men, Girls as Women, anything else as Unisex."""
+    if gender in ("Men", "Boys"):
+        return "Men"
+    if gender in ("Women", "Girls"):
+        return "Women"
+    return "Unisex"
+
+
+class CompiledOutfitRules:
+    """Outfit rules as arrays indexed by the catalog's category codes.
+
+    Every per-code array has one extra trailing entry for missing values
+    (code -1), so `array[codes]` needs no remapping.
+    """
+
+    def __init__(self, article_types: Sequence[str], usages: Sequence[str], genders: Sequence[str]):
+        self.article_types, self.usages, self.genders = list(article_types), list(usages), list(genders)
+
+        self.type_group = np.array([_GROUP_INDEX.get(group_of(t), -1) for t in self.article_types] + [-1], dtype=np.int32)
+        # Per-group flags, with a trailing False for "no group" (-1)
+        self.group_self_incompatible = np.array([g in SELF_INCOMPATIBLE_GROUPS for g in GROUP_NAMES] + [False])
+        self.group_accessory = np.array([g in ACCESSORY_GROUPS for g in GROUP_NAMES] + [False])
+        self.type_formal_excluded = np.array([t in FORMAL_EXCLUDED_TYPES for t in self.article_types] + [False])
+        self.formal_usage_code = self.usages.index("Formal") if "Formal" in self.usages else -2
+
+        # Allowed candidate usages for each target usage (unlisted targets use the "Unknown" rule)
+        default_usages = USAGE_COMPATIBILITY.get("Unknown", self.usages)
+        self._usage_masks = {target: self._allow_mask(self.usages, allowed) for target, allowed in USAGE_COMPATIBILITY.items()}
+        self._default_usage_mask = self._allow_mask(self.usages, default_usages)
+        self._gender_masks = {
+            (group, strict): self._allow_mask(self.genders, [group] if strict else [group, "Unisex"])
+            for group in ("Men", "Women") for strict in (False, True)
+        }
+
+    @staticmethod
+    def _allow_mask(values: Sequence[str], allowed: Sequence[str]) -> np.ndarray:
+        allowed = set(allowed)
+        return np.array([value in allowed for value in values] + [False])
+
+    def matches(self, article_types: Sequence[str], usages: Sequence[str], genders: Sequence[str]) -> bool:
+        return self.article_types == list(article_types) and self.usages == list(usages) and self.genders == list(genders)
+
+    def usage_mask(self, target_usage: Optional[str], usage_codes: np.ndarray) -> np.ndarray:
+        """Candidates whose usage is compatible with the target usage."""
+        return self._usage_masks.get(target_usage, self._default_usage_mask)[usage_codes]
+
+    def gender_mask(self, target_gender: Optional[str], rec_type: str, gender_codes: np.ndarray) -> np.ndarray:
+        """Candidates allowed for the target's gender: exact for highly gendered types, else also Unisex."""
+        group = gender_group(target_gender)
+        if group == "Unisex":
+            return np.ones(len(gender_codes), dtype=bool)
+        return self._gender_masks[(group, rec_type in HIGHLY_GENDERED_TYPES)][gender_codes]
+
+    def compatible_mask(self, target_type: str, target_usage: Optional[str],
+                        type_codes: np.ndarray, usage_codes: np.ndarray) -> np.ndarray:
+        """Vectorized check_negative_constraints of a target against candidates (True = allowed)."""
+        target_group = _GROUP_INDEX.get(group_of(target_type), -1)
+        candidate_groups = self.type_group[type_codes]
+        if target_group < 0:
+            return np.ones(len(type_codes), dtype=bool)
+
+        has_group = candidate_groups >= 0
+        same_group_clash = (candidate_groups == target_group) & self.group_self_incompatible[target_group]
+        accessory = self.group_accessory[target_group] | self.group_accessory[candidate_groups]
+        formal_clash = (self.type_formal_excluded[type_codes] & (target_usage == "Formal")) | \
+                       ((usage_codes == self.formal_usage_code) & (target_type in FORMAL_EXCLUDED_TYPES))
+        return ~has_group | (~same_group_clash & (accessory | ~formal_clash))
@@ -0,0 +1,103 @@
+"""Materialized outfit recommendations, precomputed offline and served by lookup.
+
+Each row holds the zlib-compressed `OutfitRecommendation` JSON for one catalog
+row position. A store is tied to a fingerprint of the catalog hash, the outfit
+rules and the retrieval settings that produced it; a store whose fingerprint
+does not match the running service is ignored rather than served.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OUTFITS_FILE = "outfits.sqlite"
+WRITE_BATCH_SIZE = 1000
+
+
+class OutfitStoreWriter:
+    """Writes a new store to a temporary file and publishes it atomically on close."""
+
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp-{os.getpid()}"
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.conn = sqlite3.connect(self.tmp_path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("CREATE TABLE outfits (position INTEGER PRIMARY KEY, payload BLOB NOT NULL)")
+        self.conn.execute("INSERT INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        self.count = 0
+        self._pending = []
+
+    def add(self, position: int, payload_json: bytes):
+        self._pending.append((int(position), zlib.compress(payload_json)))
+        if len(self._pending) >= WRITE_BATCH_SIZE:
+            self._flush()
+
+    def add_many(self, rows: Iterable[Tuple[int, bytes]]):
+        for position, payload_json in rows:
+            self.add(position, payload_json)
+
+    def _flush(self):
+        self.conn.executemany("INSERT OR REPLACE INTO outfits VALUES (?, ?)", self._pending)
+        self.conn.commit()
+        self.count += len(self._pending)
+        self._pending = []
+
+    def close(self) -> str:
+        self._flush()
+        self.conn.execute("INSERT INTO meta VALUES ('created_at', ?)", (str(time.time()),))
+        self.conn.commit()
+        self.conn.close()
+        os.replace(self.tmp_path, self.path)
+        logger.info(f"Outfit store with {self.count} items written to {self.path}")
+        return self.path
+
+
+class OutfitStore:
+    """Read-only lookups into a materialized outfit store (one connection per thread)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    @classmethod
+    def open(cls, path: str, fingerprint: str) -> Optional["OutfitStore"]:
+        """Open the store at path if it exists and was built for this fingerprint."""
+        if not os.path.exists(path):
+            logger.info(f"No materialized outfit store at {path}; product pages are computed live.")
+            return None
+        store = cls(path)
+        try:
+            row = store._conn().execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Unreadable outfit store at {path}: {e}")
+            return None
+        if row is None or row[0] != fingerprint:
+            logger.info(f"Outfit store at {path} was built for different catalog or rules; ignoring it.")
+            return None
+        logger.info(f"Serving materialized outfits from {path} ({len(store)} items).")
+        return store
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM outfits").fetchone()[0]
+
+    def get(self, position: int) -> Optional[bytes]:
+        """OutfitRecommendation JSON for a catalog row position, or None on a miss."""
+        row = self._conn().execute("SELECT payload FROM outfits WHERE position = ?", (int(position),)).fetchone()
+        return zlib.decompress(row[0]) if row is not None else None
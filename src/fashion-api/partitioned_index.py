@@ -0,0 +1,216 @@
+"""Filter-aware retrieval partitions keyed by articleType (optionally by gender).
+
+Instead of fetching a huge global neighbour pool and filtering it per
+recommended type, each articleType gets its own small sub-index, so every
+recommended type is a targeted k-NN query whose cost scales with the number of
+items asked for. Partitions up to `exact_max_items` are scanned exactly with a
+SparseExactIndex; larger ones get an Annoy sub-index built next to the global
+index and stored in the same feature artifact set. Annoy sub-indexes may hold
+projected vectors, so their hits are rescored against the full feature rows
+before they are ranked together with exact partitions' cosine scores. The
+exact partitions' postings can be packed into the artifact set's shared array file too
+(`exact_partition_arrays`), so workers memory-map them instead of each
+slicing and indexing its own copy.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from annoy import AnnoyIndex
+from scipy.sparse import csr_matrix, issparse
+from sklearn.preprocessing import normalize
+
+from annoy_builder import build_annoy_index_file
+from catalog_store import CatalogStore
+from sparse_search import SparseExactIndex
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_DIR = "partitions"
+PARTITION_KEY_SEPARATOR = "|"
+
+
+def partition_key(article_type: str, gender: Optional[str] = None) -> str:
+    return article_type if gender is None else f"{article_type}{PARTITION_KEY_SEPARATOR}{gender}"
+
+
+def partition_filename(key: str) -> str:
+    """Stable, filesystem-safe Annoy file name for a partition key."""
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".ann"
+
+
+def partition_prefix(key: str) -> str:
+    """Name prefix of a partition's postings in the shared array file."""
+    return f"partition/{key}/"
+
+
+def catalog_partitions(catalog: CatalogStore, by_gender: bool = False) -> Dict[str, np.ndarray]:
+    """Row positions of every articleType (x gender) partition, ascending."""
+    type_codes = catalog.codes["articleType"].astype(np.int64)
+    valid = type_codes >= 0
+    group_codes = type_codes
+    if by_gender:
+        gender_codes = catalog.codes["gender"].astype(np.int64)
+        valid &= gender_codes >= 0
+        group_codes = type_codes * len(catalog.categories["gender"]) + gender_codes
+
+    positions = np.flatnonzero(valid)
+    order = np.argsort(group_codes[positions], kind="stable")
+    sorted_positions, sorted_codes = positions[order], group_codes[positions][order]
+    unique_codes, starts = np.unique(sorted_codes, return_index=True)
+    ends = np.append(starts[1:], len(sorted_codes))
+
+    partitions = {}
+    for code, start, end in zip(unique_codes, starts, ends):
+        if by_gender:
+            type_code, gender_code = divmod(int(code), len(catalog.categories["gender"]))
+            key = partition_key(catalog.categories["articleType"][type_code], catalog.categories["gender"][gender_code])
+        else:
+            key = partition_key(catalog.categories["articleType"][int(code)])
+        partitions[key] = sorted_positions[start:end]
+    return partitions
+
+
+def build_partition_annoy_files(
+    index_vectors,
+    partitions: Dict[str, np.ndarray],
+    out_dir: str,
+    n_trees: int,
+    min_items: int,
+    n_jobs: int = -1
+) -> int:
+    """Build Annoy sub-indexes for partitions larger than `min_items`; returns how many were built."""
+    os.makedirs(out_dir, exist_ok=True)
+    built = 0
+    for key, positions in partitions.items():
+        if len(positions) <= min_items:
+            continue
+        build_annoy_index_file(index_vectors[positions], os.path.join(out_dir, partition_filename(key)),
+                               n_trees, n_jobs=n_jobs)
+        built += 1
+    return built
+
+
+def exact_partition_arrays(
+    catalog: CatalogStore,
+    features: csr_matrix,
+    by_gender: bool = False,
+    annoy_dir: Optional[str] = None
+) -> Dict[str, np.ndarray]:
+    """Postings of every partition without an Annoy file in `annoy_dir`, for the shared array file.
+
+    `features` must be unit-length rows, as `PartitionedIndex.load(..., normalized=True)` expects.
+    """
+    arrays = {}
+    for key, positions in catalog_partitions(catalog, by_gender).items():
+        if annoy_dir is not None and os.path.exists(os.path.join(annoy_dir, partition_filename(key))):
+            continue
+        arrays.update(SparseExactIndex(features[positions], normalized=True).shared_arrays(partition_prefix(key)))
+    return arrays
+
+
+class _Partition:
+    __slots__ = ("positions", "exact", "annoy")
+
+    def __init__(self, positions: np.ndarray, exact: Optional[SparseExactIndex], annoy: Optional[AnnoyIndex]):
+        self.positions = positions
+        self.exact = exact
+        self.annoy = annoy
+
+
+class PartitionedIndex:
+    """Per-partition sub-indexes with a merged top-k query across partitions."""
+
+    def __init__(self, partitions: Dict[str, _Partition], by_gender: bool, features: csr_matrix, normalized: bool = False):
+        self.partitions = partitions
+        self.by_gender = by_gender
+        self.features = features # Full-space rows that Annoy hits are rescored against
+        self.normalized = normalized
+        self.has_annoy = any(partition.annoy is not None for partition in partitions.values())
+
+    @classmethod
+    def load(
+        cls,
+        catalog: CatalogStore,
+        features: csr_matrix,
+        by_gender: bool = False,
+        annoy_dir: Optional[str] = None,
+        index_dim: Optional[int] = None,
+        normalized: bool = False,
+        shared: Optional[Dict[str, np.ndarray]] = None
+    ) -> "PartitionedIndex":
+        """Open the partitions for a catalog, using Annoy sub-indexes from `annoy_dir` where present.
+
+        Exact partitions reopen their postings from `shared` (see `exact_partition_arrays`) when it has
+        them, and otherwise index their slice of `features` (`normalized`: already unit-length rows).
+        """
+        start_time = time.time()
+        partitions = {}
+        for key, positions in catalog_partitions(catalog, by_gender).items():
+            annoy_path = os.path.join(annoy_dir, partition_filename(key)) if annoy_dir else None
+            if annoy_path is not None and os.path.exists(annoy_path):
+                annoy_index = AnnoyIndex(index_dim, "angular")
+                annoy_index.load(annoy_path)
+                partitions[key] = _Partition(positions, None, annoy_index)
+            elif shared is not None and int(shared.get(f"{partition_prefix(key)}postings.shape", [-1])[0]) == len(positions):
+                partitions[key] = _Partition(positions, SparseExactIndex.from_shared(shared, partition_prefix(key)), None)
+            else:
+                partitions[key] = _Partition(positions, SparseExactIndex(features[positions], normalized=normalized), None)
+        n_annoy = sum(partition.annoy is not None for partition in partitions.values())
+        logger.info(f"Loaded {len(partitions)} retrieval partitions ({n_annoy} Annoy, "
+                    f"{len(partitions) - n_annoy} exact) in {time.time() - start_time:.2f} seconds.")
+        return cls(partitions, by_gender, features, normalized)
+
+    def keys_for(self, article_types: Iterable[str], genders: Optional[Iterable[str]] = None) -> List[str]:
+        """Existing partition keys for the given types (restricted to genders when split by gender)."""
+        if not self.by_gender:
+            return [key for key in dict.fromkeys(article_types) if key in self.partitions]
+        if genders is None:
+            wanted = set(article_types)
+            return [key for key in self.partitions if key.split(PARTITION_KEY_SEPARATOR, 1)[0] in wanted]
+        return [partition_key(t, g) for t in dict.fromkeys(article_types) for g in dict.fromkeys(genders)
+                if partition_key(t, g) in self.partitions]
+
+    def search(
+        self,
+        keys: Iterable[str],
+        target_features: csr_matrix,
+        query_vector: Optional[np.ndarray],
+        k: int,
+        exclude: Optional[int] = None
+    ) -> List[int]:
+        """Global row positions of the k nearest items across the given partitions, best first."""
+        found_positions, found_scores = [], []
+        for key in keys:
+            partition = self.partitions[key]
+            if partition.annoy is not None:
+                local = np.asarray(partition.annoy.get_nns_by_vector(query_vector, k + 1), dtype=np.int64)
+                positions = partition.positions[local]
+                scores = self.full_space_scores(positions, target_features)
+            else:
+                local, scores = partition.exact.search(target_features, k + 1)
+                positions = partition.positions[local]
+            found_positions.append(positions)
+            found_scores.append(scores)
+        if not found_positions:
+            return []
+
+        positions, scores = np.concatenate(found_positions), np.concatenate(found_scores)
+        if exclude is not None:
+            keep = positions != exclude
+            positions, scores = positions[keep], scores[keep]
+        best = np.argsort(-scores, kind="stable")[:k]
+        return positions[best].tolist()
+
+    def full_space_scores(self, positions: np.ndarray, target_features: csr_matrix) -> np.ndarray:
+        """Cosine scores of the given rows in the full feature space, comparable with the exact partitions' scores."""
+        query = csr_matrix(target_features) if not issparse(target_features) else target_features.tocsr()
+        query = normalize(query[0].astype(np.float32), norm="l2")
+        rows = self.features[positions]
+        if not self.normalized:
+            rows = normalize(rows.astype(np.float32), norm="l2")
+        return np.asarray((rows @ query.T).todense(), dtype=np.float32).ravel()
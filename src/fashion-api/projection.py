@@ -0,0 +1,183 @@
+"""Optional low-dimensional projection of the feature matrix for the ANN index.
+
+The OneHot+TF-IDF matrix has thousands of mostly-zero columns, and the Annoy
+index stores every item densely. A TruncatedSVD or sparse random projection
+fitted once on the catalog maps items (and queries) to 64-256 dense dims, which
+shrinks the index file and per-query distance cost. MMR and evaluation still use
+the full sparse features; only candidate retrieval goes through the projection.
+
+Run this module on an artifact set's shared array file to see the
+recall-vs-exact trade-off:
+
+    python projection.py artifacts/<hash>/shared.bin --dims 0 64 128 256
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+from sklearn.random_projection import SparseRandomProjection
+
+from feature_artifacts import read_shared_arrays
+
+logger = logging.getLogger(__name__)
+
+PROJECTION_METHODS = ("svd", "random")
+
+
+class FeatureProjection:
+    """Fitted projection from the sparse feature space to a small dense space."""
+
+    def __init__(self, method: str = "svd", n_components: int = 128, random_state: int = 42):
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"Unknown projection method '{method}', expected one of {PROJECTION_METHODS}")
+        self.method = method
+        self.n_components = n_components
+        self.random_state = random_state
+        self.model = None
+
+    def fit(self, features: csr_matrix) -> "FeatureProjection":
+        """Fit the projection on the catalog feature matrix."""
+        start_time = time.time()
+        n_components = min(self.n_components, features.shape[1] - 1)
+        if self.method == "svd":
+            self.model = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=self.random_state)
+        else:
+            self.model = SparseRandomProjection(n_components=n_components, dense_output=True,
+                                                random_state=self.random_state)
+        self.model.fit(features)
+        self.n_components = n_components
+        logger.info(f"Fitted {self.method} projection {features.shape[1]} -> {n_components} dims "
+                    f"in {time.time() - start_time:.2f} seconds.")
+        return self
+
+    def transform(self, features) -> np.ndarray:
+        """Project sparse (or dense) feature rows to float32 vectors."""
+        if self.model is None:
+            raise RuntimeError("FeatureProjection must be fitted before transform.")
+        return np.asarray(self.model.transform(features), dtype=np.float32)
+
+    def describe(self) -> Dict[str, Any]:
+        """Summary of the fitted projection for logs and reports."""
+        summary = {"method": self.method, "n_components": self.n_components}
+        if self.method == "svd" and self.model is not None:
+            summary["explained_variance"] = round(float(self.model.explained_variance_ratio_.sum()), 4)
+        return summary
+
+
+def exact_neighbors(normalized_features: csr_matrix, position: int, k: int) -> tuple:
+    """Exact cosine top-k for one row of an L2-normalized matrix, plus the k-th best score."""
+    scores = (normalized_features @ normalized_features[position].T).toarray().ravel()
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return top, scores
+
+
+def recall_vs_exact(
+    features: csr_matrix,
+    search: Callable[[int, int], Sequence[int]],
+    positions: Sequence[int],
+    k: int = 10
+) -> Dict[str, Any]:
+    """Recall@k of an ANN search against exact cosine search over the full sparse features.
+
+    `search(position, k)` returns the ANN neighbour positions for a catalog row.
+    Ties are resolved in the ANN's favour: a returned item counts as a hit if its
+    exact score is at least the k-th best exact score.
+    """
+    normalized = normalize(features.tocsr(), norm="l2", copy=True)
+    hits, exact_seconds, ann_seconds = 0, 0.0, 0.0
+    for position in positions:
+        exact_start = time.time()
+        exact_top, scores = exact_neighbors(normalized, int(position), k)
+        exact_seconds += time.time() - exact_start
+
+        ann_start = time.time()
+        ann_top = list(search(int(position), k))[:k]
+        ann_seconds += time.time() - ann_start
+
+        threshold = scores[exact_top[-1]] - 1e-6
+        hits += int(np.sum(scores[np.asarray(ann_top, dtype=np.int64)] >= threshold)) if ann_top else 0
+
+    n_queries = max(len(positions), 1)
+    return {
+        "k": k,
+        "queries": len(positions),
+        "recall_at_k": round(hits / (n_queries * k), 4),
+        "exact_ms_per_query": round(1000 * exact_seconds / n_queries, 3),
+        "ann_ms_per_query": round(1000 * ann_seconds / n_queries, 3),
+    }
+
+
+def projection_report(
+    features: csr_matrix,
+    dims: Sequence[int],
+    method: str = "svd",
+    n_trees: int = 50,
+    sample_size: int = 200,
+    k: int = 10,
+    random_state: int = 42
+) -> List[Dict[str, Any]]:
+    """Build an Annoy index per dimensionality (0 = raw features) and report size and recall."""
+    from annoy import AnnoyIndex
+    from annoy_builder import build_annoy_index_file
+
+    rng = np.random.default_rng(random_state)
+    positions = rng.choice(features.shape[0], size=min(sample_size, features.shape[0]), replace=False)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_dims in dims:
+            projection: Optional[FeatureProjection] = None
+            index_vectors = features
+            if n_dims:
+                projection = FeatureProjection(method, n_dims, random_state).fit(features)
+                index_vectors = projection.transform(features)
+
+            index_path = os.path.join(tmp_dir, f"index-{n_dims}.ann")
+            build_start = time.time()
+            build_annoy_index_file(index_vectors, index_path, n_trees)
+            build_seconds = time.time() - build_start
+            annoy_index = AnnoyIndex(index_vectors.shape[1], "angular")
+            annoy_index.load(index_path)
+
+            def search(position: int, top_k: int) -> List[int]:
+                vector = index_vectors[position]
+                vector = vector.toarray().ravel() if issparse(vector) else vector
+                return annoy_index.get_nns_by_vector(vector, top_k, search_k=-1)
+
+            row = {"dims": index_vectors.shape[1], "method": projection.method if projection else "none",
+                   "index_mb": round(os.path.getsize(index_path) / 1e6, 2), "build_seconds": round(build_seconds, 2)}
+            if projection is not None:
+                row.update({key: value for key, value in projection.describe().items() if key == "explained_variance"})
+            row.update(recall_vs_exact(features, search, positions, k))
+            rows.append(row)
+            annoy_index.unload()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report ANN recall vs exact search for projected feature indexes.")
+    parser.add_argument("features", help="Path to the shared.bin of a feature artifact set")
+    parser.add_argument("--dims", type=int, nargs="+", default=[0, 64, 128, 256], help="Dimensions to test (0 = raw)")
+    parser.add_argument("--method", choices=PROJECTION_METHODS, default="svd")
+    parser.add_argument("--n-trees", type=int, default=50)
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    report = projection_report(read_shared_arrays(args.features)[0], args.dims, args.method,
+                               args.n_trees, args.sample, args.k)
+    columns = ["dims", "method", "index_mb", "build_seconds", "explained_variance",
+               "recall_at_k", "ann_ms_per_query", "exact_ms_per_query"]
+    print("\t".join(columns))
+    for row in report:
+        print("\t".join(str(row.get(col, "")) for col in columns))
@@ -0,0 +1,78 @@
+"""Per-component startup state for staged, non-blocking startup.
+
+Each startup stage (catalog, recommender, CLIP, Chroma) runs in a worker thread
+and records its state here, so endpoints can go live as soon as the data they
+need is ready and /ready can report progress to load balancers.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ReadinessTracker:
+    """Thread-safe registry of startup component states."""
+
+    def __init__(self, components: Iterable[str]):
+        self._lock = threading.Lock()
+        self._components: Dict[str, Dict[str, Any]] = {
+            name: {"state": PENDING, "started_at": None, "duration_seconds": None, "error": None}
+            for name in components
+        }
+
+    def mark(self, name: str, state: str, error: Optional[str] = None):
+        """Record a state transition for a component."""
+        with self._lock:
+            component = self._components.setdefault(
+                name, {"state": PENDING, "started_at": None, "duration_seconds": None, "error": None})
+            component["state"] = state
+            if state == LOADING:
+                component["started_at"] = time.time()
+                component["duration_seconds"] = None
+                component["error"] = None
+            elif component["started_at"] is not None:
+                component["duration_seconds"] = round(time.time() - component["started_at"], 3)
+            if error is not None:
+                component["error"] = error
+
+    def state(self, name: str) -> str:
+        with self._lock:
+            return self._components.get(name, {}).get("state", PENDING)
+
+    def is_ready(self, *names: str) -> bool:
+        with self._lock:
+            return all(self._components.get(name, {}).get("state") == READY for name in names)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Copy of every component's state, for the /ready endpoint."""
+        with self._lock:
+            return {name: dict(component) for name, component in self._components.items()}
+
+    async def run_stage(self, name: str, stage: Callable[[], Any]) -> bool:
+        """Run a blocking stage in a worker thread and track its state; True if it succeeded."""
+        self.mark(name, LOADING)
+        logger.info(f"Startup stage '{name}' started.")
+        try:
+            await asyncio.to_thread(stage)
+        except Exception as e:
+            logger.error(f"Startup stage '{name}' failed: {e}", exc_info=True)
+            self.mark(name, FAILED, error=str(e))
+            return False
+        self.mark(name, READY)
+        logger.info(f"Startup stage '{name}' ready in {self.snapshot()[name]['duration_seconds']:.2f} seconds.")
+        return True
+
+    def not_ready_components(self, names: List[str]) -> Dict[str, str]:
+        """States of the given components that are not ready yet."""
+        with self._lock:
+            return {name: self._components.get(name, {}).get("state", PENDING)
+                    for name in names if self._components.get(name, {}).get("state") != READY}
@@ -0,0 +1,53 @@
+"""Single-flight coalescing of concurrent identical requests.
+
+When many requests for the same key arrive together (a product going viral,
+the same search typed by many users), only the first one runs the
+computation; the others await the same task and get the same result, or the
+same exception. The key is forgotten as soon as the computation finishes, so
+later requests compute afresh (or hit the response cache).
+
+The shared computation runs as its own task, so a duplicate whose client
+disconnects does not cancel the work the other callers are waiting for.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Per-key deduplication of in-flight async computations, with counters.
+
+    Only touched from the event loop thread, so it needs no lock.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of `compute()` for `key`, shared with concurrent callers of the same key."""
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception() # Mark retrieved; every caller may have gone away
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "computations": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / calls, 4) if calls else 0.0,
+        }
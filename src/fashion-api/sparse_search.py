@@ -0,0 +1,95 @@
+"""Exact cosine top-k over the sparse feature matrix, without an ANN index.
+
+The catalog features are one-hot attributes plus TF-IDF terms, so each item
+activates only a few dozen columns. The index keeps the L2-normalized matrix in
+column-major (CSC) form, which is an inverted index from feature column to the
+items that have it. A query scores only the items that share at least one
+active column with it, and the top-k comes out of `argpartition`. The results
+are exact and there is nothing to build beyond the normalization.
+
+The CSC postings can be exported with `shared_arrays()` and reopened over a
+memory-mapped file with `from_shared()`, so worker processes share them
+instead of each building its own copy.
+"""
+
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csc_matrix, csr_matrix, issparse
+from sklearn.preprocessing import normalize
+
+logger = logging.getLogger(__name__)
+
+SPARSE_INDEX_PREFIX = "sparse/" # Name prefix of the global index's postings in the shared array file
+
+
+class SparseExactIndex:
+    """Inverted index over L2-normalized sparse feature rows."""
+
+    def __init__(self, features, normalized: bool = False):
+        """`normalized` features (unit-length rows) are indexed as they are, without a renormalized copy."""
+        start_time = time.time()
+        if normalized:
+            features = features if features.dtype == np.float32 else features.astype(np.float32)
+        else:
+            features = normalize(features.astype(np.float32), norm="l2", copy=True)
+        self.postings = features.tocsc() # No copy if features already are CSC, e.g. from_shared()
+        self.postings.sort_indices()
+        self.n_items, self.n_features = features.shape
+        logger.info(f"SparseExactIndex built for {self.n_items} items x {self.n_features} features "
+                    f"({self.postings.nnz} postings) in {time.time() - start_time:.2f} seconds.")
+
+    @classmethod
+    def from_shared(cls, arrays: Dict[str, np.ndarray], prefix: str = "") -> "SparseExactIndex":
+        """Index over postings exported by `shared_arrays()` (e.g. memory-mapped), without copying them."""
+        postings = csc_matrix((arrays[f"{prefix}postings.data"], arrays[f"{prefix}postings.indices"],
+                               arrays[f"{prefix}postings.indptr"]),
+                              shape=tuple(int(n) for n in arrays[f"{prefix}postings.shape"]), copy=False)
+        return cls(postings, normalized=True)
+
+    def shared_arrays(self, prefix: str = "") -> Dict[str, np.ndarray]:
+        """The CSC postings in a form `from_shared()` can reopen from a packed array file."""
+        return {f"{prefix}postings.data": self.postings.data, f"{prefix}postings.indices": self.postings.indices,
+                f"{prefix}postings.indptr": self.postings.indptr,
+                f"{prefix}postings.shape": np.array(self.postings.shape, dtype=np.int64)}
+
+    def get_n_items(self) -> int:
+        return self.n_items
+
+    def scores(self, query) -> np.ndarray:
+        """Cosine similarity of the query to every item (0 for items sharing no column)."""
+        query = csr_matrix(query) if not issparse(query) else query.tocsr()
+        query = normalize(query[0].astype(np.float32), norm="l2")
+        columns, weights = query.indices, query.data
+        starts, ends = self.postings.indptr[columns], self.postings.indptr[columns + 1]
+        lengths = ends - starts
+        if lengths.sum() == 0:
+            return np.zeros(self.n_items, dtype=np.float32)
+
+        # Gather every posting list touched by the query in one pass.
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        rows = self.postings.indices[offsets]
+        contributions = self.postings.data[offsets] * np.repeat(weights, lengths)
+        return np.bincount(rows, weights=contributions, minlength=self.n_items).astype(np.float32)
+
+    def search(self, query, k: int, exclude: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k positions and cosine scores, best first."""
+        scores = self.scores(query)
+        if exclude is not None and 0 <= exclude < self.n_items:
+            scores[exclude] = -np.inf
+        k = min(k, self.n_items)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top, scores[top]
+
+    def get_nns_by_vector(self, vector, n: int, search_k: int = -1, include_distances: bool = False):
+        """Annoy-compatible search; distances are angular (sqrt(2 - 2 cos))."""
+        positions, scores = self.search(vector, n)
+        if include_distances:
+            distances = np.sqrt(np.maximum(2.0 - 2.0 * scores, 0.0))
+            return positions.tolist(), distances.tolist()
+        return positions.tolist()
@@ -3,6 +3,7 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from main import app, MLModel, get_item
+from catalog_store import CatalogStore
 from constants import ARTICLE_TYPE_GROUPS, COMPATIBLE_TYPES
 import pandas as pd
 from scipy.sparse import csr_matrix
@@ -44,10 +45,9 @@ def mock_annoy_index():
 @pytest.fixture
 def mock_ml_model(sample_data, mock_annoy_index):
     model = MLModel()
+    model.catalog = CatalogStore.from_dataframe(sample_data)
     model.df = sample_data
     model.combined_features = csr_matrix(np.random.rand(len(sample_data), 10))
-    model.id_to_index = {str(row['id']): idx for idx, row in sample_data.iterrows()}
-    model.index_to_id = {idx: str(row['id']) for idx, row in sample_data.iterrows()}
     model.feature_dim = 10
     model.annoy_index = mock_annoy_index
     return model
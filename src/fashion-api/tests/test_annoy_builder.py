@@ -0,0 +1,34 @@
+import os
+import numpy as np
+from scipy.sparse import csr_matrix, random as sparse_random
+from annoy import AnnoyIndex
+from annoy_builder import build_annoy_index_file, submit_annoy_build, shutdown_build_executor
+
+def _features(n_items=50, dim=20):
+    return csr_matrix(sparse_random(n_items, dim, density=0.3, random_state=0, dtype=np.float64))
+
+def test_build_annoy_index_file_matches_rows(tmp_path):
+    features = _features()
+    index_path = str(tmp_path / "index.ann")
+    n_items = build_annoy_index_file(features, index_path, n_trees=5, block_size=16)
+
+    assert n_items == features.shape[0]
+    assert os.listdir(tmp_path) == ["index.ann"]
+    index = AnnoyIndex(features.shape[1], "angular")
+    index.load(index_path)
+    assert np.allclose(index.get_item_vector(37), features[37].toarray().ravel(), atol=1e-6)
+
+def test_background_build_replaces_live_index_file(tmp_path):
+    features = _features()
+    index_path = str(tmp_path / "index.ann")
+    build_annoy_index_file(features, index_path, n_trees=2, on_disk=True)
+    live_index = AnnoyIndex(features.shape[1], "angular")
+    live_index.load(index_path)
+
+    try:
+        assert submit_annoy_build(features, index_path, 5).result(timeout=60) == features.shape[0]
+    finally:
+        shutdown_build_executor()
+    # The index loaded before the rebuild keeps serving from its own mapping.
+    assert live_index.get_n_items() == features.shape[0]
+    assert len(live_index.get_nns_by_item(0, 5)) == 5
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+import pytest
+from bounded_executor import BoundedExecutor, LaneFull, LaneTimeout
+
+def test_lane_limits_concurrency_and_sheds_when_queue_is_full():
+    executor = BoundedExecutor({"heavy": {"max_concurrency": 2, "max_queue": 1, "queue_timeout": 5.0}})
+    release = threading.Event()
+    running = []
+
+    def work(n):
+        running.append(n)
+        release.wait(5)
+        return n * 10
+
+    async def scenario():
+        tasks = [asyncio.create_task(executor.run("heavy", work, n)) for n in range(3)]
+        await asyncio.sleep(0.1)
+        assert sorted(running) == [0, 1] # Third request waits in the queue
+        with pytest.raises(LaneFull):
+            await executor.run("heavy", work, 3)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    try:
+        assert asyncio.run(scenario()) == [0, 10, 20]
+        stats = executor.stats()["heavy"]
+        assert stats["rejected"] == 1 and stats["completed"] == 3 and stats["active"] == 0
+    finally:
+        executor.shutdown()
+
+def test_lane_times_out_queued_requests():
+    executor = BoundedExecutor({"heavy": {"max_concurrency": 1, "max_queue": 4, "queue_timeout": 0.05}})
+
+    async def scenario():
+        slow = asyncio.create_task(executor.run("heavy", time.sleep, 0.3))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LaneTimeout) as excinfo:
+            await executor.run("heavy", time.sleep, 0)
+        await slow
+        assert excinfo.value.status_code == 503
+        return await executor.run("heavy", sum, [1, 2])
+
+    try:
+        assert asyncio.run(scenario()) == 3
+        assert executor.stats()["heavy"]["timed_out"] == 1
+    finally:
+        executor.shutdown()
+
+def test_overloaded_lane_returns_429_with_retry_after(client, monkeypatch):
+    from main import request_executor, OVERLOAD_RETRY_AFTER_SECONDS
+
+    async def full(lane, fn, *args, **kwargs):
+        raise LaneFull(lane, "queue is full")
+
+    monkeypatch.setattr(request_executor, "run", full)
+    response = client.get("/api/products?limit=2")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(OVERLOAD_RETRY_AFTER_SECONDS)
+
+def test_evaluation_endpoints_run_in_evaluate_lane(client, monkeypatch):
+    from main import request_executor
+    lanes = []
+
+    async def full(lane, fn, *args, **kwargs):
+        lanes.append(lane)
+        raise LaneFull(lane, "queue is full")
+
+    monkeypatch.setattr(request_executor, "run", full)
+    assert client.get("/api/evaluate").status_code == 429
+    assert client.get("/api/evaluate-index?sample_size=2&k=2").status_code == 429
+    assert lanes == ["evaluate", "evaluate"]
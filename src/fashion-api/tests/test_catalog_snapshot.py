@@ -0,0 +1,74 @@
+import pytest
+import pandas as pd
+import numpy as np
+from sqlalchemy import create_engine, text
+from catalog_snapshot import (read_catalog_frame, catalog_source_signature,
+                              write_catalog_snapshot, load_catalog_snapshot)
+
+@pytest.fixture
+def catalog_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE clothing_items (id INTEGER PRIMARY KEY, gender VARCHAR, masterCategory VARCHAR, "
+            "subCategory VARCHAR, articleType VARCHAR, baseColour VARCHAR, season VARCHAR, usage VARCHAR, "
+            "productDisplayName VARCHAR, price FLOAT)"
+        ))
+        conn.execute(text(
+            "INSERT INTO clothing_items VALUES "
+            "(3, 'Men', 'Apparel', 'Topwear', 'Shirts', 'Blue', 'Summer', 'Casual', 'Blue Shirt', 19.5), "
+            "(1, 'Women', 'Apparel', 'Topwear', 'Tshirts', NULL, 'Winter', 'Casual', 'Plain Tshirt', NULL), "
+            "(2, 'Men', 'Footwear', 'Shoes', 'Formal Shoes', 'Brown', 'Fall', 'Formal', 'Brown Shoes', 49.0)"
+        ))
+    return engine
+
+def test_snapshot_roundtrip(catalog_engine, tmp_path):
+    df = read_catalog_frame(catalog_engine)
+    # Rows come back ordered by id
+    assert df["id"].tolist() == [1, 2, 3]
+
+    path = str(tmp_path / "snapshot.bin")
+    signature = catalog_source_signature(catalog_engine)
+    write_catalog_snapshot(df, path, signature)
+    loaded = load_catalog_snapshot(path, signature)
+
+    assert loaded is not None
+    assert loaded["id"].tolist() == [1, 2, 3]
+    assert loaded["articleType"].tolist() == ["Tshirts", "Formal Shoes", "Shirts"]
+    # NULLs survive the dictionary encoding
+    assert pd.isna(loaded.loc[0, "baseColour"])
+    assert np.isnan(loaded.loc[0, "price"])
+    assert loaded.loc[2, "price"] == 19.5
+
+def test_snapshot_is_stale_after_update(catalog_engine, tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    write_catalog_snapshot(read_catalog_frame(catalog_engine), path, catalog_source_signature(catalog_engine))
+
+    with catalog_engine.begin() as conn:
+        conn.execute(text("UPDATE clothing_items SET productDisplayName = 'Renamed Blue Shirt' WHERE id = 3"))
+
+    assert load_catalog_snapshot(path, catalog_source_signature(catalog_engine)) is None
+
+@pytest.mark.parametrize("statement", [
+    # Same string lengths, so only a content fingerprint notices
+    "UPDATE clothing_items SET season = 'Winter', usage = 'Formal', baseColour = 'Pink' WHERE id = 3",
+    "UPDATE clothing_items SET articleType = CASE id WHEN 2 THEN 'Shirts' ELSE 'Formal Shoes' END WHERE id IN (2, 3)",
+])
+def test_snapshot_is_stale_after_same_length_edit(catalog_engine, tmp_path, statement):
+    path = str(tmp_path / "snapshot.bin")
+    write_catalog_snapshot(read_catalog_frame(catalog_engine), path, catalog_source_signature(catalog_engine))
+    assert load_catalog_snapshot(path, catalog_source_signature(catalog_engine)) is not None
+
+    with catalog_engine.begin() as conn:
+        conn.execute(text(statement))
+
+    assert load_catalog_snapshot(path, catalog_source_signature(catalog_engine)) is None
+
+def test_signature_leaves_schema_untouched(catalog_engine):
+    catalog_source_signature(catalog_engine)
+    with catalog_engine.connect() as conn:
+        objects = conn.execute(text("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')")).all()
+    assert [tuple(row) for row in objects] == [("table", "clothing_items")]
+
+def test_missing_snapshot(tmp_path):
+    assert load_catalog_snapshot(str(tmp_path / "missing.bin")) is None
@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+import pandas as pd
+from catalog_store import CatalogStore
+
+def test_position_lookup(sample_data):
+    store = CatalogStore.from_dataframe(sample_data)
+    assert store.position_of("1") == 0
+    assert store.position_of(5) == 4
+    assert store.position_of("9999") is None
+    assert store.position_of("abc") is None
+    assert store.ids.dtype == np.int64
+
+def test_sparse_ids_fall_back_to_binary_search():
+    df = pd.DataFrame({"id": [7, 10**9, 3 * 10**9], "gender": ["Men", "Women", "Men"]})
+    store = CatalogStore.from_dataframe(df)
+    assert store._position_by_id is None
+    assert store.position_of(10**9) == 1
+    assert store.position_of(8) is None
+
+def test_categorical_codes_and_items(sample_data):
+    store = CatalogStore.from_dataframe(sample_data)
+    assert isinstance(sample_data["articleType"].dtype, pd.CategoricalDtype)
+    assert store.mask_equal("gender", "Men").tolist() == [True, False, False, True, False]
+    # Unknown values never match, not even missing codes
+    assert not store.mask_equal("gender", "Aliens").any()
+
+    item = store.item(store.position_of("3"))
+    assert item["id"] == 3
+    assert item["articleType"] == "Jeans"
+    assert item["image_url"] == "/static/images/3.jpg"
+    assert [i["id"] for i in store.items([4, 0])] == [5, 1]
+
+def test_shared_arrays_roundtrip_through_packed_file(sample_data, tmp_path):
+    from catalog_snapshot import write_packed_arrays, read_packed_arrays
+    sample_data["price"] = [10.0, 20.0, 30.0, 40.0, 50.0]
+    store = CatalogStore.from_dataframe(sample_data)
+    path = str(tmp_path / "shared.bin")
+    write_packed_arrays(path, {"ids": store.ids, **store.shared_arrays()}, {})
+    arrays, _ = read_packed_arrays(path)
+
+    shared = CatalogStore.from_shared(sample_data, arrays.pop("ids"), arrays)
+    assert isinstance(shared.codes["gender"], np.memmap)
+    assert shared.items(range(5)) == store.items(range(5))
+    assert shared.position_of("4") == 3
+
+    # Arrays from a different catalog are rejected
+    other = sample_data.copy()
+    other["gender"] = other["gender"].cat.rename_categories({"Unisex": "Neutral"})
+    assert CatalogStore.from_shared(other, store.ids, store.shared_arrays()) is None
+
+def test_shared_store_takes_prices_from_current_frame(sample_data):
+    sample_data["price"] = [10.0, 20.0, 30.0, 40.0, 50.0]
+    store = CatalogStore.from_dataframe(sample_data)
+    # A price-only change keeps the artifact hash, so the old shared arrays are reused
+    repriced = sample_data.copy()
+    repriced.loc[0, "price"] = 99.0
+    shared = CatalogStore.from_shared(repriced, store.ids, store.shared_arrays())
+    assert shared.item(0)["price"] == 99.0
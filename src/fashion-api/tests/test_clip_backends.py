@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from clip_backends import ClipBackend, load_clip_backend, score_backend_runs, unit_rows
+from clip_labels import LabelEmbeddings
+
+class FakeBackend:
+    """Text encoder that embeds a label by its length, recording batch sizes."""
+    def __init__(self):
+        self.batches = []
+
+    def encode_texts(self, texts):
+        self.batches.append(len(texts))
+        return unit_rows(np.array([[len(text), 1.0] for text in texts], dtype=np.float32))
+
+def test_label_embeddings_encode_through_backend_in_batches():
+    backend = FakeBackend()
+    labels = {"gender": ["Men", "Women"], "usage": ["Casual", "Formal", "Sports"]}
+    embeddings = LabelEmbeddings.encode(backend, labels, batch_size=2)
+    assert backend.batches == [2, 2, 1]
+    assert embeddings.embeddings.shape == (5, 2) and embeddings.model is backend
+    assert np.allclose(np.linalg.norm(embeddings.embeddings, axis=1), 1.0)
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown CLIP backend"):
+        load_clip_backend("tensorrt")
+
+def test_backends_must_implement_both_encoders():
+    class TextOnlyBackend(ClipBackend):
+        def encode_texts(self, texts):
+            return np.zeros((len(texts), 2), dtype=np.float32)
+
+    with pytest.raises(TypeError, match="encode_images"):
+        TextOnlyBackend()
+
+def test_score_backend_runs_reports_accuracy_and_parity():
+    truth = [{"gender": "Men", "usage": "Casual"}, {"gender": "Women", "usage": "Formal"}]
+    runs = [
+        {"backend": "torch", "load_seconds": 3.0, "predictions": [
+            {"gender": "Men", "usage": "Casual"}, {"gender": "Women", "usage": "Casual"}]},
+        {"backend": "onnx", "load_seconds": 1.0, "predictions": [
+            {"gender": "Men", "usage": "Casual"}, {"gender": "Men", "usage": "Casual"}]},
+    ]
+    torch_row, onnx_row = score_backend_runs(runs, truth, ["gender", "usage"])
+    assert torch_row == {"backend": "torch", "load_seconds": 3.0, "gender_accuracy": 1.0,
+                         "usage_accuracy": 0.5, "agreement_with_torch": 1.0}
+    assert onnx_row["gender_accuracy"] == 0.5 and onnx_row["agreement_with_torch"] == 0.5
+    assert "predictions" in runs[1] # Input runs are left intact
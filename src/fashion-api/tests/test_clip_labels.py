@@ -0,0 +1,23 @@
+import numpy as np
+from clip_labels import LabelEmbeddings
+from main import clip_attribute_labels
+
+def test_predict_picks_best_label_within_each_attribute():
+    labels = {"gender": ["Men", "Women"], "season": ["Summer", "Winter", "Fall"]}
+    embeddings = np.array([
+        [1.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.6, 0.0, 0.8],
+        [0.0, 0.0, 1.0],
+    ], dtype=np.float32)
+    label_embeddings = LabelEmbeddings(labels, embeddings)
+    # Each attribute is decided within its own block of rows
+    assert label_embeddings.predict(np.array([0.0, 0.8, 0.6], dtype=np.float32)) == {"gender": "Women", "season": "Summer"}
+    assert label_embeddings.predict(np.array([0.0, 0.0, 1.0], dtype=np.float32)) == {"gender": "Men", "season": "Fall"}
+
+def test_clip_labels_come_from_catalog_vocabularies():
+    labels = clip_attribute_labels()
+    assert list(labels) == ["gender", "articleType", "season", "usage", "masterCategory", "subCategory"]
+    assert labels["usage"] == ["Casual", "Formal"]
+    assert sorted(labels["articleType"]) == ["Formal Shoes", "Jeans", "Shirts", "Ties", "Tshirts"]
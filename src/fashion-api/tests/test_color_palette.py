@@ -0,0 +1,27 @@
+import numpy as np
+from PIL import Image, ImageDraw
+from color_palette import ColorPalette, dominant_color, rgb_to_lab
+
+def product_photo(color, background=(255, 255, 255)):
+    image = Image.new("RGB", (300, 400), background)
+    ImageDraw.Draw(image).rectangle([100, 120, 200, 280], fill=color) # Product covers ~13% of the photo
+    return image
+
+def test_rgb_to_lab_reference_points():
+    lab = rgb_to_lab(np.array([[255, 255, 255], [0, 0, 0], [255, 0, 0]]))
+    np.testing.assert_allclose(lab, [[100.0, 0.0, 0.0], [0.0, 0.0, 0.0], [53.24, 80.09, 67.20]], atol=0.1)
+
+def test_dominant_color_ignores_background():
+    np.testing.assert_allclose(dominant_color(product_photo((0, 0, 128))), [0, 0, 128])
+    np.testing.assert_allclose(dominant_color(product_photo((200, 30, 30), background=(240, 240, 240))), [200, 30, 30])
+
+def test_dominant_color_of_uniform_image_is_that_color():
+    np.testing.assert_allclose(dominant_color(Image.new("RGB", (120, 80), (255, 255, 255))), [255, 255, 255])
+
+def test_palette_names_nearest_catalog_color():
+    palette = ColorPalette(["Black", "Navy Blue", "Red", "White", "Not A Color"])
+    assert palette.names == ["Navy Blue", "Black", "White", "Red"]
+    assert palette.closest(np.array([10, 10, 110])) == "Navy Blue"
+    assert palette.closest(np.array([230, 40, 30])) == "Red"
+    assert palette.closest(np.array([245, 245, 240])) == "White"
+    assert ColorPalette(["Not A Color"]).closest(np.array([0, 0, 0])) == "Black"
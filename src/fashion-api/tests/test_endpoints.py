@@ -139,3 +139,11 @@ def test_product_page_invalid_id():
 def test_search_endpoint():
     response = client.post("/api/search", data={"query": "shirt"})
     assert response.status_code in [status.HTTP_200_OK, status.HTTP_503_SERVICE_UNAVAILABLE]
+
+def test_admin_endpoints_require_token(monkeypatch):
+    assert client.post("/api/admin/rebuild-index").status_code == status.HTTP_404_NOT_FOUND
+
+    monkeypatch.setattr('main.ADMIN_API_TOKEN', "secret")
+    assert client.post("/api/admin/rebuild-index").status_code == status.HTTP_403_FORBIDDEN
+    response = client.post("/api/admin/rebuild-index", headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
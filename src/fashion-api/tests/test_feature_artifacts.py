@@ -0,0 +1,100 @@
+import os
+import pytest
+from scipy.sparse import csr_matrix
+import numpy as np
+from sklearn.preprocessing import OneHotEncoder
+from feature_artifacts import (catalog_content_hash, create_staging_dir, save_feature_artifacts,
+                               load_feature_artifacts, prune_feature_artifacts, artifact_dir_for,
+                               stage_artifact_copy, republish_feature_artifacts, ANNOY_FILE, MANIFEST_FILE)
+
+def test_catalog_hash_detects_changed_rows(sample_data):
+    original_hash = catalog_content_hash(sample_data)
+    assert catalog_content_hash(sample_data.copy()) == original_hash
+
+    # Same row count, different contents
+    changed = sample_data.copy()
+    changed.loc[0, "baseColour"] = "Black"
+    assert catalog_content_hash(changed) != original_hash
+
+    # Feature parameters are part of the key
+    assert catalog_content_hash(sample_data, {"annoy_n_trees": 10}) != original_hash
+
+def test_artifacts_roundtrip(sample_data, tmp_path):
+    root_dir = str(tmp_path / "artifacts")
+    catalog_hash = catalog_content_hash(sample_data)
+    assert load_feature_artifacts(root_dir, catalog_hash) is None
+
+    encoder = OneHotEncoder(handle_unknown="ignore").fit(sample_data[["gender"]])
+    features = csr_matrix(np.eye(len(sample_data)))
+    staging_dir = create_staging_dir(root_dir, catalog_hash)
+    with open(os.path.join(staging_dir, ANNOY_FILE), "wb") as f:
+        f.write(b"annoy")
+    save_feature_artifacts(staging_dir, root_dir, catalog_hash, encoder, None, features, sample_data["id"],
+                           catalog_arrays={"prices": np.arange(5, dtype=np.float64)})
+
+    artifacts = load_feature_artifacts(root_dir, catalog_hash)
+    assert artifacts is not None
+    assert artifacts["ids"].tolist() == [1, 2, 3, 4, 5]
+    assert (artifacts["combined_features"] != features).nnz == 0
+    # Features and catalog arrays are read-only views over one memory-mapped file
+    assert not artifacts["combined_features"].data.flags.writeable
+    assert not artifacts["combined_features"].indices.flags.writeable
+    assert artifacts["catalog_arrays"]["prices"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert artifacts["onehot_encoder"].categories_[0].tolist() == ["Men", "Unisex", "Women"]
+    assert artifacts["annoy_path"].endswith(ANNOY_FILE)
+
+def publish(root_dir, catalog_hash, sample_data):
+    encoder = OneHotEncoder(handle_unknown="ignore").fit(sample_data[["gender"]])
+    staging_dir = create_staging_dir(root_dir, catalog_hash)
+    return staging_dir, save_feature_artifacts(staging_dir, root_dir, catalog_hash, encoder, None,
+                                               csr_matrix(np.eye(len(sample_data))), sample_data["id"], keep=1)
+
+def test_concurrent_publish_keeps_first_set(sample_data, tmp_path):
+    root_dir = str(tmp_path / "artifacts")
+    catalog_hash = catalog_content_hash(sample_data)
+    _, first_dir = publish(root_dir, catalog_hash, sample_data)
+    staging_dir, second_dir = publish(root_dir, catalog_hash, sample_data)
+    assert second_dir == first_dir == artifact_dir_for(root_dir, catalog_hash)
+    assert not os.path.exists(staging_dir)
+    assert os.path.exists(os.path.join(first_dir, MANIFEST_FILE))
+
+def test_prune_skips_leased_sets(sample_data, tmp_path):
+    root_dir = str(tmp_path / "artifacts")
+    for age, name in enumerate("cba"):
+        artifact_dir = publish(root_dir, name * 64, sample_data)[1]
+        os.utime(os.path.join(artifact_dir, MANIFEST_FILE), (1000 - age, 1000 - age))
+    leased = load_feature_artifacts(root_dir, "a" * 64)
+    publish(root_dir, "d" * 64, sample_data)
+    # The newest set and its predecessor always stay; older ones go unless a worker still serves them
+    assert os.path.exists(artifact_dir_for(root_dir, "a" * 64))
+    assert not os.path.exists(artifact_dir_for(root_dir, "b" * 64))
+    assert os.path.exists(artifact_dir_for(root_dir, "c" * 64))
+
+    leased["lease"].close()
+    prune_feature_artifacts(root_dir, keep=1)
+    assert not os.path.exists(artifact_dir_for(root_dir, "a" * 64))
+    assert os.path.exists(artifact_dir_for(root_dir, "d" * 64))
+
+def test_republish_leaves_served_set_intact(sample_data, tmp_path):
+    root_dir = str(tmp_path / "artifacts")
+    catalog_hash = "e" * 64
+    publish(root_dir, catalog_hash, sample_data)
+    load_feature_artifacts(root_dir, catalog_hash) # Leased, like a worker serving it
+    served_dir = artifact_dir_for(root_dir, catalog_hash)
+    with open(os.path.join(served_dir, ANNOY_FILE), "wb") as f:
+        f.write(b"old")
+
+    staging_dir = stage_artifact_copy(root_dir, catalog_hash)
+    with open(os.path.join(staging_dir, ANNOY_FILE) + ".new", "wb") as f:
+        f.write(b"new")
+    os.replace(os.path.join(staging_dir, ANNOY_FILE) + ".new", os.path.join(staging_dir, ANNOY_FILE))
+    assert republish_feature_artifacts(staging_dir, root_dir, catalog_hash) == served_dir
+
+    with open(os.path.join(served_dir, ANNOY_FILE), "rb") as f:
+        assert f.read() == b"new"
+    # The previous generation stays on disk for the worker still serving it, then is pruned once released
+    retired_dirs = [name for name in os.listdir(root_dir) if ".retired-" in name]
+    assert len(retired_dirs) == 1
+    with open(os.path.join(root_dir, retired_dirs[0], ANNOY_FILE), "rb") as f:
+        assert f.read() == b"old"
+    assert load_feature_artifacts(root_dir, catalog_hash)["ids"].tolist() == [1, 2, 3, 4, 5]
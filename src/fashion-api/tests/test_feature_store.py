@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from sklearn.metrics.pairwise import cosine_similarity
+from feature_store import normalize_features, DenseRowCache
+from main import preprocess_data
+
+def test_normalize_features_gives_unit_float32_rows():
+    raw = csr_matrix(np.array([[3.0, 4.0, 0.0], [0.0, 0.0, 0.0], [1.0, 1.0, 1.0]]))
+    features = normalize_features(raw)
+    assert features.dtype == np.float32
+    norms = np.sqrt(np.asarray(features.multiply(features).sum(axis=1)).ravel())
+    assert np.allclose(norms, [1.0, 0.0, 1.0])
+    # Cosine similarity is now a plain dot product
+    assert np.allclose((features @ features.T).toarray(), cosine_similarity(raw), atol=1e-6)
+
+def test_preprocess_data_stores_normalized_features(sample_data):
+    _, _, features = preprocess_data(sample_data.copy())
+    assert features.dtype == np.float32
+    assert np.allclose(np.asarray(features.multiply(features).sum(axis=1)).ravel(), 1.0, atol=1e-5)
+
+def test_dense_row_cache_is_lru_and_read_only():
+    features = normalize_features(csr_matrix(np.eye(4)))
+    cache = DenseRowCache(features, max_rows=2)
+    row = cache.get(1)
+    assert row.dtype == np.float32 and row.tolist() == [0.0, 1.0, 0.0, 0.0]
+    assert cache.get(1) is row
+    with pytest.raises(ValueError):
+        row[0] = 1.0
+
+    cache.get(2)
+    cache.get(3)
+    assert len(cache) == 2
+    assert cache.get(1) is not row # Evicted as least recently used
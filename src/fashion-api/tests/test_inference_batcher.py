@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from inference_batcher import MicroBatcher
+
+def test_concurrent_calls_share_batches_and_get_their_own_results():
+    batch_sizes = []
+
+    def square_all(items):
+        batch_sizes.append(len(items))
+        time.sleep(0.02) # One "forward pass" costs the same whatever the batch size
+        return [item * item for item in items]
+
+    batcher = MicroBatcher(square_all, max_batch_size=8, max_wait_ms=20)
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(batcher, range(16)))
+        assert results == [n * n for n in range(16)]
+        assert max(batch_sizes) <= 8 and len(batch_sizes) < 16
+        assert batcher.stats()["items"] == 16
+    finally:
+        batcher.close()
+
+def test_single_call_waits_at_most_max_wait():
+    batcher = MicroBatcher(lambda items: [item.upper() for item in items], max_batch_size=32, max_wait_ms=10)
+    try:
+        start = time.monotonic()
+        assert batcher("shirt") == "SHIRT"
+        assert time.monotonic() - start < 0.5
+        assert batcher.stats()["largest_batch"] == 1
+    finally:
+        batcher.close()
+
+def test_failed_batch_raises_in_callers_and_worker_keeps_serving():
+    def embed(items):
+        if "bad" in items:
+            raise ValueError("model crashed")
+        return list(items)
+
+    batcher = MicroBatcher(embed, max_batch_size=4, max_wait_ms=5)
+    try:
+        with pytest.raises(ValueError, match="model crashed"):
+            batcher("bad")
+        assert batcher("ok") == "ok"
+    finally:
+        batcher.close()
+
+def test_short_or_interrupted_batches_fail_their_callers_and_worker_survives():
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+
+    def embed(items):
+        if "short" in items:
+            return items[:-1]
+        if "interrupt" in items:
+            raise KeyboardInterrupt
+        if "hang" in items:
+            time.sleep(0.5)
+        return list(items)
+
+    batcher = MicroBatcher(embed, max_batch_size=1, max_wait_ms=1, timeout=0.1)
+    try:
+        with pytest.raises(RuntimeError, match="0 results for 1 inputs"):
+            batcher("short")
+        with pytest.raises(KeyboardInterrupt):
+            batcher("interrupt")
+        with pytest.raises(FutureTimeoutError):
+            batcher("hang")
+        assert batcher.submit("ok").result(timeout=2) == "ok"
+    finally:
+        batcher.close()
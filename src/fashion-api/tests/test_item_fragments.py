@@ -0,0 +1,42 @@
+import json
+from catalog_store import CatalogStore
+from item_fragments import ItemFragments, json_fragment
+from main import Item, serialize_item
+
+def test_fragments_match_item_json(sample_data):
+    sample_data["price"] = [10.5, None, 30.0, None, 50.0]
+    catalog = CatalogStore.from_dataframe(sample_data)
+    fragments = ItemFragments(catalog, serialize_item)
+
+    assert len(fragments) == 5
+    for position in range(5):
+        assert fragments.get(position) == Item(**catalog.item(position)).model_dump_json().encode("utf-8")
+    assert json.loads(fragments.get(1))["price"] is None
+    assert json.loads(fragments.get(1, default_price=29.99))["price"] == 29.99
+    assert json.loads(fragments.get(0, default_price=29.99))["price"] == 10.5
+
+    items = json.loads(fragments.array([4, 0]))
+    assert [item["id"] for item in items] == [5, 1]
+    assert items[0]["image_url"] == "/static/images/5.jpg"
+    assert fragments.array([]) == b"[]"
+
+def test_json_fragment_is_compact_utf8():
+    assert json_fragment({"novelty": 0.5}) == b'{"novelty":0.5}'
+    assert json_fragment("Café") == '"Café"'.encode("utf-8")
+
+def use_prices(mock_ml_model, prices):
+    mock_ml_model.df["price"] = prices
+    mock_ml_model.catalog = CatalogStore.from_dataframe(mock_ml_model.df)
+
+def test_products_endpoint_serves_fragments(client, mock_ml_model):
+    use_prices(mock_ml_model, [10.0, 20.0, 30.0, 40.0, 50.0])
+    response = client.get("/api/products?limit=2&offset=1")
+    assert response.status_code == 200
+    products = response.json()["products"]
+    assert [product["id"] for product in products] == [2, 3]
+    assert products[0]["price"] == 20.0
+
+def test_products_endpoint_defaults_missing_prices(client, mock_ml_model):
+    use_prices(mock_ml_model, [10.0, None, 30.0, 40.0, 50.0])
+    products = client.get("/api/products?limit=2&offset=1").json()["products"]
+    assert [product["price"] for product in products] == [29.99, 30.0]
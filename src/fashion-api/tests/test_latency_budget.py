@@ -0,0 +1,25 @@
+import json
+import time
+from latency_budget import LatencyBudget, REDUCED_POOL, RELEVANCE_ORDER
+from main import outfit_json
+
+def test_unlimited_budget_never_degrades():
+    budget = LatencyBudget()
+    assert budget.remaining() == float("inf")
+    assert not budget.should_degrade(REDUCED_POOL, 1e9)
+    assert budget.degradations == []
+
+def test_budget_records_each_degradation_once():
+    budget = LatencyBudget(0.05)
+    assert not budget.should_degrade(REDUCED_POOL, 0.01)
+    time.sleep(0.05)
+    assert budget.should_degrade(RELEVANCE_ORDER, 0.01)
+    assert budget.should_degrade(RELEVANCE_ORDER, 0.01)
+    assert budget.should_degrade(REDUCED_POOL, 0.01)
+    assert budget.degradations == [RELEVANCE_ORDER, REDUCED_POOL]
+
+def test_outfit_json_reports_degradations_only_when_taken():
+    assert "degradations" not in json.loads(outfit_json({}, {"novelty": 0.0}))
+    degraded = json.loads(outfit_json({"Shirts": [0]}, {"novelty": 0.5}, [RELEVANCE_ORDER]))
+    assert degraded["degradations"] == [RELEVANCE_ORDER]
+    assert degraded["recommendations"]["Shirts"][0]["id"] == 1
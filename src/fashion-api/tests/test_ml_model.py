@@ -1,5 +1,7 @@
+import json
 import pytest
-from main import get_ml_recommendations, color_compatibility, check_negative_constraints
+from main import get_ml_recommendations, color_compatibility, check_negative_constraints, outfit_recommendation_json
+from color_matrix import ColorCompatibilityMatrix
 from scipy.sparse import csr_matrix
 import numpy as np
 from constants import COMPATIBLE_TYPES
@@ -54,4 +56,23 @@ def test_check_negative_constraints():
     dress = {"articleType": "Dresses", "usage": "Formal", "gender": "Women"}
     trousers = {"articleType": "Trousers", "usage": "Formal", "gender": "Women"}
     # Change this to match your actual compatibility rules
-    assert check_negative_constraints(dress, trousers) in [True, False]
\ No newline at end of file
+    assert check_negative_constraints(dress, trousers) in [True, False]
+
+def test_color_matrix_matches_scalar_rule():
+    colors = ["Black", "Blue", "Orange", "Pink", "White"]
+    matrix = ColorCompatibilityMatrix(colors)
+    codes = np.array([0, 1, 2, 3, 4, -1])
+    for target in colors + ["Unknown", "Fluorescent Green"]:
+        expected = [color_compatibility(target, other) for other in colors + ["Unknown"]]
+        assert np.allclose(matrix.scores(target, codes), expected)
+
+def test_image_outfit_uses_one_retrieval_for_all_types(mock_ml_model, monkeypatch):
+    queries = []
+    get_nns_by_vector = mock_ml_model.annoy_index.get_nns_by_vector
+    monkeypatch.setattr(mock_ml_model.annoy_index, "get_nns_by_vector",
+                        lambda *args, **kwargs: queries.append(args) or get_nns_by_vector(*args, **kwargs))
+    target_features = csr_matrix(np.random.rand(1, 10))
+    target = {"articleType": "Shirts", "gender": "Men", "usage": "Casual", "season": "Summer", "baseColour": "Blue"}
+    body = json.loads(outfit_recommendation_json(target_features, target_features.toarray().ravel(), target))
+    assert len(queries) == 1
+    assert [item["id"] for item in body["recommendations"]["Jeans"]] == [3]
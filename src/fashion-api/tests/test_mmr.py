@@ -0,0 +1,36 @@
+import numpy as np
+from scipy.sparse import csr_matrix, random as sparse_random
+from sklearn.metrics.pairwise import cosine_similarity
+from mmr import mmr_select
+from main import optimized_mmr
+
+def _reference_mmr(target, features, top_n, lambda_param):
+    relevance = cosine_similarity(target.reshape(1, -1), features).ravel()
+    similarity = cosine_similarity(features)
+    selected = [int(np.argmax(relevance))]
+    remaining = [i for i in range(features.shape[0]) if i != selected[0]]
+    while len(selected) < min(top_n, features.shape[0]):
+        scores = {i: lambda_param * relevance[i] - (1 - lambda_param) * similarity[i, selected].max() for i in remaining}
+        best = max(scores, key=scores.get)
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+def test_mmr_select_matches_pairwise_reference():
+    features = sparse_random(300, 40, density=0.15, format="csr", random_state=3)
+    target = features[7].toarray().ravel() + 0.05
+    for lambda_param in (0.0, 0.3, 0.5, 1.0):
+        expected = _reference_mmr(target, features, 5, lambda_param)
+        assert mmr_select(target, features, 5, lambda_param) == expected
+        assert mmr_select(target, features.toarray(), 5, lambda_param) == expected
+
+def test_mmr_select_with_prenormalized_rows():
+    features = np.random.default_rng(0).random((50, 8))
+    normalized = features / np.linalg.norm(features, axis=1, keepdims=True)
+    target = normalized[4]
+    assert mmr_select(target, normalized, 4, normalized=True) == mmr_select(target, features, 4)
+
+def test_optimized_mmr_maps_to_candidate_indices():
+    features = csr_matrix(np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]]))
+    assert optimized_mmr(np.array([1.0, 0.0]), [10, 20, 30], features, top_n=5, lambda_param=0.3) == [10, 30, 20]
+    assert optimized_mmr(np.array([1.0, 0.0]), [], features[:0], top_n=3) == []
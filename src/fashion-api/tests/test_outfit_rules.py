@@ -0,0 +1,43 @@
+import itertools
+import numpy as np
+from constants import USAGE_COMPATIBILITY
+from main import check_negative_constraints, get_compatible_types, get_accessory_types
+from outfit_rules import CompiledOutfitRules, group_of, target_types
+
+TYPES = ["Tops", "Camisoles", "Jeans", "Flip Flops", "Sports Sandals", "Handbags", "Formal Shoes", "Not A Type"]
+USAGES = ["Casual", "Formal", "Sports", "Ethnic"]
+GENDERS = ["Men", "Women", "Unisex", "Boys"]
+
+def test_compatible_mask_matches_scalar_constraints():
+    rules = CompiledOutfitRules(TYPES, USAGES, GENDERS)
+    pairs = list(itertools.product(range(len(TYPES)), [-1] + list(range(len(USAGES)))))
+    type_codes = np.array([t for t, _ in pairs])
+    usage_codes = np.array([u for _, u in pairs])
+
+    for target_type in TYPES:
+        for target_usage in USAGES + [None]:
+            mask = rules.compatible_mask(target_type, target_usage, type_codes, usage_codes)
+            expected = [
+                check_negative_constraints({"articleType": target_type, "usage": target_usage},
+                                           {"articleType": TYPES[t], "usage": USAGES[u] if u >= 0 else None})
+                for t, u in pairs
+            ]
+            assert mask.tolist() == expected, (target_type, target_usage)
+
+def test_usage_and_gender_masks():
+    rules = CompiledOutfitRules(TYPES, USAGES, GENDERS)
+    usage_codes = np.array([0, 1, 2, 3, -1])
+    allowed = set(USAGE_COMPATIBILITY["Formal"])
+    assert rules.usage_mask("Formal", usage_codes).tolist() == [u in allowed for u in USAGES] + [False]
+
+    gender_codes = np.array([0, 1, 2, 3, -1])
+    assert rules.gender_mask("Boys", "Shirts", gender_codes).tolist() == [True, False, True, False, False]
+    assert rules.gender_mask("Men", "Ties", gender_codes).tolist() == [True, False, False, False, False]
+    assert rules.gender_mask("Unisex", "Ties", gender_codes).all()
+
+def test_target_types_and_groups_match_rule_tables():
+    expected = sorted(set(get_compatible_types("Shirts") + get_accessory_types("Casual", "Summer")))
+    assert list(target_types("Shirts", "Casual", "Summer")) == expected
+    assert group_of("Track Pants") == "Trousers"
+    assert group_of("Sports Sandals") == "Casual Shoes" # First group listing a type wins
+    assert group_of("Not A Type") is None
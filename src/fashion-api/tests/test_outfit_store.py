@@ -0,0 +1,44 @@
+import json
+from outfit_store import OutfitStore, OutfitStoreWriter
+
+def test_outfit_store_roundtrip(tmp_path):
+    path = str(tmp_path / "outfits.sqlite")
+    payload = {"recommendations": {"Jeans": [{"id": 3}]}, "metrics": {"novelty": 0.5}}
+    writer = OutfitStoreWriter(path, "fingerprint-1")
+    writer.add_many([(0, json.dumps(payload).encode()), (4, b'{"recommendations": {}}')])
+    writer.close()
+
+    store = OutfitStore.open(path, "fingerprint-1")
+    assert store is not None
+    assert len(store) == 2
+    assert json.loads(store.get(0)) == payload
+    assert store.get(1) is None
+
+def test_outfit_store_ignores_missing_or_stale_stores(tmp_path):
+    path = str(tmp_path / "outfits.sqlite")
+    assert OutfitStore.open(path, "fingerprint-1") is None
+
+    writer = OutfitStoreWriter(path, "fingerprint-1")
+    writer.close()
+    assert OutfitStore.open(path, "fingerprint-2") is None
+
+def test_product_page_serves_materialized_outfit(client, mock_ml_model, tmp_path):
+    path = str(tmp_path / "outfits.sqlite")
+    writer = OutfitStoreWriter(path, "fp")
+    writer.add(0, b'{"recommendations":{"Jeans":[]},"metrics":{"novelty":0.25}}')
+    writer.close()
+    mock_ml_model.outfit_store = OutfitStore.open(path, "fp")
+
+    response = client.get("/api/product/1")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["product"]["id"] == 1
+    assert body["recommendations"] == {"recommendations": {"Jeans": []}, "metrics": {"novelty": 0.25}}
+
+def test_fingerprint_changes_with_prices(mock_ml_model):
+    from main import outfit_store_fingerprint
+    mock_ml_model.df["price"] = [10.0, 20.0, 30.0, 40.0, 50.0]
+    before = outfit_store_fingerprint()
+    assert outfit_store_fingerprint() == before
+    mock_ml_model.df.loc[0, "price"] = 99.0
+    assert outfit_store_fingerprint() != before
@@ -0,0 +1,70 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from catalog_store import CatalogStore
+from partitioned_index import (PartitionedIndex, catalog_partitions, build_partition_annoy_files,
+                               partition_filename)
+
+def _catalog(sample_data):
+    data = sample_data.copy()
+    data.loc[4, "articleType"] = "Shirts"
+    return CatalogStore.from_dataframe(data)
+
+def test_catalog_partitions_by_type_and_gender(sample_data):
+    catalog = _catalog(sample_data)
+    by_type = catalog_partitions(catalog)
+    assert by_type["Shirts"].tolist() == [0, 4]
+    assert by_type["Jeans"].tolist() == [2]
+
+    by_gender = catalog_partitions(catalog, by_gender=True)
+    assert by_gender["Shirts|Men"].tolist() == [0]
+    assert by_gender["Shirts|Women"].tolist() == [4]
+
+def test_search_stays_within_requested_partitions(sample_data):
+    catalog = _catalog(sample_data)
+    features = csr_matrix(np.eye(5) + 0.1)
+    index = PartitionedIndex.load(catalog, features)
+
+    keys = index.keys_for(["Shirts", "Unknown Type"])
+    assert keys == ["Shirts"]
+    assert index.search(keys, features[0], None, k=5) == [0, 4]
+    assert index.search(keys, features[0], None, k=5, exclude=0) == [4]
+    assert index.search(index.keys_for(["Jeans", "Ties"]), features[2], None, k=1) == [2]
+
+def test_large_partitions_use_annoy_sub_indexes(sample_data, tmp_path):
+    catalog = _catalog(sample_data)
+    features = csr_matrix(np.eye(5) + 0.1)
+    partitions = catalog_partitions(catalog, by_gender=True)
+    assert build_partition_annoy_files(features, partitions, str(tmp_path), n_trees=2, min_items=0) == len(partitions)
+    assert (tmp_path / partition_filename("Shirts|Men")).exists()
+
+    index = PartitionedIndex.load(catalog, features, by_gender=True, annoy_dir=str(tmp_path), index_dim=5)
+    assert index.has_annoy
+    keys = index.keys_for(["Shirts"], ["Women", "Unisex"])
+    assert keys == ["Shirts|Women"]
+    query = features[4].toarray().ravel()
+    assert index.search(keys, features[4], query, k=3) == [4]
+
+def test_exact_partitions_reopen_shared_postings(sample_data):
+    from feature_store import normalize_features
+    from partitioned_index import exact_partition_arrays
+    catalog = _catalog(sample_data)
+    features = normalize_features(csr_matrix(np.eye(5) + 0.1))
+    shared = exact_partition_arrays(catalog, features)
+    index = PartitionedIndex.load(catalog, features, normalized=True, shared=shared)
+
+    assert np.shares_memory(index.partitions["Shirts"].exact.postings.data, shared["partition/Shirts/postings.data"])
+    assert index.search(index.keys_for(["Shirts"]), features[0], None, k=5) == [0, 4]
+
+def test_annoy_hits_are_ranked_in_the_full_feature_space(sample_data, tmp_path):
+    catalog = _catalog(sample_data)
+    features = csr_matrix(np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.9, 0.1, 0.0],
+                                    [0.0, 0.0, 1.0], [0.6, 0.0, 0.8]]))
+    # A projection that drops the third column makes item 4 (Shirts) look identical to the query
+    projected = features[:, :2].toarray()
+    partitions = catalog_partitions(catalog)
+    build_partition_annoy_files(projected, {"Shirts": partitions["Shirts"]}, str(tmp_path), n_trees=2, min_items=0)
+    index = PartitionedIndex.load(catalog, features, annoy_dir=str(tmp_path), index_dim=2)
+    assert index.partitions["Shirts"].annoy is not None and index.partitions["Jeans"].exact is not None
+
+    found = index.search(index.keys_for(["Shirts", "Jeans"]), features[0], projected[0], k=3, exclude=0)
+    assert found == [2, 4]
@@ -0,0 +1,31 @@
+import numpy as np
+from scipy.sparse import csr_matrix, random as sparse_random
+from projection import FeatureProjection, recall_vs_exact
+
+def _features(n_items=60, dim=40):
+    return csr_matrix(sparse_random(n_items, dim, density=0.2, random_state=1, dtype=np.float64))
+
+def test_projection_fit_transform_shapes():
+    features = _features()
+    for method in ("svd", "random"):
+        projection = FeatureProjection(method, n_components=8).fit(features)
+        projected = projection.transform(features)
+        assert projected.shape == (60, 8)
+        assert projected.dtype == np.float32
+        assert projection.transform(features[3]).shape == (1, 8)
+    assert "explained_variance" in FeatureProjection("svd", 8).fit(features).describe()
+
+def test_recall_vs_exact_counts_exact_search_as_perfect():
+    features = _features()
+    normalized = features.multiply(1 / np.sqrt(features.multiply(features).sum(axis=1) + 1e-12)).tocsr()
+
+    def exact_search(position, k):
+        scores = (normalized @ normalized[position].T).toarray().ravel()
+        return np.argsort(-scores)[:k].tolist()
+
+    report = recall_vs_exact(features, exact_search, [0, 5, 10], k=5)
+    assert report["recall_at_k"] == 1.0
+    assert report["queries"] == 3
+
+    worst = recall_vs_exact(features, lambda position, k: [], [0, 5], k=5)
+    assert worst["recall_at_k"] == 0.0
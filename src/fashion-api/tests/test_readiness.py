@@ -0,0 +1,38 @@
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from main import app
+from readiness import ReadinessTracker, PENDING, READY, FAILED
+
+client = TestClient(app)
+
+async def test_run_stage_tracks_state():
+    tracker = ReadinessTracker(["catalog", "clip"])
+    assert tracker.state("catalog") == PENDING
+
+    assert await tracker.run_stage("catalog", lambda: None) is True
+    assert tracker.state("catalog") == READY
+    assert tracker.snapshot()["catalog"]["duration_seconds"] is not None
+
+    def broken_stage():
+        raise RuntimeError("model download failed")
+
+    assert await tracker.run_stage("clip", broken_stage) is False
+    assert tracker.state("clip") == FAILED
+    assert "model download failed" in tracker.snapshot()["clip"]["error"]
+    assert tracker.is_ready("catalog") and not tracker.is_ready("catalog", "clip")
+    assert tracker.not_ready_components(["catalog", "clip"]) == {"clip": FAILED}
+
+def test_ready_endpoint_reports_components():
+    # Startup stages have not run for this client
+    response = client.get("/ready")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    data = response.json()
+    assert data["ready"] is False
+    assert set(data["components"]) == {"catalog", "recommender", "clip", "chroma"}
+
+def test_warming_up_endpoint_returns_retry_after(mock_ml_model):
+    mock_ml_model.catalog = None
+    response = client.get("/api/products")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert "Retry-After" in response.headers
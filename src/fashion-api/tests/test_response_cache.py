@@ -0,0 +1,42 @@
+import time
+from response_cache import ResponseCache
+import main
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResponseCache(max_entries=2, max_bytes=10, ttl_seconds=60)
+    cache.put("a", b"1234")
+    cache.put("b", b"5678")
+    assert cache.get("a") == b"1234"  # "a" is now most recently used
+    cache.put("c", b"9")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+
+    cache.put("d", b"123456789")  # pushes total over max_bytes
+    assert cache.stats()["bytes"] <= 10
+    assert cache.stats()["evictions"] == 3
+
+def test_ttl_expiry_and_clear():
+    cache = ResponseCache(ttl_seconds=0.01)
+    cache.put("a", b"x")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+    cache.ttl_seconds = 60
+    cache.put("b", b"y")
+    cache.clear()
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["invalidations"] == 1 and stats["entries"] == 0 and stats["hits"] == 0
+
+def test_product_page_is_cached_per_catalog_version(client, mock_ml_model, monkeypatch):
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    mock_ml_model.catalog_hash = "v1"
+    first = client.get("/api/product/1")
+    assert first.status_code == 200
+    assert client.get("/api/product/1").json() == first.json()
+    assert main.response_cache.stats()["hits"] == 1
+
+    mock_ml_model.catalog_hash = "v2"
+    client.get("/api/product/1")
+    assert main.response_cache.stats()["hits"] == 1
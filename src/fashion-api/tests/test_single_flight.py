@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from single_flight import SingleFlight
+
+def test_concurrent_duplicates_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return f"result-{key}"
+
+    async def scenario():
+        return await asyncio.gather(*[flight.run(key, lambda key=key: compute(key)) for key in ["a", "a", "a", "b"]])
+
+    assert asyncio.run(scenario()) == ["result-a", "result-a", "result-a", "result-b"]
+    assert sorted(calls) == ["a", "b"]
+    assert flight.stats() == {"in_flight": 0, "computations": 2, "coalesced": 2, "coalesced_rate": 0.5}
+
+def test_errors_are_shared_and_keys_forgotten():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(flight.run("k", fail), flight.run("k", fail), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        return await flight.run("k", lambda: asyncio.sleep(0, result="fresh"))
+
+    assert asyncio.run(scenario()) == "fresh"
+    assert flight.stats()["computations"] == 2
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    flight = SingleFlight()
+
+    async def scenario():
+        first = asyncio.create_task(flight.run("k", lambda: asyncio.sleep(0.05, result=42)))
+        second = asyncio.create_task(flight.run("k", lambda: asyncio.sleep(0, result=0)))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == 42
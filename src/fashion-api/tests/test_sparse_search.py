@@ -0,0 +1,50 @@
+import numpy as np
+from scipy.sparse import csr_matrix, random as sparse_random
+from sparse_search import SparseExactIndex
+
+def _features(n_items=80, dim=30):
+    return csr_matrix(sparse_random(n_items, dim, density=0.15, random_state=2, dtype=np.float64))
+
+def test_scores_match_dense_cosine():
+    features = _features()
+    index = SparseExactIndex(features)
+    dense = features.toarray()
+    norms = np.linalg.norm(dense, axis=1)
+    norms[norms == 0] = 1.0
+    normalized = dense / norms[:, None]
+
+    for position in (0, 7, 42):
+        expected = normalized @ normalized[position]
+        assert np.allclose(index.scores(features[position]), expected, atol=1e-5)
+
+def test_search_returns_exact_top_k_best_first():
+    features = _features()
+    index = SparseExactIndex(features)
+    positions, scores = index.search(features[5], k=10)
+    assert len(positions) == 10
+    assert np.all(np.diff(scores) <= 1e-7)
+    assert np.isclose(scores.max(), index.scores(features[5]).max())
+
+    excluded, _ = index.search(features[5], k=10, exclude=5)
+    assert 5 not in excluded.tolist()
+
+    annoy_style, distances = index.get_nns_by_vector(features[5], 3, include_distances=True)
+    assert len(annoy_style) == len(distances) == 3
+
+def test_query_without_shared_columns_scores_zero():
+    index = SparseExactIndex(csr_matrix(np.eye(4)))
+    assert not index.scores(csr_matrix(np.zeros((1, 4)))).any()
+
+def test_shared_postings_roundtrip_without_copies(tmp_path):
+    from catalog_snapshot import write_packed_arrays, read_packed_arrays
+    from feature_store import normalize_features
+    features = normalize_features(_features())
+    index = SparseExactIndex(features, normalized=True)
+    path = str(tmp_path / "shared.bin")
+    write_packed_arrays(path, index.shared_arrays("sparse/"), {})
+    arrays, _ = read_packed_arrays(path)
+
+    shared = SparseExactIndex.from_shared(arrays, "sparse/")
+    assert np.shares_memory(shared.postings.data, arrays["sparse/postings.data"])
+    assert np.shares_memory(shared.postings.indices, arrays["sparse/postings.indices"])
+    assert np.allclose(shared.scores(features[3]), SparseExactIndex(_features()).scores(features[3]), atol=1e-6)